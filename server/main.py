@@ -1,40 +1,162 @@
 import asyncio
+import importlib
 import logging
-from contextlib import asynccontextmanager
+import math
+import signal
+import time
+import uuid
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from src.config import settings
-from src.api import auth_router, progress_router
-from src.bot import get_bot
+from src.config.quest_catalog import get_quest_catalog, reload_quest_catalog
+from src.api import auth_router, progress_router, metrics_router, stats_router, admin_router, broadcast_router
+from src.utils.log import request_id_var, session_id_var, setup_logging, stop_logging
+from src.utils.loop_watchdog import start_loop_watchdog
+from src.utils.resilience import DependencyUnavailable, circuit_breaker_stats, deadline_scope
+from src.utils.tracing import start_tracing, stop_tracing, trace_hop
+from src.utils.traffic_capture import capture_request, start_capture, stop_capture
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+logger = logging.getLogger(__name__)
 
-logging.getLogger("telegram").setLevel(logging.WARNING)
-logging.getLogger("telegram.ext").setLevel(logging.WARNING)
-logging.getLogger("httpx").setLevel(logging.WARNING)
-logging.getLogger("httpcore").setLevel(logging.WARNING)
 
-logger = logging.getLogger(__name__)
+async def start_bot(app: FastAPI) -> None:
+    try:
+        # python-telegram-bot импортируется в отдельном потоке, чтобы не блокировать event loop
+        bot_module = await asyncio.to_thread(importlib.import_module, "src.bot")
+        app.state.bot = bot_module.get_bot()
+        await app.state.bot.initialize()
+        logger.info("Telegram bot initialized")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Failed to start Telegram bot: %s", e)
+        return
+
+    from src.database import get_supabase_client
+    from src.services.broadcast_service import run_broadcast_supervisor
+
+    # Рассылки, прерванные остановкой или падением процесса (этого или другого инстанса),
+    # продолжаются с cursor после истечения аренды
+    try:
+        supabase = await asyncio.to_thread(get_supabase_client)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error("Failed to resume broadcasts: %s", e)
+        return
+    await run_broadcast_supervisor(supabase, app.state.bot.send_broadcast_message)
+
+
+async def start_leaderboard() -> None:
+    from src.database import get_supabase_client
+    from src.services.leaderboard_service import run_leaderboard_builder
+
+    supabase = await asyncio.to_thread(get_supabase_client)
+    await run_leaderboard_builder(supabase)
+
+
+async def start_stats_flusher() -> None:
+    from src.database import get_supabase_client
+    from src.services.stats_service import run_stats_flusher
+
+    supabase = await asyncio.to_thread(get_supabase_client)
+    await run_stats_flusher(supabase)
+
+
+async def start_session_retention() -> None:
+    from src.database import get_supabase_client
+    from src.services.session_retention_service import run_session_retention
+
+    supabase = await asyncio.to_thread(get_supabase_client)
+    await run_session_retention(supabase)
+
+
+async def start_progress_buffer():
+    from src.database import get_supabase_client
+    from src.services.progress_service import start_write_behind
+
+    supabase = await asyncio.to_thread(get_supabase_client)
+    # Replay WAL до приема запросов: подтвержденные выполнения сразу видны в прогрессе
+    return await asyncio.to_thread(start_write_behind, supabase)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    setup_logging(
+        level=settings.log_level,
+        fmt=settings.log_format,
+        sample_rates=settings.log_sample_rates,
+        queue_size=settings.log_queue_size,
+    )
     logger.info("Starting Dance of Mind Backend...")
+    if settings.trace_export:
+        start_tracing(settings.trace_export, settings.trace_sample_rate)
+    if settings.traffic_capture_path:
+        start_capture(
+            settings.traffic_capture_path,
+            settings.traffic_capture_sample_rate,
+            settings.traffic_capture_salt,
+            settings.traffic_capture_max_mb * 1024 * 1024,
+        )
+
+    # Бот стартует в фоне: сервис принимает запросы, не дожидаясь начала polling
+    get_quest_catalog()
+    # kill -HUP перечитывает каталог квестов без рестарта
+    with suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_quest_catalog)
 
-    bot = get_bot()
-    await bot.initialize()
-    logger.info("Telegram bot initialized")
+    app.state.bot = None
+    bot_task = asyncio.create_task(start_bot(app))
+    leaderboard_task = asyncio.create_task(start_leaderboard())
+
+    # Счетчики /api/stats копятся в памяти и уходят в БД пачками
+    background_tasks = [bot_task, leaderboard_task, asyncio.create_task(start_stats_flusher())]
+    if settings.loop_watchdog_enabled:
+        background_tasks.append(start_loop_watchdog(
+            interval=settings.loop_watchdog_interval_ms / 1000,
+            threshold=settings.loop_watchdog_threshold_ms / 1000,
+            log_interval=settings.loop_watchdog_log_interval_seconds,
+        ))
+    if settings.auth_session_partition_maintenance:
+        background_tasks.append(asyncio.create_task(start_session_retention()))
+    if settings.progress_write_behind:
+        progress_buffer = await start_progress_buffer()
+        if progress_buffer is not None:
+            background_tasks.append(asyncio.create_task(progress_buffer.run()))
 
     yield
 
     logger.info("Shutting down Dance of Mind Backend...")
-    await bot.shutdown()
-    logger.info("Telegram bot shut down")
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+    from src.services.broadcast_service import stop_broadcasts
+
+    # До остановки бота: рассылки сохраняют cursor и освобождают аренду - их подхватит другой инстанс
+    await stop_broadcasts()
+
+    if settings.progress_write_behind:
+        from src.services.progress_service import stop_write_behind
+
+        # Финальная отправка буфера; неотправленное останется в WAL до следующего старта
+        await asyncio.to_thread(stop_write_behind)
+
+    from src.services.event_service import close_http_client
+
+    await close_http_client()
+
+    if app.state.bot is not None:
+        await app.state.bot.shutdown()
+        logger.info("Telegram bot shut down")
+
+    stop_tracing()
+    stop_capture()
+    stop_logging()
 
 
 app = FastAPI(
@@ -42,6 +164,7 @@ app = FastAPI(
     description="Backend API for Dance of Mind with Telegram Bot Authentication",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -52,8 +175,51 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Correlation id для логов: свой или пришедший от балансировщика
+    request_id = request.headers.get("x-request-id", "")[:64] or uuid.uuid4().hex
+    request_token = request_id_var.set(request_id)
+    session_token = session_id_var.set(None)
+    try:
+        # Все исходящие вызовы запроса укладываются в общий дедлайн (src/utils/resilience.py)
+        with (
+            deadline_scope(settings.request_deadline_seconds),
+            trace_hop(request.method) as root,
+            capture_request() as captured,
+        ):
+            response = await call_next(request)
+            # Шаблон пути известен после роутинга: /api/auth/tokens/{session_id}
+            route = request.scope.get("route")
+            if root is not None:
+                root["name"] = f"{request.method} {route.path if route else request.url.path}"
+                root["attrs"]["status"] = response.status_code
+            if captured is not None:
+                captured.finish(request, route, response.status_code)
+    finally:
+        request_id_var.reset(request_token)
+        session_id_var.reset(session_token)
+
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.exception_handler(DependencyUnavailable)
+async def dependency_unavailable_handler(request: Request, exc: DependencyUnavailable):
+    logger.warning("%s %s failed fast: %s", request.method, request.url.path, exc)
+    return ORJSONResponse(
+        {"detail": "Service temporarily unavailable"},
+        status_code=503,
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 app.include_router(auth_router)
 app.include_router(progress_router)
+app.include_router(metrics_router)
+app.include_router(stats_router)
+app.include_router(admin_router)
+app.include_router(broadcast_router)
 
 
 @app.get("/")
@@ -70,6 +236,42 @@ async def health_check():
     return {"status": "healthy"}
 
 
+# Балансировщик опрашивает /ready часто - Supabase проверяется не чаще раза в READY_CACHE_SECONDS
+READY_CACHE_SECONDS = 2.0
+_readiness = {"checked_at": float("-inf"), "ready": False, "supabase": None}
+_readiness_lock = asyncio.Lock()
+
+
+def _probe_supabase() -> None:
+    from src.database import get_supabase_client
+
+    with deadline_scope(settings.supabase_timeout_seconds):
+        get_supabase_client().table("stats_counters").select("scope").limit(1).execute()
+
+
+@app.get("/ready")
+async def readiness_check():
+    async with _readiness_lock:
+        if time.monotonic() - _readiness["checked_at"] >= READY_CACHE_SECONDS:
+            try:
+                await asyncio.to_thread(_probe_supabase)
+                _readiness["ready"], _readiness["supabase"] = True, "ok"
+            except Exception as e:
+                _readiness["ready"], _readiness["supabase"] = False, str(e) or type(e).__name__
+            _readiness["checked_at"] = time.monotonic()
+
+    bot = getattr(app.state, "bot", None)
+    return ORJSONResponse(
+        {
+            "status": "ready" if _readiness["ready"] else "unavailable",
+            "supabase": _readiness["supabase"],
+            "telegram_bot": "running" if bot is not None and bot.is_running else "stopped",
+            "circuit_breakers": circuit_breaker_stats(),
+        },
+        status_code=200 if _readiness["ready"] else 503,
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,12 @@
+-- Аренда заданий рассылки: при нескольких инстансах задание выполняет один -
+-- тот, чей id в locked_by, пока не истек lease_until. Раннер продлевает
+-- аренду с каждой страницей и фоном; задание с истекшей арендой (инстанс упал)
+-- берет другой инстанс условным UPDATE ... WHERE lease_until < now().
+-- Отмена на любом инстансе останавливает раннер при следующей записи.
+-- Задания, которые уже выполняются, получат аренду при следующем старте.
+
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS locked_by TEXT;
+ALTER TABLE broadcast_jobs ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP WITH TIME ZONE;
+
+COMMENT ON COLUMN broadcast_jobs.locked_by IS 'Service instance running the job (hostname:pid:random)';
+COMMENT ON COLUMN broadcast_jobs.lease_until IS 'Another instance may take the job over after this time';
@@ -0,0 +1,30 @@
+-- Рассылки бота всем пользователям с telegram_id (POST /admin/broadcasts).
+-- Получатели читаются keyset-пагинацией по users.id; после каждой страницы
+-- в cursor пишется последний обработанный id, поэтому после падения
+-- процесса рассылка продолжается с этого места, а не с начала.
+
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(16),
+    status VARCHAR(16) NOT NULL DEFAULT 'running'
+        CHECK (status IN ('running', 'completed', 'cancelled')),
+    cursor UUID,
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Страница получателей: WHERE telegram_id IS NOT NULL AND id > cursor ORDER BY id LIMIT n
+CREATE INDEX IF NOT EXISTS idx_users_telegram_recipients ON users(id) WHERE telegram_id IS NOT NULL;
+
+ALTER TABLE broadcast_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access broadcast_jobs" ON broadcast_jobs
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE broadcast_jobs IS 'Bot broadcasts to all users with telegram_id, resumable by keyset cursor';
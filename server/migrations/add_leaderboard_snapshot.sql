@@ -0,0 +1,13 @@
+-- Снимок для построения in-memory лидерборда при старте сервиса.
+-- Keyset-пагинация по user_id идет по первичному ключу user_quest_completions,
+-- поэтому каждая страница - index scan, без сортировки всей таблицы.
+
+CREATE OR REPLACE FUNCTION leaderboard_snapshot(p_after UUID DEFAULT NULL, p_limit INT DEFAULT 1000)
+RETURNS TABLE (user_id UUID, quest_count BIGINT, last_completed_at TIMESTAMP WITH TIME ZONE) AS $$
+    SELECT c.user_id, count(*), max(c.completed_at)
+    FROM user_quest_completions c
+    WHERE p_after IS NULL OR c.user_id > p_after
+    GROUP BY c.user_id
+    ORDER BY c.user_id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
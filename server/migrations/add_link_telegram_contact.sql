@@ -0,0 +1,40 @@
+-- Привязка Telegram по контакту из бота одним вызовом.
+--
+-- handle_contact раньше делал до четырех последовательных запросов:
+-- поиск pending сессии, поиск пользователя, создание и обновление
+-- telegram_id. Функция создает или обновляет пользователя по phone_number
+-- и в том же запросе возвращает его последнюю действующую pending сессию
+-- (по частичному индексу idx_auth_sessions_pending_phone).
+--
+-- Результат: {"user": {...}, "session": {...} | null}.
+-- updated_at выставляет триггер update_users_updated_at.
+
+CREATE OR REPLACE FUNCTION link_telegram_contact(
+    p_phone_number TEXT,
+    p_telegram_id BIGINT,
+    p_telegram_username TEXT DEFAULT NULL
+)
+RETURNS JSON AS $$
+    WITH linked AS (
+        INSERT INTO users (phone_number, telegram_id, telegram_username)
+        VALUES (p_phone_number, p_telegram_id, p_telegram_username)
+        ON CONFLICT (phone_number) DO UPDATE
+            SET telegram_id = EXCLUDED.telegram_id,
+                telegram_username = COALESCE(EXCLUDED.telegram_username, users.telegram_username)
+        RETURNING id, phone_number, telegram_id, telegram_username, created_at, updated_at
+    )
+    SELECT json_build_object(
+        'user', (SELECT row_to_json(linked) FROM linked),
+        'session', (
+            SELECT row_to_json(s)
+            FROM auth_sessions s
+            WHERE s.phone_number = p_phone_number
+              AND s.status = 'pending'
+              AND s.expires_at > NOW()
+              -- Граница по ключу секционирования (2 x AUTH_SESSION_TIMEOUT, как в auth_service): только последние партиции
+              AND s.created_at >= NOW() - interval '10 minutes'
+            ORDER BY s.created_at DESC
+            LIMIT 1
+        )
+    );
+$$ LANGUAGE sql;
@@ -0,0 +1,49 @@
+-- Агрегированные счетчики: выполнения квестов и переходы статусов auth_sessions.
+-- Обновляются сервисами в момент изменения состояния (increment_stats_counter),
+-- поэтому статистика читается без сканирования users/auth_sessions.
+
+CREATE TABLE IF NOT EXISTS stats_counters (
+    scope VARCHAR(32) NOT NULL,
+    key TEXT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (scope, key)
+);
+
+ALTER TABLE stats_counters ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access stats_counters" ON stats_counters
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE stats_counters IS 'Incrementally maintained counters (scope: quests, auth_sessions)';
+
+CREATE OR REPLACE FUNCTION increment_stats_counter(p_scope TEXT, p_key TEXT, p_delta BIGINT DEFAULT 1)
+RETURNS BIGINT AS $$
+    INSERT INTO stats_counters (scope, key, value)
+    VALUES (p_scope, p_key, p_delta)
+    ON CONFLICT (scope, key) DO UPDATE
+        SET value = stats_counters.value + EXCLUDED.value,
+            updated_at = NOW()
+    RETURNING value;
+$$ LANGUAGE sql;
+
+-- Начальные значения по уже накопленным данным (разовый полный проход)
+INSERT INTO stats_counters (scope, key, value)
+SELECT 'quests', quest_id, count(*)
+FROM user_quest_completions
+GROUP BY quest_id
+ON CONFLICT (scope, key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+
+INSERT INTO stats_counters (scope, key, value)
+SELECT 'auth_sessions', 'created', count(*)
+FROM auth_sessions
+ON CONFLICT (scope, key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+
+INSERT INTO stats_counters (scope, key, value)
+SELECT 'auth_sessions', status, count(*)
+FROM auth_sessions
+WHERE status <> 'pending'
+GROUP BY status
+ON CONFLICT (scope, key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
@@ -0,0 +1,82 @@
+-- Нормализованный прогресс: одна строка на выполненный квест вместо users.completed_quests
+--
+-- Порядок выката (без простоя):
+--   1. Выполнить этот файл: таблица, индексы, зеркалирующий триггер и процедура backfill.
+--   2. Отдельно, вне транзакции: CALL backfill_user_quest_completions();
+--   3. Выкатить сервис, который читает и пишет user_quest_completions.
+--   4. Когда старых инстансов не осталось - migrations/drop_users_completed_quests.sql
+--      (удаляет триггер и колонку).
+
+CREATE TABLE IF NOT EXISTS user_quest_completions (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    quest_id TEXT NOT NULL,
+    completed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (user_id, quest_id)
+);
+
+-- PRIMARY KEY покрывает запросы по user_id; этот индекс - для запросов по квесту
+CREATE INDEX IF NOT EXISTS idx_user_quest_completions_quest
+    ON user_quest_completions(quest_id, completed_at);
+
+ALTER TABLE user_quest_completions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can read own quest completions" ON user_quest_completions
+    FOR SELECT
+    USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Service role full access user_quest_completions" ON user_quest_completions
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE user_quest_completions IS 'Completed quests, one row per (user, quest)';
+
+-- Пока выкатывается новая версия, старые инстансы пишут в массив - зеркалируем эти записи
+CREATE OR REPLACE FUNCTION mirror_completed_quests()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO user_quest_completions (user_id, quest_id)
+    SELECT NEW.id, quest_id
+    FROM unnest(NEW.completed_quests) AS quest_id
+    ON CONFLICT DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mirror_users_completed_quests ON users;
+CREATE TRIGGER mirror_users_completed_quests
+    AFTER UPDATE OF completed_quests ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION mirror_completed_quests();
+
+-- Backfill пачками по id с коммитом после каждой пачки, чтобы не держать долгих блокировок.
+-- Вызывать вне транзакции: CALL backfill_user_quest_completions();
+CREATE OR REPLACE PROCEDURE backfill_user_quest_completions(batch_size INT DEFAULT 1000)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    last_id UUID := '00000000-0000-0000-0000-000000000000';
+    batch_last_id UUID;
+BEGIN
+    LOOP
+        SELECT max(id) INTO batch_last_id
+        FROM (
+            SELECT id FROM users
+            WHERE id > last_id
+            ORDER BY id
+            LIMIT batch_size
+        ) batch;
+
+        EXIT WHEN batch_last_id IS NULL;
+
+        INSERT INTO user_quest_completions (user_id, quest_id, completed_at)
+        SELECT u.id, quest_id, COALESCE(u.updated_at, NOW())
+        FROM users u, unnest(u.completed_quests) AS quest_id
+        WHERE u.id > last_id AND u.id <= batch_last_id
+        ON CONFLICT DO NOTHING;
+
+        last_id := batch_last_id;
+        COMMIT;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,51 @@
+-- Несколько ботов (TELEGRAM_EXTRA_BOT_TOKENS): у каждого токена свой лимит
+-- отправки Telegram. Писать пользователю может только бот, которого он
+-- запустил, поэтому за пользователем закрепляется бот, через который он
+-- связал номер (индекс в списке токенов, 0 - TELEGRAM_BOT_TOKEN).
+-- Все уже связанные пользователи общались с единственным ботом.
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS bot_index SMALLINT;
+
+UPDATE users SET bot_index = 0 WHERE telegram_id IS NOT NULL AND bot_index IS NULL;
+
+COMMENT ON COLUMN users.bot_index IS 'Bot the user linked through (index in the bot token list)';
+
+-- link_telegram_contact получает индекс бота: закрепляется при первой привязке
+-- и меняется, только если номер привязывает другой аккаунт Telegram
+DROP FUNCTION IF EXISTS link_telegram_contact(TEXT, BIGINT, TEXT);
+
+CREATE OR REPLACE FUNCTION link_telegram_contact(
+    p_phone_number TEXT,
+    p_telegram_id BIGINT,
+    p_telegram_username TEXT DEFAULT NULL,
+    p_bot_index SMALLINT DEFAULT 0
+)
+RETURNS JSON AS $$
+    WITH linked AS (
+        INSERT INTO users (phone_number, telegram_id, telegram_username, bot_index)
+        VALUES (p_phone_number, p_telegram_id, p_telegram_username, p_bot_index)
+        ON CONFLICT (phone_number) DO UPDATE
+            SET telegram_id = EXCLUDED.telegram_id,
+                telegram_username = COALESCE(EXCLUDED.telegram_username, users.telegram_username),
+                bot_index = CASE
+                    WHEN users.bot_index IS NULL OR users.telegram_id IS DISTINCT FROM EXCLUDED.telegram_id
+                        THEN EXCLUDED.bot_index
+                    ELSE users.bot_index
+                END
+        RETURNING id, phone_number, telegram_id, telegram_username, bot_index, created_at, updated_at
+    )
+    SELECT json_build_object(
+        'user', (SELECT row_to_json(linked) FROM linked),
+        'session', (
+            SELECT row_to_json(s)
+            FROM auth_sessions s
+            WHERE s.phone_number = p_phone_number
+              AND s.status = 'pending'
+              AND s.expires_at > NOW()
+              -- Граница по ключу секционирования (2 x AUTH_SESSION_TIMEOUT, как в auth_service): только последние партиции
+              AND s.created_at >= NOW() - interval '10 minutes'
+            ORDER BY s.created_at DESC
+            LIMIT 1
+        )
+    );
+$$ LANGUAGE sql;
@@ -0,0 +1,14 @@
+-- Завершение перехода на user_quest_completions (см. add_user_quest_completions.sql).
+-- Выполнять только после того, как ни один инстанс не пишет в users.completed_quests.
+
+-- Финальная досинхронизация на случай записей, прошедших мимо триггера
+INSERT INTO user_quest_completions (user_id, quest_id, completed_at)
+SELECT u.id, quest_id, COALESCE(u.updated_at, NOW())
+FROM users u, unnest(u.completed_quests) AS quest_id
+ON CONFLICT DO NOTHING;
+
+DROP TRIGGER IF EXISTS mirror_users_completed_quests ON users;
+DROP FUNCTION IF EXISTS mirror_completed_quests();
+DROP PROCEDURE IF EXISTS backfill_user_quest_completions(INT);
+
+ALTER TABLE users DROP COLUMN IF EXISTS completed_quests;
@@ -0,0 +1,29 @@
+-- Индексы под реальные запросы к auth_sessions и users.
+--
+-- get_pending_session_by_phone и _expire_old_sessions фильтруют по
+-- (phone_number, status = 'pending') и сортируют по created_at DESC;
+-- expire_old_auth_sessions() ищет pending с истекшим expires_at. Pending -
+-- малая доля строк, поэтому оба индекса частичные.
+--
+-- Удаляются:
+--   - idx_users_phone_number, idx_users_telegram_id: дублируют индексы UNIQUE;
+--   - idx_auth_sessions_status: 4 значения, планировщик его не выбирает,
+--     а запросы по pending покрыты частичными индексами;
+--   - idx_auth_sessions_telegram_id: сервис не ищет сессии по telegram_id.
+-- idx_auth_sessions_phone остается: он нужен для ON DELETE CASCADE из users.
+--
+-- CONCURRENTLY не работает внутри транзакции - выполнять файл построчно
+-- (psql без --single-transaction). Проверка планов: scripts/query_plan_check.py.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_sessions_pending_phone
+    ON auth_sessions(phone_number, created_at DESC)
+    WHERE status = 'pending';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_auth_sessions_pending_expires
+    ON auth_sessions(expires_at)
+    WHERE status = 'pending';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_phone_number;
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_telegram_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_auth_sessions_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_auth_sessions_telegram_id;
@@ -0,0 +1,218 @@
+-- auth_sessions, секционированная по created_at (одна партиция на сутки UTC).
+--
+-- Сессия нужна 300 секунд, поэтому старые партиции целиком отсоединяются и
+-- удаляются функцией maintain_auth_session_partitions(); по желанию перед
+-- удалением агрегаты сохраняются в auth_sessions_daily_stats. Индексы
+-- активной партиции покрывают одни сутки и не растут со временем.
+--
+-- Партиции живут в схеме partitions: она не опубликована в PostgREST, и
+-- anon/authenticated не могут читать их в обход RLS родительской таблицы.
+--
+-- Порядок выката:
+--   1. Выполнить этот файл. Старая таблица переименовывается в
+--      auth_sessions_legacy, в новую копируются сессии за последние сутки
+--      (на время копирования auth_sessions заблокирована).
+--   2. Сервис вызывает maintain_auth_session_partitions() раз в час
+--      (AUTH_SESSION_RETENTION_DAYS, AUTH_SESSION_ARCHIVE). Вместо этого можно
+--      настроить pg_cron и выключить AUTH_SESSION_PARTITION_MAINTENANCE.
+--   3. Отдельно: перенести агрегаты из auth_sessions_legacy (запрос в конце
+--      файла) и DROP TABLE auth_sessions_legacy.
+
+CREATE SCHEMA IF NOT EXISTS partitions;
+
+-- Архив: число сессий по дням и статусам для удаленных партиций
+CREATE TABLE IF NOT EXISTS auth_sessions_daily_stats (
+    day DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    sessions BIGINT NOT NULL,
+
+    PRIMARY KEY (day, status)
+);
+
+ALTER TABLE auth_sessions_daily_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access auth_sessions_daily_stats" ON auth_sessions_daily_stats
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+BEGIN;
+
+LOCK TABLE auth_sessions IN ACCESS EXCLUSIVE MODE;
+
+ALTER TABLE auth_sessions RENAME TO auth_sessions_legacy;
+ALTER TABLE auth_sessions_legacy RENAME CONSTRAINT auth_sessions_pkey TO auth_sessions_legacy_pkey;
+-- Имена индексов освобождаются для новой таблицы; legacy больше не читается
+DROP INDEX IF EXISTS idx_auth_sessions_phone;
+DROP INDEX IF EXISTS idx_auth_sessions_created_at;
+DROP INDEX IF EXISTS idx_auth_sessions_pending_phone;
+DROP INDEX IF EXISTS idx_auth_sessions_pending_expires;
+DROP INDEX IF EXISTS idx_auth_sessions_status;
+DROP INDEX IF EXISTS idx_auth_sessions_telegram_id;
+
+CREATE TABLE auth_sessions (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    phone_number VARCHAR(20) NOT NULL,
+    telegram_id BIGINT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    approved_at TIMESTAMP WITH TIME ZONE,
+
+    -- Ключ секционирования обязан входить в первичный ключ
+    PRIMARY KEY (id, created_at),
+    CONSTRAINT fk_user_phone FOREIGN KEY (phone_number)
+        REFERENCES users(phone_number)
+        ON DELETE CASCADE,
+    CONSTRAINT chk_status CHECK (status IN ('pending', 'approved', 'rejected', 'expired'))
+) PARTITION BY RANGE (created_at);
+
+-- Строки вне созданных партиций (сдвиг часов, пропущенное обслуживание)
+CREATE TABLE partitions.auth_sessions_default PARTITION OF auth_sessions DEFAULT;
+
+CREATE INDEX idx_auth_sessions_phone ON auth_sessions(phone_number);
+CREATE INDEX idx_auth_sessions_pending_phone ON auth_sessions(phone_number, created_at DESC)
+    WHERE status = 'pending';
+CREATE INDEX idx_auth_sessions_pending_expires ON auth_sessions(expires_at)
+    WHERE status = 'pending';
+
+ALTER TABLE auth_sessions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role full access auth_sessions" ON auth_sessions
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+COMMENT ON TABLE auth_sessions IS 'Temporary authentication sessions for login flow, partitioned by day';
+COMMENT ON COLUMN auth_sessions.status IS 'Session status: pending, approved, rejected, expired';
+COMMENT ON COLUMN auth_sessions.expires_at IS 'When the session expires (typically 5 minutes)';
+
+CREATE OR REPLACE FUNCTION maintain_auth_session_partitions(
+    p_retention_days INT DEFAULT 7,
+    p_premake_days INT DEFAULT 3,
+    p_archive BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (action TEXT, partition_name TEXT)
+SECURITY DEFINER
+SET search_path = public, partitions
+AS $$
+DECLARE
+    v_today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+    v_cutoff DATE := v_today - p_retention_days;
+    v_day DATE;
+    v_from TIMESTAMPTZ;
+    v_to TIMESTAMPTZ;
+    v_name TEXT;
+BEGIN
+    -- Несколько инстансов сервиса: обслуживание выполняет один
+    IF NOT pg_try_advisory_xact_lock(hashtext('maintain_auth_session_partitions')) THEN
+        RETURN;
+    END IF;
+
+    FOR v_day IN
+        SELECT d::date FROM generate_series(v_today, v_today + p_premake_days, interval '1 day') AS d
+    LOOP
+        v_name := 'auth_sessions_p' || to_char(v_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass('partitions.' || v_name) IS NOT NULL;
+        v_from := v_day::timestamp AT TIME ZONE 'UTC';
+        v_to := (v_day + 1)::timestamp AT TIME ZONE 'UTC';
+        BEGIN
+            -- Строки, попавшие в default за время пропущенного обслуживания, не дают создать
+            -- партицию: переносим их и вставляем обратно уже в новую партицию
+            CREATE TEMP TABLE IF NOT EXISTS auth_sessions_moved (LIKE public.auth_sessions) ON COMMIT DROP;
+            TRUNCATE pg_temp.auth_sessions_moved;
+            WITH moved AS (
+                DELETE FROM partitions.auth_sessions_default s
+                WHERE s.created_at >= v_from AND s.created_at < v_to
+                RETURNING s.*
+            )
+            INSERT INTO pg_temp.auth_sessions_moved SELECT * FROM moved;
+
+            EXECUTE format(
+                'CREATE TABLE partitions.%I PARTITION OF public.auth_sessions FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_from, v_to
+            );
+            INSERT INTO public.auth_sessions SELECT * FROM pg_temp.auth_sessions_moved;
+            action := 'created';
+        EXCEPTION WHEN OTHERS THEN
+            -- Подтранзакция откатывается (строки остаются в default), остальные дни и удаление старых выполняются
+            RAISE WARNING 'auth_sessions partition % not created: %', v_name, SQLERRM;
+            action := 'failed';
+        END;
+        partition_name := v_name;
+        RETURN NEXT;
+    END LOOP;
+
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE i.inhparent = 'public.auth_sessions'::regclass
+          AND n.nspname = 'partitions'
+          AND c.relname ~ '^auth_sessions_p[0-9]{8}$'
+          AND to_date(substring(c.relname FROM 16), 'YYYYMMDD') < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        BEGIN
+            IF p_archive THEN
+                EXECUTE format(
+                    'INSERT INTO auth_sessions_daily_stats (day, status, sessions)
+                     SELECT (created_at AT TIME ZONE ''UTC'')::date, status, count(*)
+                     FROM partitions.%I
+                     GROUP BY 1, 2
+                     ON CONFLICT (day, status) DO UPDATE
+                         SET sessions = auth_sessions_daily_stats.sessions + EXCLUDED.sessions',
+                    v_name
+                );
+            END IF;
+            EXECUTE format('ALTER TABLE public.auth_sessions DETACH PARTITION partitions.%I', v_name);
+            EXECUTE format('DROP TABLE partitions.%I', v_name);
+            action := 'dropped';
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'auth_sessions partition % not dropped: %', v_name, SQLERRM;
+            action := 'failed';
+        END;
+        partition_name := v_name;
+        RETURN NEXT;
+    END LOOP;
+
+    -- Старые строки из default партиции удаляются так же
+    IF p_archive THEN
+        INSERT INTO auth_sessions_daily_stats (day, status, sessions)
+        SELECT (s.created_at AT TIME ZONE 'UTC')::date, s.status, count(*)
+        FROM partitions.auth_sessions_default s
+        WHERE s.created_at < v_cutoff::timestamp AT TIME ZONE 'UTC'
+        GROUP BY 1, 2
+        ON CONFLICT (day, status) DO UPDATE
+            SET sessions = auth_sessions_daily_stats.sessions + EXCLUDED.sessions;
+    END IF;
+    DELETE FROM partitions.auth_sessions_default s
+    WHERE s.created_at < v_cutoff::timestamp AT TIME ZONE 'UTC';
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE ALL ON FUNCTION maintain_auth_session_partitions(INT, INT, BOOLEAN) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION maintain_auth_session_partitions(INT, INT, BOOLEAN) TO service_role;
+
+-- Партиции на сегодня и вперед должны существовать до копирования
+SELECT * FROM maintain_auth_session_partitions();
+
+INSERT INTO auth_sessions (id, phone_number, telegram_id, status, created_at, expires_at, approved_at)
+SELECT id, phone_number, telegram_id, status, created_at, expires_at, approved_at
+FROM auth_sessions_legacy
+WHERE created_at > NOW() - interval '1 day';
+
+COMMIT;
+
+NOTIFY pgrst, 'reload schema';
+
+-- Шаг 3 (отдельно, когда новый сервис работает):
+--
+-- INSERT INTO auth_sessions_daily_stats (day, status, sessions)
+-- SELECT (created_at AT TIME ZONE 'UTC')::date, status, count(*)
+-- FROM auth_sessions_legacy
+-- WHERE created_at <= NOW() - interval '1 day'
+-- GROUP BY 1, 2
+-- ON CONFLICT (day, status) DO UPDATE
+--     SET sessions = auth_sessions_daily_stats.sessions + EXCLUDED.sessions;
+--
+-- DROP TABLE auth_sessions_legacy;
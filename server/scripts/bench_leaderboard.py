@@ -0,0 +1,92 @@
+"""
+Бенчмарк in-memory лидерборда (src.utils.ranking.RankIndex).
+
+Для каждого размера строит индекс из синтетических игроков и меряет:
+  - построение с нуля (как при старте сервиса);
+  - increment (complete_quest) и set;
+  - rank(user_id) и top(10) для GET /api/progress/leaderboard.
+
+Запуск из каталога server/:
+
+    python -m scripts.bench_leaderboard
+    python -m scripts.bench_leaderboard --sizes 100000 1000000 --ops 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+
+from src.utils.ranking import RankEntry, RankIndex
+
+QUESTS_TOTAL = 52
+
+
+def synthetic_entries(size: int, rng: random.Random) -> list[RankEntry]:
+    now = time.time()
+    return [
+        RankEntry(str(uuid.UUID(int=rng.getrandbits(128))), rng.randint(1, QUESTS_TOTAL), now - rng.random() * 86400 * 30)
+        for _ in range(size)
+    ]
+
+
+def per_op_us(started: float, ops: int) -> float:
+    return (time.perf_counter() - started) / ops * 1e6
+
+
+def bench(size: int, ops: int, rng: random.Random) -> None:
+    entries = synthetic_entries(size, rng)
+    user_ids = [entry.user_id for entry in entries]
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = RankIndex()
+    index.load(entries)
+    build_s = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sample = [rng.choice(user_ids) for _ in range(ops)]
+    now = time.time()
+
+    started = time.perf_counter()
+    for user_id in sample:
+        index.increment(user_id, now)
+    increment_us = per_op_us(started, ops)
+
+    started = time.perf_counter()
+    for user_id in sample:
+        index.set(user_id, rng.randint(1, QUESTS_TOTAL), now)
+    set_us = per_op_us(started, ops)
+
+    started = time.perf_counter()
+    for user_id in sample:
+        index.rank(user_id)
+    rank_us = per_op_us(started, ops)
+
+    started = time.perf_counter()
+    for _ in range(ops):
+        index.top(10)
+    top_us = per_op_us(started, ops)
+
+    print(
+        f"{size:>10,}  build {build_s:6.2f} s ({peak / 2**20:6.1f} MiB peak)  "
+        f"increment {increment_us:6.2f} us  set {set_us:6.2f} us  "
+        f"rank {rank_us:6.2f} us  top10 {top_us:6.2f} us"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Leaderboard RankIndex benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--ops", type=int, default=100_000, help="Operations per measurement")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for size in args.sizes:
+        bench(size, args.ops, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Бенчмарк пропускной способности при логировании в медленный sink.
+
+Мини-приложение FastAPI пишет по LOG_LINES_PER_REQUEST строк на запрос и
+обслуживает N параллельных клиентов (httpx ASGITransport, в процессе).
+Sink имитирует медленный stderr/сборщик логов - sleep на каждую запись.
+Сравниваются:
+  - off: логирование выключено;
+  - sync: StreamHandler пишет прямо из event loop;
+  - queue: src.utils.log.setup_logging (QueueHandler + фоновый поток).
+
+Запуск из каталога server/:
+
+    python -m scripts.bench_logging
+    python -m scripts.bench_logging --requests 5000 --concurrency 100 --sink-delay-ms 0.5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from src.utils.log import bind_session_id, logging_stats, setup_logging, stop_logging
+
+LOG_LINES_PER_REQUEST = 3
+
+logger = logging.getLogger("bench.logging")
+
+
+class SlowStream(io.TextIOBase):
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, s: str) -> int:
+        time.sleep(self.delay)
+        self.lines += 1
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/work/{session_id}")
+    async def work(session_id: str):
+        bind_session_id(session_id)
+        logger.info("Session %s requested", session_id)
+        logger.info("Session %s checked", session_id)
+        logger.info("Session %s answered", session_id)
+        return {"ok": True}
+
+    return app
+
+
+def configure(mode: str, stream: SlowStream) -> None:
+    stop_logging()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    if mode == "off":
+        root.setLevel(logging.CRITICAL)
+    elif mode == "sync":
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    else:
+        setup_logging("INFO", "json", stream=stream)
+
+
+async def run(app: FastAPI, requests: int, concurrency: int) -> tuple[float, float]:
+    transport = httpx.ASGITransport(app=app)
+    latencies: list[float] = []
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def worker() -> None:
+            for i in counter:
+                started = time.perf_counter()
+                response = await client.get(f"/work/s{i}")
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    return requests / elapsed, p99 * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--sink-delay-ms", type=float, default=0.2)
+    parser.add_argument("--modes", nargs="+", default=["off", "sync", "queue"])
+    args = parser.parse_args()
+
+    app = build_app()
+    print(f"{'mode':>6} {'req/s':>10} {'p99 ms':>10} {'lines':>8} {'dropped':>8}")
+    for mode in args.modes:
+        stream = SlowStream(args.sink_delay_ms / 1000)
+        configure(mode, stream)
+        rps, p99_ms = asyncio.run(run(app, args.requests, args.concurrency))
+        dropped = logging_stats().get("dropped", 0) if mode == "queue" else 0
+        # stop_logging дописывает очередь - строки считаем после него
+        stop_logging()
+        print(f"{mode:>6} {rps:>10.0f} {p99_ms:>10.2f} {stream.lines:>8} {dropped:>8}")
+
+
+if __name__ == "__main__":
+    main()
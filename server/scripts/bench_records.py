@@ -0,0 +1,150 @@
+"""
+Сравнение pydantic моделей и slotted записей на внутренних путях сервисов.
+
+Для каждого сценария печатает CPU время и пиковый объем аллокаций на операцию,
+а также память, удерживаемую одним объектом.
+Сценарии повторяют то, что сервисы делают с одной строкой Supabase:
+
+  - user_lookup:   строка users -> объект -> чтение telegram_id (init_auth, бот)
+  - session_check: строка auth_sessions -> объект -> проверка status/expires_at
+  - tokens_path:   GET /api/auth/tokens: 2x session_check + user_lookup
+
+Запуск из каталога server/:
+
+    python -m scripts.bench_records
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from src.models import AuthSession, AuthSessionRecord, AuthStatus, User, UserRecord
+
+NOW = datetime.now(timezone.utc)
+
+USER_ROW = {
+    "id": str(uuid.uuid4()),
+    "phone_number": "+79991234567",
+    "telegram_id": 123456789,
+    "telegram_username": "dancer",
+    "completed_quests": ["ace-of-spades", "2-of-hearts", "king-of-clubs"],
+    "created_at": (NOW - timedelta(days=3)).isoformat(),
+    "updated_at": NOW.isoformat(),
+}
+
+SESSION_ROW = {
+    "id": str(uuid.uuid4()),
+    "phone_number": "+79991234567",
+    "telegram_id": 123456789,
+    "status": "approved",
+    "created_at": NOW.isoformat(),
+    "expires_at": (NOW + timedelta(seconds=300)).isoformat(),
+    "approved_at": NOW.isoformat(),
+}
+
+
+def model_user_lookup() -> None:
+    User(**USER_ROW).telegram_id
+
+
+def record_user_lookup() -> None:
+    UserRecord.from_row(USER_ROW).telegram_id
+
+
+def model_session_check() -> None:
+    session = AuthSession(**SESSION_ROW)
+    session.status == AuthStatus.PENDING and session.expires_at < datetime.now(timezone.utc)
+
+
+def record_session_check() -> None:
+    session = AuthSessionRecord.from_row(SESSION_ROW)
+    session.status == AuthStatus.PENDING and session.expires_at < datetime.now(timezone.utc)
+
+
+def model_tokens_path() -> None:
+    model_session_check()
+    model_session_check()
+    User(**USER_ROW).phone_number
+
+
+def record_tokens_path() -> None:
+    record_session_check()
+    record_session_check()
+    UserRecord.from_row(USER_ROW).phone_number
+
+
+SCENARIOS: list[tuple[str, Callable[[], None], Callable[[], None]]] = [
+    ("user_lookup", model_user_lookup, record_user_lookup),
+    ("session_check", model_session_check, record_session_check),
+    ("tokens_path", model_tokens_path, record_tokens_path),
+]
+
+
+def cpu_per_op(fn: Callable[[], None], iterations: int) -> float:
+    for _ in range(1000):
+        fn()
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def peak_bytes_per_op(fn: Callable[[], None], iterations: int) -> float:
+    fn()
+    tracemalloc.start()
+    total = 0
+    for _ in range(iterations):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - current
+    tracemalloc.stop()
+    return total / iterations
+
+
+def retained_bytes(factory: Callable[[], object], count: int) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del objects
+    return size / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="pydantic models vs slotted records")
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16}{'variant':<10}{'CPU us/op':>12}")
+    for name, before, after in SCENARIOS:
+        for variant, fn in (("pydantic", before), ("records", after)):
+            print(f"{name:<16}{variant:<10}{cpu_per_op(fn, args.iterations):>12.2f}")
+
+    print()
+    print(f"{'object':<16}{'variant':<10}{'retained B/obj':>16}")
+    for variant, factory in (
+        ("pydantic", lambda: User(**USER_ROW)),
+        ("records", lambda: UserRecord.from_row(USER_ROW)),
+    ):
+        print(f"{'user':<16}{variant:<10}{retained_bytes(factory, 10_000):>16.0f}")
+    for variant, factory in (
+        ("pydantic", lambda: AuthSession(**SESSION_ROW)),
+        ("records", lambda: AuthSessionRecord.from_row(SESSION_ROW)),
+    ):
+        print(f"{'session':<16}{variant:<10}{retained_bytes(factory, 10_000):>16.0f}")
+
+    print()
+    print(f"{'scenario':<16}{'variant':<10}{'peak B/op':>12}")
+    for name, before, after in SCENARIOS:
+        for variant, fn in (("pydantic", before), ("records", after)):
+            print(f"{name:<16}{variant:<10}{peak_bytes_per_op(fn, 10_000):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Бенчмарк холодного старта сервиса.
+
+Замеряет:
+  - время импорта main и его модулей (python -X importtime), медиана по нескольким запускам;
+  - время от запуска uvicorn до первого 200 на /health.
+
+Падает с кодом 1, если превышены бюджеты, startup регрессировал относительно
+сохраненного baseline, либо при старте импортируются тяжелые подсистемы,
+которые должны грузиться лениво.
+
+Запуск из каталога server/:
+
+    python -m scripts.bench_startup
+    python -m scripts.bench_startup --save-baseline startup-baseline.json
+    python -m scripts.bench_startup --baseline startup-baseline.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+# Модули, которые не должны импортироваться при старте процесса
+LAZY_MODULES = ["telegram", "supabase", "phonenumbers", "httpx"]
+
+# Модули, время импорта которых попадает в отчет
+REPORTED_MODULES = [
+    "main",
+    "fastapi",
+    "pydantic",
+    "src.config",
+    "src.api",
+    "src.services",
+    "src.models",
+    "src.database",
+]
+
+# Настройки-заглушки, чтобы бенчмарк работал без .env
+DUMMY_ENV = {
+    "TELEGRAM_BOT_TOKEN": "0:bench",
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "bench",
+    "SUPABASE_SERVICE_KEY": "bench",
+    "JWT_SECRET_KEY": "bench",
+}
+
+
+def _env() -> dict[str, str]:
+    env = dict(os.environ)
+    for key, value in DUMMY_ENV.items():
+        env.setdefault(key, value)
+    return env
+
+
+def measure_imports(runs: int) -> tuple[dict[str, float], list[str]]:
+    samples: dict[str, list[float]] = {name: [] for name in REPORTED_MODULES}
+    eager: set[str] = set()
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=SERVER_DIR,
+            env=_env(),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        cumulative: dict[str, int] = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative_us, module = line[len("import time:"):].split("|")
+            if not cumulative_us.strip().isdigit():
+                continue
+            name = module.strip()
+            cumulative[name] = int(cumulative_us)
+            if name.split(".")[0] in LAZY_MODULES:
+                eager.add(name.split(".")[0])
+
+        for name in REPORTED_MODULES:
+            if name in cumulative:
+                samples[name].append(cumulative[name] / 1000)
+
+    medians = {name: statistics.median(values) for name, values in samples.items() if values}
+    return medians, sorted(eager)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_health(runs: int, timeout: float) -> float:
+    samples = []
+
+    for _ in range(runs):
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}/health"
+
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=SERVER_DIR,
+            env=_env(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        try:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"/health did not answer 200 within {timeout}s")
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.005)
+
+            samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for Dance of Mind Backend")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs per measurement")
+    parser.add_argument("--max-import-ms", type=float, default=1500, help="Budget for `import main`")
+    parser.add_argument("--max-ready-ms", type=float, default=4000, help="Budget for first 200 on /health")
+    parser.add_argument("--baseline", type=Path, help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline")
+    parser.add_argument("--save-baseline", type=Path, help="Write the measured numbers to this file")
+    parser.add_argument("--ready-timeout", type=float, default=30, help="Give up waiting for /health")
+    args = parser.parse_args()
+
+    imports, eager = measure_imports(args.runs)
+    ready_ms = measure_first_health(args.runs, args.ready_timeout)
+
+    print("Import time (median, cumulative):")
+    for name, ms in sorted(imports.items(), key=lambda item: -item[1]):
+        print(f"  {name:<16} {ms:8.1f} ms")
+    print(f"Time to first 200 on /health: {ready_ms:.1f} ms")
+
+    failures = []
+
+    if eager:
+        failures.append(f"modules imported eagerly at startup: {', '.join(eager)}")
+
+    import_ms = imports.get("main", 0.0)
+    if import_ms > args.max_import_ms:
+        failures.append(f"import main took {import_ms:.1f} ms > {args.max_import_ms} ms")
+    if ready_ms > args.max_ready_ms:
+        failures.append(f"first /health took {ready_ms:.1f} ms > {args.max_ready_ms} ms")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        limit = 1 + args.tolerance
+        if import_ms > baseline["import_ms"] * limit:
+            failures.append(f"import main regressed: {import_ms:.1f} ms vs baseline {baseline['import_ms']:.1f} ms")
+        if ready_ms > baseline["ready_ms"] * limit:
+            failures.append(f"first /health regressed: {ready_ms:.1f} ms vs baseline {baseline['ready_ms']:.1f} ms")
+
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(
+            {"import_ms": import_ms, "ready_ms": ready_ms, "modules": imports},
+            indent=2,
+        ))
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Потоковый экспорт/импорт users, auth_sessions и user_quest_completions.
+
+Экспорт читает таблицы страницами по первичному ключу (keyset, не offset),
+поэтому память не растет с размером таблицы, а каждая следующая страница
+стоит столько же, сколько первая. Строки пишутся в NDJSON, по файлу на
+таблицу.
+
+Импорт читает NDJSON пачками и отправляет их upsert'ом в несколько потоков.
+Номера телефонов нормализуются через to_e164 (как в /api/auth/init), строки
+с неразбираемым номером пропускаются и пишутся в <table>.rejects.ndjson.
+
+Обе команды сохраняют checkpoint после каждой страницы/пачки и при повторном
+запуске продолжают с места остановки. Запуск из каталога server/:
+
+    python -m scripts.bulk_transfer export --dir backup/
+    python -m scripts.bulk_transfer import --dir backup/ --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from src.config import settings
+from src.utils.phone import to_e164
+
+
+class TableSpec(NamedTuple):
+    key: tuple[str, ...]
+    columns: str
+    on_conflict: str
+    has_phone: bool
+
+
+# Порядок важен для импорта: auth_sessions и completions ссылаются на users
+TABLES: dict[str, TableSpec] = {
+    "users": TableSpec(
+        ("id",),
+        "id, phone_number, telegram_id, telegram_username, bot_index, created_at, updated_at",
+        "id",
+        True,
+    ),
+    # Секционированная таблица: первичный ключ (id, created_at), уникального индекса по id нет
+    "auth_sessions": TableSpec(
+        ("id", "created_at"),
+        "id, phone_number, telegram_id, status, created_at, expires_at, approved_at",
+        "id,created_at",
+        True,
+    ),
+    "user_quest_completions": TableSpec(
+        ("user_id", "quest_id"),
+        "user_id, quest_id, completed_at",
+        "user_id,quest_id",
+        False,
+    ),
+}
+
+CHECKPOINT_NAME = ".checkpoint.json"
+
+
+def create_admin_client():
+    # Скрипт работает в обход RLS - нужен service role key
+    from supabase import create_client
+
+    return create_client(settings.supabase_url, settings.supabase_service_key)
+
+
+class Checkpoint:
+    """Состояние переноса по таблицам; пишется атомарно (tmp + rename)."""
+
+    def __init__(self, path: Path, mode: str):
+        self.path = path
+        self.mode = mode
+        self.state: dict[str, dict[str, Any]] = {}
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self.state = data.get(mode, {})
+            self._other = {k: v for k, v in data.items() if k != mode}
+        else:
+            self._other = {}
+
+    def get(self, table: str) -> dict[str, Any]:
+        return self.state.setdefault(table, {"offset": 0, "rows": 0, "done": False})
+
+    def save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({**self._other, self.mode: self.state}), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class Throughput:
+    def __init__(self, table: str, already: int):
+        self.table = table
+        self.rows = already
+        self.session_rows = 0
+        self.started = time.perf_counter()
+        self._last_report = 0.0
+
+    def add(self, count: int) -> None:
+        self.rows += count
+        self.session_rows += count
+        now = time.perf_counter()
+        if now - self._last_report >= 1.0:
+            self._last_report = now
+            self.report()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.session_rows / elapsed if elapsed > 0 else 0.0
+        suffix = " - done" if final else ""
+        print(f"{self.table}: {self.rows:,} rows, {rate:,.0f} rows/s{suffix}", file=sys.stderr)
+
+
+def _keyset_page(client, table: str, spec: TableSpec, after: Optional[list], page_size: int) -> list[dict]:
+    query = client.table(table).select(spec.columns)
+    for column in spec.key:
+        query = query.order(column)
+
+    if after is not None:
+        if len(spec.key) == 1:
+            query = query.gt(spec.key[0], after[0])
+        else:
+            # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y); значения в кавычках - в created_at есть ":" и "+"
+            (first, second), (x, y) = spec.key, after
+            query = query.or_(f'{first}.gt."{x}",and({first}.eq."{x}",{second}.gt."{y}")')
+
+    return query.limit(page_size).execute().data or []
+
+
+def export_table(client, table: str, spec: TableSpec, directory: Path, checkpoint: Checkpoint, page_size: int) -> None:
+    state = checkpoint.get(table)
+    if state["done"]:
+        print(f"{table}: already exported ({state['rows']:,} rows)", file=sys.stderr)
+        return
+    if state.get("after") is not None and len(state["after"]) != len(spec.key):
+        # Checkpoint до смены ключа таблицы (auth_sessions: id -> id, created_at)
+        raise SystemExit(f"{table}: checkpoint uses an old key, run export with --restart")
+
+    path = directory / f"{table}.ndjson"
+    throughput = Throughput(table, state["rows"])
+
+    with open(path, "ab") as out:
+        # Строки, записанные после последнего checkpoint, будут выгружены повторно
+        out.truncate(state["offset"])
+        out.seek(state["offset"])
+
+        while True:
+            rows = _keyset_page(client, table, spec, state.get("after"), page_size)
+            if rows:
+                out.write(b"".join(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n" for row in rows))
+                out.flush()
+                os.fsync(out.fileno())
+
+                state["after"] = [rows[-1][column] for column in spec.key]
+                state["offset"] = out.tell()
+                state["rows"] += len(rows)
+                throughput.add(len(rows))
+
+            if len(rows) < page_size:
+                state["done"] = True
+            checkpoint.save()
+
+            if state["done"]:
+                break
+
+    throughput.report(final=True)
+
+
+def _read_batches(path: Path, offset: int, batch_size: int):
+    """Отдает (строки, смещение конца пачки в файле)."""
+    with open(path, "rb") as source:
+        source.seek(offset)
+        batch: list[dict] = []
+        end = offset
+        for line in source:
+            # Недописанная последняя строка - экспорт был прерван
+            if not line.endswith(b"\n"):
+                break
+            batch.append(json.loads(line))
+            end += len(line)
+            if len(batch) >= batch_size:
+                yield batch, end
+                batch = []
+        if batch:
+            yield batch, end
+
+
+def _normalize(rows: list[dict], spec: TableSpec) -> tuple[list[dict], list[dict]]:
+    if not spec.has_phone:
+        return rows, []
+
+    accepted, rejected = [], []
+    for row in rows:
+        try:
+            row["phone_number"] = to_e164(row["phone_number"])
+            accepted.append(row)
+        except Exception:
+            rejected.append(row)
+    return accepted, rejected
+
+
+def import_table(table: str, spec: TableSpec, directory: Path, checkpoint: Checkpoint, batch_size: int, workers: int) -> None:
+    state = checkpoint.get(table)
+    path = directory / f"{table}.ndjson"
+    if state["done"]:
+        print(f"{table}: already imported ({state['rows']:,} rows)", file=sys.stderr)
+        return
+    if not path.exists():
+        print(f"{table}: {path} not found, skipping", file=sys.stderr)
+        return
+
+    local = threading.local()
+
+    def upsert(rows: list[dict]) -> None:
+        # Отдельный клиент на поток: пачки уходят параллельно
+        if not hasattr(local, "client"):
+            local.client = create_admin_client()
+        local.client.table(table).upsert(rows, on_conflict=spec.on_conflict).execute()
+
+    throughput = Throughput(table, state["rows"])
+    rejects_path = directory / f"{table}.rejects.ndjson"
+    # Пачки завершаются в любом порядке, а checkpoint двигается только по
+    # непрерывному префиксу - иначе после рестарта часть строк потеряется
+    in_flight: deque[tuple[Future, int, int]] = deque()
+
+    def complete_head() -> None:
+        future, end_offset, count = in_flight.popleft()
+        future.result()
+        state["offset"] = end_offset
+        state["rows"] += count
+        checkpoint.save()
+        throughput.add(count)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(rejects_path, "a", encoding="utf-8") as rejects:
+        for rows, end_offset in _read_batches(path, state["offset"], batch_size):
+            accepted, rejected = _normalize(rows, spec)
+            for row in rejected:
+                rejects.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+            future = pool.submit(upsert, accepted) if accepted else _done_future()
+            in_flight.append((future, end_offset, len(accepted)))
+
+            while len(in_flight) >= workers * 2 or (in_flight and in_flight[0][0].done()):
+                complete_head()
+
+        while in_flight:
+            complete_head()
+
+    state["done"] = True
+    checkpoint.save()
+    throughput.report(final=True)
+
+
+def _done_future() -> Future:
+    future: Future = Future()
+    future.set_result(None)
+    return future
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Bulk NDJSON export/import of users and progress")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("--dir", type=Path, required=True, help="Directory with <table>.ndjson files")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--page-size", type=int, default=1000, help="Export page size (<= PostgREST max-rows)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per import upsert")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel import batches")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    args.dir.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = Checkpoint(args.dir / CHECKPOINT_NAME, args.command)
+    if args.restart:
+        checkpoint.state = {}
+
+    try:
+        if args.command == "export":
+            client = create_admin_client()
+            for table in args.tables:
+                export_table(client, table, TABLES[table], args.dir, checkpoint, args.page_size)
+        else:
+            for table in args.tables:
+                import_table(table, TABLES[table], args.dir, checkpoint, args.batch_size, args.workers)
+    except KeyboardInterrupt:
+        checkpoint.save()
+        print("Interrupted, progress saved - run the same command to resume", file=sys.stderr)
+        return 130
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,497 @@
+"""
+Локальные заглушки внешних зависимостей для нагрузочных и soak-тестов.
+
+Один процесс отвечает за:
+  - PostgREST (/rest/v1/...): таблицы в памяти, фильтры eq/neq/in/gt/lt/is/not/or,
+    order, limit, insert/upsert/update и RPC, которые вызывает сервис;
+  - Realtime broadcast (/realtime/v1/api/broadcast);
+  - Telegram Bot API (/bot<token>/<method>): long polling getUpdates,
+    sendMessage/editMessageText запоминаются по chat_id вместе с токеном
+    бота (bot_token). Любой токен принимается. С --telegram-rate
+    сообщения сверх N в секунду получают 429 с retry_after, чаты из
+    /_fake/telegram/blocked - 403, как заблокировавшие бота.
+
+Служебные эндпоинты для сценариев:
+  POST /_fake/telegram/updates      - поставить апдейт в очередь getUpdates;
+                                      ?token=... - только для этого бота
+  GET  /_fake/telegram/sent/{chat}  - забрать отправленные боту в чат сообщения
+  POST /_fake/telegram/blocked      - {"chat_ids": [...]} заблокировали бота
+  GET  /_fake/stats                 - размеры таблиц и счетчики запросов
+  GET  /_fake/dump                  - содержимое таблиц (для режима реплики)
+
+Режим read-реплики (--replica-of URL): таблицы копируются с основной
+заглушки раз в --lag-ms миллисекунд, запись отклоняется как в read-only
+транзакции. --delay-ms добавляет задержку к каждому ответу PostgREST.
+
+Запуск из каталога server/ (сервис: SUPABASE_URL=http://127.0.0.1:8600,
+TELEGRAM_BASE_URL=http://127.0.0.1:8600/bot):
+
+    python -m scripts.fake_backends --port 8600
+    python -m scripts.fake_backends --port 8601 --replica-of http://127.0.0.1:8600 --lag-ms 300
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# Уникальные ключи таблиц: по ним работают upsert и ON CONFLICT
+UNIQUE_KEYS = {
+    "users": [("phone_number",), ("id",)],
+    "auth_sessions": [("id", "created_at")],
+    "user_quest_completions": [("user_id", "quest_id")],
+    "stats_counters": [("scope", "key")],
+    "broadcast_jobs": [("id",)],
+}
+GENERATED_ID = {"users", "auth_sessions", "broadcast_jobs"}
+LONG_POLL_CAP = 5.0
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.tables: dict[str, list[dict[str, Any]]] = defaultdict(list)
+
+    def insert(self, table: str, rows: list[dict], on_conflict: Optional[str], ignore_duplicates: bool) -> list[dict]:
+        result = []
+        conflict_keys = [tuple(on_conflict.split(","))] if on_conflict else UNIQUE_KEYS.get(table, [])
+        for row in rows:
+            row = dict(row)
+            if table in GENERATED_ID:
+                row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", now_iso())
+
+            existing = self._find_conflict(table, row, conflict_keys)
+            if existing is not None:
+                if ignore_duplicates:
+                    continue
+                if on_conflict is None:
+                    raise ValueError(f"duplicate key in {table}")
+                existing.update(row)
+                result.append(existing)
+                continue
+
+            self.tables[table].append(row)
+            result.append(row)
+        return result
+
+    def _find_conflict(self, table: str, row: dict, keys: list[tuple[str, ...]]) -> Optional[dict]:
+        for key in keys:
+            if not all(row.get(column) is not None for column in key):
+                continue
+            for existing in self.tables[table]:
+                if all(existing.get(column) == row.get(column) for column in key):
+                    return existing
+        return None
+
+    def select(self, table: str, filters: list[tuple[str, str, str]]) -> list[dict]:
+        return [row for row in self.tables[table] if all(_match_filter(row, *condition) for condition in filters)]
+
+
+def _split_conditions(tree: str) -> list[str]:
+    """Условия внутри or=(...) / and(...): запятые вне скобок и кавычек."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in tree:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current] if current else parts
+
+
+def _match_tree(row: dict, condition: str) -> bool:
+    for logic, combine in (("and(", all), ("or(", any)):
+        if condition.startswith(logic):
+            return combine(_match_tree(row, part) for part in _split_conditions(condition[len(logic):-1]))
+    column, op, value = condition.split(".", 2)
+    return _match(row.get(column), op, value.strip('"'))
+
+
+def _match_filter(row: dict, column: str, op: str, value: str) -> bool:
+    if op == "or":
+        return _match_tree(row, f"or{value}")
+    return _match(row.get(column), op, value)
+
+
+def _match(value: Any, op: str, expected: str) -> bool:
+    if op == "not":
+        inner_op, _, inner = expected.partition(".")
+        return not _match(value, inner_op, inner)
+    if op == "is":
+        return value is None if expected == "null" else str(value).lower() == expected
+    if value is None:
+        return False
+    if op == "in":
+        options = [item.strip().strip('"') for item in expected.strip("()").split(",")]
+        return str(value) in options
+    if op in ("gt", "gte", "lt", "lte"):
+        left, right = (value, type(value)(expected)) if isinstance(value, (int, float)) else (str(value), expected)
+        return {"gt": left > right, "gte": left >= right, "lt": left < right, "lte": left <= right}[op]
+    if op == "neq":
+        return str(value) != expected
+    return str(value) == expected
+
+
+def _parse_query(request: Request) -> tuple[list[tuple[str, str, str]], dict[str, str]]:
+    filters, options = [], {}
+    for name, raw in request.query_params.multi_items():
+        if name in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            options[name] = raw
+        elif name == "or":
+            filters.append(("", "or", raw))
+        else:
+            op, _, value = raw.partition(".")
+            filters.append((name, op, value))
+    return filters, options
+
+
+def _project(rows: list[dict], select: Optional[str]) -> list[dict]:
+    if not select or select.strip() == "*":
+        return rows
+    columns = []
+    for part in select.split(","):
+        part = part.strip()
+        # Embedded ресурсы (owner:users!fk(...)) заглушка не поддерживает
+        if part and "(" not in part and ")" not in part:
+            columns.append(part)
+    if "*" in columns:
+        return rows
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+class FakeBackends:
+    def __init__(
+        self,
+        replica_of: Optional[str] = None,
+        lag: float = 0.3,
+        delay: float = 0.0,
+        telegram_rate: int = 0,
+    ):
+        self.db = FakeDatabase()
+        self.requests: Counter[str] = Counter()
+        self.replica_of = replica_of
+        self.lag = lag
+        self.delay = delay
+
+        self.telegram_rate = telegram_rate
+        self.telegram_window = (0, 0)  # (секунда, отправлено в ней)
+        self.blocked: set[int] = set()
+        self.updates: list[tuple[Optional[str], dict]] = []  # (токен адресата или None, апдейт)
+        self.next_update_id = 1
+        self.updates_event = asyncio.Event()
+        self.sent: dict[int, list[dict]] = defaultdict(list)
+        self.next_message_id = 1
+
+    # PostgREST
+
+    async def rest(self, request: Request) -> Response:
+        table = request.path_params["table"]
+        self.requests[f"{request.method} {table}"] += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.replica_of and request.method != "GET":
+            return _read_only()
+        filters, options = _parse_query(request)
+        prefer = request.headers.get("prefer", "")
+
+        if request.method == "GET":
+            rows = self.db.select(table, filters)
+            if "order" in options:
+                # order=a,b.desc: устойчивая сортировка с последнего столбца
+                for term in reversed(options["order"].split(",")):
+                    column, _, direction = term.partition(".")
+                    rows = sorted(
+                        rows,
+                        key=lambda r: (r.get(column) is None, r.get(column)),
+                        reverse=direction.startswith("desc"),
+                    )
+            offset = int(options.get("offset", 0))
+            rows = rows[offset:]
+            if "limit" in options:
+                rows = rows[: int(options["limit"])]
+            return JSONResponse(_project(rows, options.get("select")))
+
+        body = await request.json() if await request.body() else {}
+        if request.method == "POST":
+            rows = body if isinstance(body, list) else [body]
+            try:
+                result = self.db.insert(
+                    table, rows, options.get("on_conflict"), "resolution=ignore-duplicates" in prefer
+                )
+            except ValueError as e:
+                return JSONResponse({"code": "23505", "message": str(e)}, status_code=409)
+            return JSONResponse(result, status_code=201)
+
+        if request.method == "PATCH":
+            rows = self.db.select(table, filters)
+            for row in rows:
+                row.update(body)
+                if table == "users":
+                    row["updated_at"] = now_iso()
+            return JSONResponse(rows)
+
+        if request.method == "DELETE":
+            rows = self.db.select(table, filters)
+            self.db.tables[table] = [row for row in self.db.tables[table] if row not in rows]
+            return JSONResponse(rows)
+
+        return JSONResponse({"message": "method not allowed"}, status_code=405)
+
+    async def rpc(self, request: Request) -> Response:
+        name = request.path_params["name"]
+        self.requests[f"rpc {name}"] += 1
+        if self.replica_of:
+            return _read_only()
+        params = await request.json() if await request.body() else {}
+
+        if name == "increment_stats_counter":
+            rows = self.db.select("stats_counters", [("scope", "eq", params["p_scope"]), ("key", "eq", params["p_key"])])
+            if rows:
+                rows[0]["value"] += params.get("p_delta", 1)
+                return JSONResponse(rows[0]["value"])
+            self.db.insert("stats_counters", [{
+                "scope": params["p_scope"], "key": params["p_key"], "value": params.get("p_delta", 1),
+            }], None, False)
+            return JSONResponse(params.get("p_delta", 1))
+
+        if name == "leaderboard_snapshot":
+            totals: dict[str, list] = {}
+            for row in self.db.tables["user_quest_completions"]:
+                entry = totals.setdefault(row["user_id"], [0, row["completed_at"]])
+                entry[0] += 1
+                entry[1] = max(entry[1], row["completed_at"])
+            after = params.get("p_after")
+            page = sorted(user_id for user_id in totals if after is None or user_id > after)[: params.get("p_limit", 1000)]
+            return JSONResponse([
+                {"user_id": user_id, "quest_count": totals[user_id][0], "last_completed_at": totals[user_id][1]}
+                for user_id in page
+            ])
+
+        if name == "link_telegram_contact":
+            existing = self.db.select("users", [("phone_number", "eq", params["p_phone_number"])])
+            bot_index = params.get("p_bot_index", 0)
+            if existing and existing[0].get("bot_index") is not None \
+                    and existing[0].get("telegram_id") == params["p_telegram_id"]:
+                bot_index = existing[0]["bot_index"]
+            user = self.db.insert("users", [{
+                "phone_number": params["p_phone_number"], "telegram_id": params["p_telegram_id"],
+                "bot_index": bot_index,
+            }], "phone_number", False)[0]
+            if params.get("p_telegram_username"):
+                user["telegram_username"] = params["p_telegram_username"]
+            user.setdefault("telegram_username", None)
+            sessions = [
+                row for row in self.db.select("auth_sessions", [
+                    ("phone_number", "eq", params["p_phone_number"]), ("status", "eq", "pending"),
+                ])
+                if row["expires_at"] > now_iso()
+            ]
+            session = max(sessions, key=lambda row: row["created_at"]) if sessions else None
+            return JSONResponse({"user": user, "session": session})
+
+        if name == "maintain_auth_session_partitions":
+            return JSONResponse([])
+
+        return JSONResponse({"message": f"unknown function {name}"}, status_code=404)
+
+    async def broadcast(self, request: Request) -> Response:
+        self.requests["realtime broadcast"] += 1
+        await request.body()
+        return Response(status_code=202)
+
+    async def replicate(self) -> None:
+        import httpx
+
+        async with httpx.AsyncClient(base_url=self.replica_of, timeout=5.0) as client:
+            while True:
+                await asyncio.sleep(self.lag)
+                try:
+                    response = await client.get("/_fake/dump")
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    continue
+                self.db.tables = defaultdict(list, response.json())
+
+    # Telegram Bot API
+
+    async def telegram(self, request: Request) -> Response:
+        method = request.path_params["method"]
+        token = request.path_params["token"]
+        self.requests[f"telegram {method}"] += 1
+        params = await self._telegram_params(request)
+
+        if method == "getMe":
+            return _ok({"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"})
+        if method == "getUpdates":
+            return _ok(await self._get_updates(token, params))
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id") or 0)
+            if self._over_rate():
+                self.requests["telegram 429"] += 1
+                return _error(429, "Too Many Requests: retry after 1", {"retry_after": 1})
+            if chat_id in self.blocked:
+                return _error(403, "Forbidden: bot was blocked by the user")
+            message = {
+                "message_id": self.next_message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+            self.next_message_id += 1
+            if chat_id:
+                self.sent[chat_id].append({"method": method, "bot_token": token, **params})
+            return _ok(message)
+        return _ok(True)
+
+    def _over_rate(self) -> bool:
+        if not self.telegram_rate:
+            return False
+        second, count = self.telegram_window
+        now = int(time.monotonic())
+        if now != second:
+            second, count = now, 0
+        self.telegram_window = (second, count + 1)
+        return count >= self.telegram_rate
+
+    async def _telegram_params(self, request: Request) -> dict:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            return await request.json()
+        form = await request.form()
+        params = {}
+        for key, value in form.items():
+            # PTB отправляет параметры формой, вложенные объекты - JSON строками
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    async def _get_updates(self, token: str, params: dict) -> list[dict]:
+        # Апдейт без адресата получает любой бот, с адресатом - только свой
+        offset = int(params.get("offset") or 0)
+        self.updates = [
+            (to, update) for to, update in self.updates
+            if update["update_id"] >= offset or to not in (None, token)
+        ]
+        mine = [update for to, update in self.updates if to in (None, token)]
+        if not mine:
+            self.updates_event.clear()
+            timeout = min(float(params.get("timeout") or 0), LONG_POLL_CAP)
+            try:
+                await asyncio.wait_for(self.updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            mine = [update for to, update in self.updates if to in (None, token)]
+        return mine
+
+    # Служебные эндпоинты
+
+    async def push_update(self, request: Request) -> Response:
+        update = await request.json()
+        update["update_id"] = self.next_update_id
+        self.next_update_id += 1
+        self.updates.append((request.query_params.get("token"), update))
+        self.updates_event.set()
+        return JSONResponse({"update_id": update["update_id"]})
+
+    async def block_chats(self, request: Request) -> Response:
+        self.blocked.update(int(chat_id) for chat_id in (await request.json())["chat_ids"])
+        return JSONResponse({"blocked": len(self.blocked)})
+
+    async def take_sent(self, request: Request) -> Response:
+        chat_id = int(request.path_params["chat_id"])
+        return JSONResponse(self.sent.pop(chat_id, []))
+
+    async def stats(self, request: Request) -> Response:
+        return JSONResponse({
+            "tables": {name: len(rows) for name, rows in self.db.tables.items()},
+            "requests": dict(self.requests),
+            "pending_updates": len(self.updates),
+        })
+
+    async def dump(self, request: Request) -> Response:
+        return JSONResponse(dict(self.db.tables))
+
+
+def _ok(result: Any) -> Response:
+    return JSONResponse({"ok": True, "result": result})
+
+
+def _error(code: int, description: str, parameters: Optional[dict] = None) -> Response:
+    body = {"ok": False, "error_code": code, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return JSONResponse(body, status_code=code)
+
+
+def _read_only() -> Response:
+    return JSONResponse(
+        {"code": "25006", "message": "cannot execute statement in a read-only transaction"}, status_code=405
+    )
+
+
+def create_app(
+    replica_of: Optional[str] = None,
+    lag: float = 0.3,
+    delay: float = 0.0,
+    telegram_rate: int = 0,
+) -> Starlette:
+    fake = FakeBackends(replica_of, lag, delay, telegram_rate)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        task = asyncio.create_task(fake.replicate()) if replica_of else None
+        yield
+        if task is not None:
+            task.cancel()
+
+    return Starlette(lifespan=lifespan, routes=[
+        Route("/rest/v1/rpc/{name}", fake.rpc, methods=["POST"]),
+        Route("/rest/v1/{table}", fake.rest, methods=["GET", "POST", "PATCH", "DELETE"]),
+        Route("/realtime/v1/api/broadcast", fake.broadcast, methods=["POST"]),
+        Route("/bot{token}/{method}", fake.telegram, methods=["GET", "POST"]),
+        Route("/_fake/telegram/updates", fake.push_update, methods=["POST"]),
+        Route("/_fake/telegram/sent/{chat_id}", fake.take_sent, methods=["GET"]),
+        Route("/_fake/telegram/blocked", fake.block_chats, methods=["POST"]),
+        Route("/_fake/stats", fake.stats, methods=["GET"]),
+        Route("/_fake/dump", fake.dump, methods=["GET"]),
+    ])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--replica-of", help="URL основной заглушки: работать read-репликой")
+    parser.add_argument("--lag-ms", type=int, default=300, help="отставание реплики")
+    parser.add_argument("--delay-ms", type=int, default=0, help="задержка ответов PostgREST")
+    parser.add_argument("--telegram-rate", type=int, default=0, help="лимит сообщений Telegram в секунду, 0 - без лимита")
+    args = parser.parse_args()
+
+    app = create_app(args.replica_of, args.lag_ms / 1000, args.delay_ms / 1000, args.telegram_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
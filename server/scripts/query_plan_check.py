@@ -0,0 +1,318 @@
+"""
+Регрессионная проверка планов запросов к users / auth_sessions / user_quest_completions.
+
+Скрипт создает отдельную базу на локальном Postgres, поднимает в ней
+src/database/schema.sql, заполняет синтетическими данными (по умолчанию 2 млн
+сессий за период хранения), выполняет EXPLAIN (ANALYZE, BUFFERS) для каждого запроса, который отправляют
+сервисы, и падает, если:
+  - в плане есть Seq Scan по большой таблице;
+  - медиана времени выполнения выше порога.
+
+Только для локального сервера - не запускать на Supabase проекте (нужно право
+CREATE DATABASE; роль service_role создается, если ее нет).
+Нужен psycopg (pip install "psycopg[binary]"). Запуск из каталога server/:
+
+    python -m scripts.query_plan_check --dsn postgresql://postgres@localhost/postgres
+    python -m scripts.query_plan_check --sessions 5000000 --max-ms 5 --keep
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "src" / "database" / "schema.sql"
+SCRATCH_DATABASE = "query_plan_check"
+
+# Таблицы, на которых Seq Scan - регрессия (stats_counters - единицы строк)
+LARGE_TABLES = {"users", "auth_sessions", "user_quest_completions"}
+
+# Заглушки auth.uid()/auth.role() и service_role для schema.sql (в Supabase они есть)
+AUTH_STUBS = """
+CREATE SCHEMA IF NOT EXISTS auth;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT FROM pg_roles WHERE rolname = 'service_role') THEN
+        CREATE ROLE service_role NOLOGIN;
+    END IF;
+    IF to_regprocedure('auth.uid()') IS NULL THEN
+        CREATE FUNCTION auth.uid() RETURNS uuid LANGUAGE sql STABLE AS 'SELECT NULL::uuid';
+    END IF;
+    IF to_regprocedure('auth.role()') IS NULL THEN
+        CREATE FUNCTION auth.role() RETURNS text LANGUAGE sql STABLE AS 'SELECT ''service_role''::text';
+    END IF;
+END $$;
+"""
+
+LOAD_USERS = """
+INSERT INTO users (phone_number, telegram_id, telegram_username, created_at)
+SELECT '+7900' || lpad(i::text, 7, '0'),
+       CASE WHEN i %% 3 = 0 THEN NULL ELSE 100000000 + i END,
+       'user' || i,
+       NOW() - random() * interval '365 days'
+FROM generate_series(1, %(users)s) AS i
+"""
+
+# ~1% pending за последние 5 минут, остальное - история за период хранения
+LOAD_SESSIONS = """
+INSERT INTO auth_sessions (phone_number, status, created_at, expires_at, approved_at)
+SELECT phone, status, created_at, created_at + interval '5 minutes',
+       CASE WHEN status = 'approved' THEN created_at + interval '30 seconds' END
+FROM (
+    SELECT '+7900' || lpad((1 + floor(random() * %(users)s))::int::text, 7, '0') AS phone,
+           CASE WHEN r < 0.01 THEN 'pending'
+                WHEN r < 0.60 THEN 'approved'
+                WHEN r < 0.70 THEN 'rejected'
+                ELSE 'expired' END AS status,
+           CASE WHEN r < 0.01 THEN NOW() - random() * interval '5 minutes'
+                ELSE NOW() - random() * %(retention_days)s * interval '1 day' END AS created_at
+    FROM (SELECT random() AS r FROM generate_series(1, %(sessions)s)) AS g
+) AS s
+"""
+
+LOAD_COMPLETIONS = """
+INSERT INTO user_quest_completions (user_id, quest_id, completed_at)
+SELECT u.id, 'quest-' || q, NOW() - random() * interval '30 days'
+FROM users u CROSS JOIN generate_series(0, 51) AS q
+WHERE random() < %(completion_rate)s
+"""
+
+
+class QueryCheck(NamedTuple):
+    name: str
+    sql: str
+    # Запросы на запись выполняются в транзакции с откатом
+    writes: bool = False
+    max_ms: Optional[float] = None
+
+
+# То же, что отправляют сервисы через PostgREST (src/services/*)
+QUERIES = [
+    QueryCheck("users by phone", "SELECT * FROM users WHERE phone_number = %(phone)s"),
+    QueryCheck("users by id", "SELECT * FROM users WHERE id = %(user_id)s"),
+    QueryCheck("users by telegram_id", "SELECT * FROM users WHERE telegram_id = %(telegram_id)s"),
+    QueryCheck("users by id list", "SELECT id, telegram_username FROM users WHERE id = ANY(%(user_ids)s)"),
+    QueryCheck(
+        "update user telegram info",
+        "UPDATE users SET telegram_id = telegram_id, telegram_username = 'x' WHERE phone_number = %(phone)s",
+        writes=True,
+    ),
+    QueryCheck(
+        "link_telegram_contact upsert",
+        "INSERT INTO users (phone_number, telegram_username) VALUES (%(phone)s, 'x') "
+        "ON CONFLICT (phone_number) DO UPDATE SET telegram_username = EXCLUDED.telegram_username",
+        writes=True,
+    ),
+    QueryCheck(
+        "auth session by id",
+        "SELECT * FROM auth_sessions WHERE id = %(session_id)s AND created_at >= NOW() - interval '10 minutes'",
+    ),
+    QueryCheck(
+        "auth session with owner",
+        "SELECT s.*, u.telegram_id AS owner_telegram_id FROM auth_sessions s "
+        "JOIN users u ON u.phone_number = s.phone_number WHERE s.id = %(session_id)s "
+        "AND s.created_at >= NOW() - interval '10 minutes'",
+    ),
+    QueryCheck(
+        "pending session by phone",
+        "SELECT * FROM auth_sessions WHERE phone_number = %(phone)s AND status = 'pending' "
+        "AND created_at >= NOW() - interval '10 minutes' ORDER BY created_at DESC LIMIT 1",
+    ),
+    QueryCheck(
+        "live pending session by phone",
+        "SELECT * FROM auth_sessions WHERE phone_number = %(phone)s AND status = 'pending' "
+        "AND expires_at > NOW() AND created_at >= NOW() - interval '10 minutes' ORDER BY created_at DESC LIMIT 1",
+    ),
+    QueryCheck(
+        "expire pending by phone",
+        "UPDATE auth_sessions SET status = 'expired' WHERE phone_number = %(phone)s AND status = 'pending' "
+        "AND created_at >= NOW() - interval '10 minutes'",
+        writes=True,
+    ),
+    QueryCheck(
+        "update session by id",
+        "UPDATE auth_sessions SET status = 'approved', approved_at = NOW() WHERE id = %(session_id)s "
+        "AND created_at >= NOW() - interval '10 minutes'",
+        writes=True,
+    ),
+    QueryCheck(
+        "expire_old_auth_sessions",
+        "UPDATE auth_sessions SET status = 'expired' WHERE status = 'pending' AND expires_at < NOW()",
+        writes=True,
+    ),
+    QueryCheck(
+        "broadcast recipients page",
+        "SELECT id, telegram_id FROM users WHERE telegram_id IS NOT NULL AND id > %(after_user_id)s "
+        "ORDER BY id LIMIT 200",
+    ),
+    QueryCheck("completions by user", "SELECT quest_id, completed_at FROM user_quest_completions WHERE user_id = %(user_id)s"),
+    QueryCheck(
+        "leaderboard snapshot page",
+        "SELECT c.user_id, count(*), max(c.completed_at) FROM user_quest_completions c "
+        "WHERE c.user_id > %(after_user_id)s GROUP BY c.user_id ORDER BY c.user_id LIMIT 1000",
+        max_ms=100,
+    ),
+]
+
+
+def connect(dsn: str, dbname: Optional[str] = None):
+    try:
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+    except ImportError:
+        sys.exit('psycopg is required: pip install "psycopg[binary]"')
+    if dbname:
+        dsn = make_conninfo(dsn, dbname=dbname)
+    return psycopg.connect(dsn, autocommit=True)
+
+
+def recreate_database(dsn: str) -> None:
+    with connect(dsn) as admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DATABASE}")
+        admin.execute(f"CREATE DATABASE {SCRATCH_DATABASE}")
+
+
+def drop_database(dsn: str) -> None:
+    with connect(dsn) as admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {SCRATCH_DATABASE}")
+
+
+def create_past_partitions(conn, retention_days: int) -> None:
+    # Сервис создает партиции только вперед; история за период хранения - здесь
+    today = datetime.now(timezone.utc).date()
+    for offset in range(retention_days, 0, -1):
+        day = today - timedelta(days=offset)
+        start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        conn.execute(
+            f"CREATE TABLE partitions.auth_sessions_p{day:%Y%m%d} PARTITION OF auth_sessions "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+        )
+
+
+def prepare(conn, users: int, sessions: int, completion_rate: float, retention_days: int) -> None:
+    conn.execute(AUTH_STUBS)
+    conn.execute(SCHEMA_PATH.read_text(encoding="utf-8"))
+
+    params = {
+        "users": users,
+        "sessions": sessions,
+        "completion_rate": completion_rate,
+        "retention_days": retention_days,
+    }
+    create_past_partitions(conn, retention_days)
+    for table, sql in (("users", LOAD_USERS), ("auth_sessions", LOAD_SESSIONS), ("user_quest_completions", LOAD_COMPLETIONS)):
+        started = time.perf_counter()
+        rows = conn.execute(sql, params).rowcount
+        print(f"loaded {table}: {rows:,} rows in {time.perf_counter() - started:.1f} s")
+
+    conn.execute("ANALYZE users, auth_sessions, user_quest_completions")
+
+
+def sample_params(conn) -> dict[str, Any]:
+    phone = conn.execute(
+        "SELECT phone_number FROM auth_sessions WHERE status = 'pending' LIMIT 1"
+    ).fetchone()[0]
+    user_id, telegram_id = conn.execute(
+        "SELECT id, telegram_id FROM users WHERE phone_number = %s", (phone,)
+    ).fetchone()
+    session_id = conn.execute("SELECT id FROM auth_sessions ORDER BY created_at DESC LIMIT 1").fetchone()[0]
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users ORDER BY random() LIMIT 10")]
+    after_user_id = conn.execute(
+        "SELECT user_id FROM user_quest_completions ORDER BY user_id OFFSET "
+        "(SELECT count(*) / 2 FROM user_quest_completions) LIMIT 1"
+    ).fetchone()[0]
+    return {
+        "phone": phone,
+        "user_id": user_id,
+        "telegram_id": telegram_id or 0,
+        "session_id": session_id,
+        "user_ids": user_ids,
+        "after_user_id": after_user_id,
+    }
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found.extend(seq_scans(child))
+    return found
+
+
+def explain(conn, check: QueryCheck, params: dict[str, Any]) -> tuple[dict, float]:
+    sql = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {check.sql}"
+    if check.writes:
+        with conn.transaction(force_rollback=True):
+            result = conn.execute(sql, params).fetchone()[0]
+    else:
+        result = conn.execute(sql, params).fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]["Plan"], result[0]["Execution Time"]
+
+
+def run_checks(conn, runs: int, max_ms: float, verbose: bool) -> bool:
+    params = sample_params(conn)
+
+    ok = True
+    for check in QUERIES:
+        timings = []
+        plan: dict = {}
+        for _ in range(runs):
+            plan, elapsed_ms = explain(conn, check, params)
+            timings.append(elapsed_ms)
+
+        median_ms = statistics.median(timings)
+        limit_ms = check.max_ms if check.max_ms is not None else max_ms
+        scans = seq_scans(plan)
+
+        problems = []
+        if scans:
+            problems.append(f"seq scan on {', '.join(sorted(set(scans)))}")
+        if median_ms > limit_ms:
+            problems.append(f"{median_ms:.2f} ms > {limit_ms:.0f} ms")
+        ok = ok and not problems
+
+        status = "FAIL " + "; ".join(problems) if problems else "ok"
+        print(f"{check.name:<28} {median_ms:8.3f} ms  {status}")
+        if verbose or problems:
+            print(json.dumps(plan, indent=2))
+
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN-based regression check for service queries")
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL", "postgresql://postgres@localhost/postgres"))
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--sessions", type=int, default=2_000_000)
+    parser.add_argument("--retention-days", type=int, default=7, help="Days of sessions kept (one partition each)")
+    parser.add_argument("--completion-rate", type=float, default=0.2, help="Share of the 52 quests done per user")
+    parser.add_argument("--runs", type=int, default=5, help="EXPLAIN ANALYZE runs per query (median is checked)")
+    parser.add_argument("--max-ms", type=float, default=10.0, help="Default execution time threshold")
+    parser.add_argument("--skip-load", action="store_true", help="Reuse data from a previous --keep run")
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {SCRATCH_DATABASE} database afterwards")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+
+    if not args.skip_load:
+        recreate_database(args.dsn)
+    try:
+        with connect(args.dsn, SCRATCH_DATABASE) as conn:
+            if not args.skip_load:
+                prepare(conn, args.users, args.sessions, args.completion_rate, args.retention_days)
+            ok = run_checks(conn, args.runs, args.max_ms, args.verbose)
+    finally:
+        if not args.keep:
+            drop_database(args.dsn)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
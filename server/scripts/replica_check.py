@@ -0,0 +1,187 @@
+"""
+Проверка маршрутизации чтений по read-репликам (src/database/router.py)
+на локальных заглушках: основная scripts.fake_backends и две реплики,
+которые копируют ее таблицы с отставанием (--replica-of, --lag-ms).
+Вторая реплика отвечает с задержкой.
+
+Сервисы вызываются в этом же процессе, по счетчикам запросов заглушек
+проверяется, куда ушло каждое чтение:
+  - сразу после записи (create_auth_session, approve_session,
+    complete_quest) чтения по ее ключам идут на primary и видят запись,
+    хотя реплики ее еще не получили;
+  - после окна read-your-writes чтения уходят на реплики, быстрая
+    получает большую часть;
+  - реплика остановлена - чтения без ошибок переходят на вторую и primary,
+    breaker открывается; после перезапуска и паузы breaker чтения
+    возвращаются на нее.
+
+Запуск из каталога server/:
+
+    python -m scripts.replica_check
+    python -m scripts.replica_check --reads 500 --lag-ms 500
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Callable
+
+import httpx
+
+BREAKER_RESET_SECONDS = 1.0
+READ_YOUR_WRITES_SECONDS = 1.0
+
+
+class Backend:
+    def __init__(self, port: int, extra: list[str]):
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.extra = extra
+        self.process: subprocess.Popen = None
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "scripts.fake_backends", "--port", str(self.port), *self.extra],
+            start_new_session=True,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{self.url}/_fake/stats")
+                return
+            except httpx.TransportError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.url} is not ready")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.send_signal(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def reads(self) -> int:
+        requests = httpx.get(f"{self.url}/_fake/stats").json()["requests"]
+        return sum(count for name, count in requests.items() if name.startswith("GET "))
+
+
+class Check:
+    def __init__(self):
+        self.failed = 0
+
+    def expect(self, name: str, ok: bool, detail: str = "") -> None:
+        self.failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+
+
+def count_reads(backends: list[Backend], action: Callable[[], object]) -> tuple[object, list[int]]:
+    before = [backend.reads() for backend in backends]
+    result = action()
+    return result, [backend.reads() - count for backend, count in zip(backends, before)]
+
+
+async def run(args: argparse.Namespace, primary: Backend, fast: Backend, slow: Backend) -> int:
+    from src.config.quest_catalog import get_quest_catalog
+    from src.database.router import get_database_router
+    from src.services import AuthService, ProgressService, UserService
+    from src.services.event_service import close_http_client
+
+    check = Check()
+    backends = [primary, fast, slow]
+    auth = AuthService()
+    users = UserService()
+    progress = ProgressService(users.db)
+    quest_id = next(iter(get_quest_catalog().bits))
+    settle = max(READ_YOUR_WRITES_SECONDS, args.lag_ms / 1000) + 0.5
+
+    # Запись -> чтение сразу: primary
+    session = auth.create_auth_session("+79990000001")
+    found, reads = count_reads(backends, lambda: auth.get_auth_session(session.id))
+    check.expect("new session is readable right after init", found is not None and reads[0] == 1, f"reads {reads}")
+
+    await auth.approve_session(session.id, 424242, "replica_check")
+    tokens, reads = count_reads(backends, lambda: auth.generate_tokens_for_session(session.id))
+    check.expect("tokens right after approve_session", tokens is not None and reads[1:] == [0, 0], f"reads {reads}")
+
+    user = users.get_user_by_phone("+79990000001")
+    progress.complete_quest(user.id, quest_id)
+    quests, reads = count_reads(backends, lambda: progress.get_progress(user.id))
+    check.expect("progress right after complete_quest", quest_id in (quests or []) and reads[1:] == [0, 0], f"reads {reads}")
+
+    # Окно прошло и реплики догнали: чтения на реплики, быстрой больше
+    time.sleep(settle)
+    _, reads = count_reads(backends, lambda: [users.get_user_by_id(user.id) for _ in range(args.reads)])
+    check.expect("reads go to replicas after the window", reads[0] == 0, f"reads {reads}")
+    check.expect("faster replica gets most reads", reads[1] > reads[2], f"fast {reads[1]}, slow {reads[2]}")
+    stale = [users.get_user_by_id(user.id) for _ in range(20)]
+    check.expect("replicas return the replicated row", all(u is not None and u.telegram_id == 424242 for u in stale))
+
+    # Реплика упала: без ошибок, breaker открыт, чтения на вторую реплику и primary
+    fast.stop()
+    errors = 0
+    for _ in range(args.reads):
+        try:
+            if users.get_user_by_id(user.id) is None:
+                errors += 1
+        except Exception:
+            errors += 1
+    stats = get_database_router().stats()["replicas"][f"127.0.0.1:{fast.port}"]
+    check.expect("no errors while a replica is down", errors == 0, f"errors {errors}")
+    check.expect("breaker of the stopped replica is open", stats["breaker"] == "open", f"fallbacks {stats['fallbacks']}")
+
+    # Перезапуск: после паузы breaker пробное чтение закрывает его
+    fast.start()
+    time.sleep(BREAKER_RESET_SECONDS + args.lag_ms / 1000 + 0.5)
+    _, reads = count_reads(backends, lambda: [users.get_user_by_id(user.id) for _ in range(args.reads)])
+    check.expect("restarted replica receives reads again", reads[1] > 0, f"reads {reads}")
+
+    await close_http_client()
+    print(f"\nread routing: {get_database_router().stats()}")
+    return check.failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8620, help="основная заглушка; реплики на port+1, port+2")
+    parser.add_argument("--lag-ms", type=int, default=300)
+    parser.add_argument("--slow-delay-ms", type=int, default=20, help="задержка медленной реплики")
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    primary = Backend(args.port, [])
+    fast = Backend(args.port + 1, ["--replica-of", primary.url, "--lag-ms", str(args.lag_ms)])
+    slow = Backend(args.port + 2, [
+        "--replica-of", primary.url, "--lag-ms", str(args.lag_ms), "--delay-ms", str(args.slow_delay_ms),
+    ])
+
+    os.environ.update({
+        "SUPABASE_URL": primary.url,
+        "SUPABASE_KEY": "check.anon.key",
+        "SUPABASE_SERVICE_KEY": "check.service.key",
+        "SUPABASE_REPLICA_URLS": f'["{fast.url}", "{slow.url}"]',
+        "READ_YOUR_WRITES_SECONDS": str(READ_YOUR_WRITES_SECONDS),
+        "BREAKER_RESET_SECONDS": str(BREAKER_RESET_SECONDS),
+        "TELEGRAM_BOT_TOKEN": "123456:check",
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "check-secret"),
+        "PROGRESS_WRITE_BEHIND": "false",
+        "LOG_LEVEL": "ERROR",
+    })
+
+    backends = [primary, fast, slow]
+    try:
+        for backend in backends:
+            backend.start()
+        failed = asyncio.run(run(args, primary, fast, slow))
+    finally:
+        for backend in backends:
+            backend.stop()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Soak-тест: часы смешанного трафика на локальных заглушках и контроль утечек.
+
+Поднимает scripts.fake_backends (PostgREST, Realtime, Telegram Bot API) и
+сервис (uvicorn main:app) отдельными процессами. Виртуальные пользователи
+по кругу проходят вход целиком - /api/auth/init, контакт и нажатие
+"подтвердить" в боте (апдейты через заглушку Telegram), опрос
+/api/auth/tokens - а затем refresh, прогресс, выполнение квестов с
+Idempotency-Key, лидерборд и /me.
+
+Раз в --sample-interval секунд снимаются показатели процесса сервиса:
+RSS, открытые fd, сокеты (/proc/<pid>), число asyncio задач и потоков
+(/metrics). После прогрева по ним строится линейный тренд; если рост в час
+превышает заданный наклон, тест падает (код возврата 1). Только Linux.
+
+Запуск из каталога server/:
+
+    python -m scripts.soak --duration 2h --users 20
+    python -m scripts.soak --duration 10m --warmup 60 --csv soak.csv
+"""
+import argparse
+import asyncio
+import csv
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+# Допустимый рост в час по умолчанию
+DEFAULT_SLOPES = {"rss_mb": 20.0, "fds": 10.0, "sockets": 10.0, "asyncio_tasks": 10.0, "threads": 2.0}
+PROGRESS_ROUNDS_PER_LOGIN = 20
+LOGIN_TIMEOUT = 15.0
+
+
+def parse_duration(value: str) -> float:
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+@dataclass
+class Sample:
+    elapsed: float
+    rss_mb: float
+    fds: int
+    sockets: int
+    asyncio_tasks: int
+    threads: int
+
+
+class Counters:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.logins = 0
+        self.last_error = ""
+
+    def check(self, response: httpx.Response, expected: tuple[int, ...] = (200, 201)) -> httpx.Response:
+        self.requests += 1
+        if response.status_code not in expected:
+            self.errors += 1
+            self.last_error = f"{response.request.method} {response.request.url.path}: {response.status_code}"
+        return response
+
+
+def process_sample(pid: int, metrics: dict, elapsed: float) -> Sample:
+    rss_kb = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+                break
+
+    fds = sockets = 0
+    fd_dir = f"/proc/{pid}/fd"
+    for fd in os.listdir(fd_dir):
+        fds += 1
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)).startswith("socket:"):
+                sockets += 1
+        except OSError:
+            pass
+
+    runtime = metrics.get("runtime", {})
+    return Sample(elapsed, rss_kb / 1024, fds, sockets, runtime.get("asyncio_tasks", 0), runtime.get("threads", 0))
+
+
+def slope_per_hour(xs: list[float], ys: list[float]) -> float:
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if var_x == 0:
+        return 0.0
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    return cov / var_x * 3600
+
+
+class VirtualUser:
+    def __init__(self, index: int, api: httpx.AsyncClient, fake: httpx.AsyncClient, counters: Counters, quests: list[str]):
+        self.telegram_id = 700_000 + index
+        self.phone = f"+7999{1_000_000 + index:07d}"
+        self.api = api
+        self.fake = fake
+        self.counters = counters
+        self.quests = quests
+        self.linked = False
+
+    def _telegram_user(self) -> dict:
+        return {"id": self.telegram_id, "is_bot": False, "first_name": f"Soak{self.telegram_id}"}
+
+    def _chat(self) -> dict:
+        return {"id": self.telegram_id, "type": "private"}
+
+    async def login(self) -> Optional[dict]:
+        response = self.counters.check(await self.api.post("/api/auth/init", json={"phone_number": self.phone}), (201,))
+        if response.status_code != 201:
+            return None
+        session_id = response.json()["session_id"]
+
+        if not self.linked:
+            # Первый вход: пользователь делится контактом, бот присылает запрос подтверждения
+            await self.fake.post("/_fake/telegram/updates", json={"message": {
+                "message_id": 1, "date": int(time.time()), "chat": self._chat(), "from": self._telegram_user(),
+                "contact": {"phone_number": self.phone, "first_name": "Soak", "user_id": self.telegram_id},
+            }})
+            self.linked = True
+
+        callback_data = f"approve:{session_id}"
+        deadline = time.monotonic() + LOGIN_TIMEOUT
+        while not await self._received(callback_data):
+            if time.monotonic() > deadline:
+                self.counters.errors += 1
+                self.counters.last_error = f"no approval request for {session_id}"
+                return None
+            await asyncio.sleep(0.2)
+
+        await self.fake.post("/_fake/telegram/updates", json={"callback_query": {
+            "id": uuid.uuid4().hex, "from": self._telegram_user(), "chat_instance": "soak", "data": callback_data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": self._chat(), "text": "auth"},
+        }})
+
+        while time.monotonic() < deadline:
+            response = await self.api.get(f"/api/auth/tokens/{session_id}")
+            if response.status_code == 200:
+                self.counters.check(response)
+                self.counters.logins += 1
+                return response.json()
+            await asyncio.sleep(0.2)
+
+        self.counters.errors += 1
+        self.counters.last_error = f"tokens not issued for {session_id}"
+        return None
+
+    async def _received(self, callback_data: str) -> bool:
+        sent = (await self.fake.get(f"/_fake/telegram/sent/{self.telegram_id}")).json()
+        return any(callback_data in str(message.get("reply_markup")) for message in sent)
+
+    async def run(self, stop: asyncio.Event, think: float) -> None:
+        while not stop.is_set():
+            tokens = await self.login()
+            if tokens is None:
+                await asyncio.sleep(1)
+                continue
+
+            for _ in range(PROGRESS_ROUNDS_PER_LOGIN):
+                if stop.is_set():
+                    return
+                tokens = await self.progress_round(tokens)
+                await asyncio.sleep(think * random.uniform(0.5, 1.5))
+
+    async def progress_round(self, tokens: dict) -> dict:
+        check = self.counters.check
+        response = check(await self.api.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}))
+        if response.status_code == 200:
+            tokens = response.json()
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+        check(await self.api.get("/api/progress", params={"format": random.choice(["full", "compact"])}, headers=headers))
+
+        quest_id = random.choice(self.quests)
+        key = uuid.uuid4().hex
+        for _ in range(random.choice([1, 1, 2])):
+            # Иногда повтор с тем же ключом, как при ретрае клиента
+            check(await self.api.post(
+                "/api/progress/complete", json={"quest_id": quest_id}, headers={**headers, "Idempotency-Key": key}
+            ))
+
+        check(await self.api.get("/api/progress/leaderboard", params={"limit": 10}, headers=headers))
+        check(await self.api.get("/api/auth/me", headers=headers))
+        return tokens
+
+
+async def wait_ready(client: httpx.AsyncClient, path: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(path)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.3)
+    raise RuntimeError(f"{client.base_url}{path} is not ready after {timeout:.0f}s")
+
+
+async def soak(args: argparse.Namespace, server_pid: int) -> tuple[list[Sample], Counters]:
+    limits = httpx.Limits(max_connections=args.users * 2)
+    counters = Counters()
+    samples: list[Sample] = []
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30, limits=limits) as api, \
+            httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.fake_port}", timeout=30, limits=limits) as fake:
+        await wait_ready(fake, "/_fake/stats", 30)
+        await wait_ready(api, "/ready", 60)
+
+        quests = [quest["id"] for quest in (await api.get("/api/progress/catalog")).json()["quests"]]
+        users = [VirtualUser(i, api, fake, counters, quests) for i in range(args.users)]
+
+        stop = asyncio.Event()
+        workers = [asyncio.create_task(user.run(stop, args.think_ms / 1000)) for user in users]
+
+        started = time.monotonic()
+        writer = None
+        csv_file = open(args.csv, "w", newline="") if args.csv else None
+        if csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["elapsed_s", "rss_mb", "fds", "sockets", "asyncio_tasks", "threads", "requests", "errors"])
+
+        print(f"{'elapsed':>8} {'rss MB':>8} {'fds':>5} {'socks':>6} {'tasks':>6} {'thr':>4} {'logins':>7} {'req':>8} {'err':>5}")
+        try:
+            while True:
+                elapsed = time.monotonic() - started
+                metrics = (await api.get("/metrics")).json()
+                sample = process_sample(server_pid, metrics, elapsed)
+                samples.append(sample)
+                print(
+                    f"{elapsed:>7.0f}s {sample.rss_mb:>8.1f} {sample.fds:>5} {sample.sockets:>6} "
+                    f"{sample.asyncio_tasks:>6} {sample.threads:>4} {counters.logins:>7} {counters.requests:>8} {counters.errors:>5}",
+                    flush=True,
+                )
+                if writer:
+                    writer.writerow([round(elapsed, 1), round(sample.rss_mb, 2), sample.fds, sample.sockets,
+                                     sample.asyncio_tasks, sample.threads, counters.requests, counters.errors])
+                    csv_file.flush()
+                if elapsed >= args.duration:
+                    break
+                await asyncio.sleep(min(args.sample_interval, args.duration - elapsed))
+        finally:
+            stop.set()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if csv_file:
+                csv_file.close()
+
+    return samples, counters
+
+
+def evaluate(samples: list[Sample], counters: Counters, args: argparse.Namespace, slopes: dict[str, float]) -> bool:
+    steady = [sample for sample in samples if sample.elapsed >= args.warmup]
+    ok = True
+
+    error_rate = counters.errors / max(counters.requests, 1)
+    print(f"\nrequests: {counters.requests}, logins: {counters.logins}, errors: {counters.errors} ({error_rate:.2%})")
+    if counters.last_error:
+        print(f"last error: {counters.last_error}")
+    if error_rate > args.max_error_rate:
+        print(f"FAIL: error rate above {args.max_error_rate:.2%}")
+        ok = False
+
+    if len(steady) < 3:
+        print("FAIL: not enough samples after warmup to compute trends (increase --duration)")
+        return False
+
+    xs = [sample.elapsed for sample in steady]
+    print(f"\n{'metric':<14} {'first':>9} {'last':>9} {'per hour':>10} {'limit':>8}")
+    for metric, limit in slopes.items():
+        ys = [float(getattr(sample, metric)) for sample in steady]
+        slope = slope_per_hour(xs, ys)
+        failed = slope > limit
+        ok = ok and not failed
+        print(f"{metric:<14} {ys[0]:>9.1f} {ys[-1]:>9.1f} {slope:>+10.2f} {limit:>8.1f} {'FAIL' if failed else 'ok'}")
+    return ok
+
+
+def start_process(command: list[str], env: dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(command, env=env, start_new_session=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("1h"), help="например 90s, 30m, 2h")
+    parser.add_argument("--warmup", type=parse_duration, default=parse_duration("2m"), help="не учитывать в трендах")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--think-ms", type=float, default=200)
+    parser.add_argument("--sample-interval", type=parse_duration, default=parse_duration("15s"))
+    parser.add_argument("--port", type=int, default=8610)
+    parser.add_argument("--fake-port", type=int, default=8600)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--csv", help="сохранить показатели в CSV")
+    for metric, limit in DEFAULT_SLOPES.items():
+        parser.add_argument(f"--max-{metric.replace('_', '-')}-per-hour", type=float, default=limit)
+    args = parser.parse_args()
+    slopes = {metric: getattr(args, f"max_{metric}_per_hour") for metric in DEFAULT_SLOPES}
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    env = {
+        **os.environ,
+        "SUPABASE_URL": fake_url,
+        "SUPABASE_KEY": "soak.anon.key",
+        "SUPABASE_SERVICE_KEY": "soak.service.key",
+        "TELEGRAM_BOT_TOKEN": "123456:soak",
+        "TELEGRAM_BASE_URL": f"{fake_url}/bot",
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "soak-secret"),
+        # Виртуальные пользователи входят чаще лимитов для людей
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "DEBUG": "false",
+    }
+
+    fake = start_process([sys.executable, "-m", "scripts.fake_backends", "--port", str(args.fake_port)], env)
+    server = start_process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"], env
+    )
+    try:
+        samples, counters = asyncio.run(soak(args, server.pid))
+    finally:
+        # Сервис останавливается первым: бот при выключении еще обращается к заглушке Telegram
+        for process in (server, fake):
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    sys.exit(0 if evaluate(samples, counters, args, slopes) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Отчет по trace'ам входа (src/utils/tracing.py): куда уходит время между
+POST /api/auth/init и успешным GET /api/auth/tokens/{session_id}.
+
+Для каждого завершенного входа считаются:
+  - total: от начала /init до конца /tokens;
+  - время каждого участка (HTTP запросы и апдейты бота);
+  - время вызовов зависимостей (supabase, realtime, telegram) по участкам;
+  - вне сервера: total минус время участков - пользователь в Telegram,
+    доставка апдейтов бота, интервал опроса фронтенда.
+По всем входам выводятся p50 и p99.
+
+Запуск из каталога server/:
+
+    python -m scripts.trace_report data/traces.ndjson
+    python -m scripts.trace_report data/traces-*.ndjson --slowest 5
+"""
+import argparse
+import json
+import math
+from collections import defaultdict
+from typing import Iterable, Optional
+
+INIT_SPAN = "POST /api/auth/init"
+TOKENS_SPAN = "GET /api/auth/tokens/{session_id}"
+OUTSIDE = "(вне сервера)"
+
+
+def load_spans(paths: Iterable[str]) -> dict[str, list[dict]]:
+    traces: dict[str, list[dict]] = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    span = json.loads(line)
+                    traces[span["trace_id"]].append(span)
+    return traces
+
+
+def end_of(span: dict) -> float:
+    return span["start"] + span["duration_ms"] / 1000
+
+
+def analyze(spans: list[dict]) -> Optional[tuple[float, dict[str, float]]]:
+    """total мс и разбивка по компонентам или None, если вход не завершен."""
+    roots = sorted((s for s in spans if s["parent_id"] is None), key=lambda s: s["start"])
+    init = next((s for s in roots if s["name"] == INIT_SPAN), None)
+    if init is None:
+        return None
+    tokens = next(
+        (
+            s for s in roots
+            if s["name"] == TOKENS_SPAN and s["start"] >= init["start"] and s["attrs"].get("status") == 200
+        ),
+        None,
+    )
+    if tokens is None:
+        return None
+
+    window = [s for s in roots if init["start"] <= s["start"] <= tokens["start"]]
+    root_ids = {s["span_id"]: s["name"] for s in window}
+    parents = {s["span_id"]: s["parent_id"] for s in spans}
+
+    def hop_of(span: dict) -> Optional[str]:
+        parent = span["parent_id"]
+        while parent is not None and parent not in root_ids:
+            parent = parents.get(parent)
+        return root_ids.get(parent) if parent else None
+
+    parts: dict[str, float] = defaultdict(float)
+    for root in window:
+        parts[root["name"]] += root["duration_ms"]
+    for span in spans:
+        if span["parent_id"] is None:
+            continue
+        hop = hop_of(span)
+        if hop is not None:
+            parts[f"{hop} > {span['name']}"] += span["duration_ms"]
+
+    total = (end_of(tokens) - init["start"]) * 1000
+    parts[OUTSIDE] = total - sum(root["duration_ms"] for root in window)
+    return total, parts
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest-rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="NDJSON файлы со span'ами")
+    parser.add_argument("--slowest", type=int, default=0, help="показать N самых медленных входов")
+    args = parser.parse_args()
+
+    traces = load_spans(args.paths)
+    results = {}
+    for trace_id, spans in traces.items():
+        analyzed = analyze(spans)
+        if analyzed is not None:
+            results[trace_id] = analyzed
+
+    print(f"traces: {len(traces)}, completed logins: {len(results)}")
+    if not results:
+        return
+
+    totals = [total for total, _ in results.values()]
+    components: dict[str, list[float]] = defaultdict(list)
+    for _, parts in results.values():
+        for name, value in parts.items():
+            components[name].append(value)
+
+    print(f"\n{'component':<60} {'logins':>7} {'p50 ms':>10} {'p99 ms':>10}")
+    print(f"{'total /init -> /tokens':<60} {len(totals):>7} {percentile(totals, 0.5):>10.1f} {percentile(totals, 0.99):>10.1f}")
+    # Компоненты, которых нет во входе (бот не открывался), считаются нулем
+    for name in sorted(components, key=lambda n: -percentile(components[n], 0.5)):
+        values = components[name] + [0.0] * (len(results) - len(components[name]))
+        print(f"{name:<60} {len(components[name]):>7} {percentile(values, 0.5):>10.1f} {percentile(values, 0.99):>10.1f}")
+
+    if args.slowest:
+        print("\nslowest logins:")
+        for trace_id, (total, parts) in sorted(results.items(), key=lambda item: -item[1][0])[:args.slowest]:
+            session_id = next((s.get("session_id") for s in traces[trace_id] if s.get("session_id")), "?")
+            top = sorted(parts.items(), key=lambda item: -item[1])[:3]
+            breakdown = ", ".join(f"{name} {value:.0f} ms" for name, value in top)
+            print(f"  {session_id} {total:.0f} ms: {breakdown}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Воспроизведение записанного трафика (TRAFFIC_CAPTURE_PATH,
+src/utils/traffic_capture.py) и сравнение задержек двух сборок.
+
+Прогон поднимает scripts.fake_backends и сервис из --server-dir (каталог
+server/ нужной сборки, например git worktree) и отправляет записанные
+запросы в исходном порядке и с исходными интервалами (--speed 2 - вдвое
+чаще). Нагрузка открытая: запрос уходит в свое время, даже если предыдущие
+еще не ответили; если не хватило --max-in-flight, запрос опаздывает -
+опоздание выводится как schedule lag.
+
+Хеши из записи детерминированно превращаются в данные заглушки:
+  - хеш пользователя -> пользователь с номером +7999XXXXXXX, привязанным
+    Telegram и id uuid5; токены для него выписываются по JWT_SECRET_KEY
+    прогона;
+  - хеш сессии -> session_id, который вернул воспроизведенный /init;
+    перед /tokens, который в записи ответил 200, сессия подтверждается
+    напрямую в заглушке (подтверждение в боте - не HTTP трафик).
+quest_id и query string берутся из записи (quest_id не из каталога
+записан как UNKNOWN_ARG и получает тот же 400). Служебные маршруты
+(/admin, /metrics) и запросы без шаблона пропускаются.
+
+По каждому маршруту считаются p50/p90/p99 задержки на клиенте, 5xx и
+расхождения статуса с записью. Два результата (--out) сравниваются
+--compare: код возврата 1, если p99 какого-либо маршрута вырос больше
+--max-regression.
+
+Запуск из каталога server/:
+
+    python -m scripts.traffic_replay data/capture.bin --inspect
+    python -m scripts.traffic_replay data/capture.bin --label base --out base.json
+    python -m scripts.traffic_replay data/capture.bin --server-dir ../../head/server --out head.json
+    python -m scripts.traffic_replay --compare base.json head.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+
+from src.utils.traffic_capture import FLAG_IDEMPOTENCY_KEY, CapturedRequest, read_capture
+
+SKIPPED_PREFIXES = ("/admin", "/metrics")
+SESSION_PARAM = "{session_id}"
+USER_NAMESPACE = uuid.UUID("5f1c3a52-8a0e-4d52-9c39-6d0f1b7e2a11")
+SESSION_WAIT_SECONDS = 10.0
+STARTUP_TIMEOUT = 60.0
+
+
+def percentile(values: list[float], q: float) -> float:
+    # nearest-rank
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)] if ordered else 0.0
+
+
+def route_path(route: str) -> str:
+    return route.split(" ", 1)[1]
+
+
+def is_replayable(route: str) -> bool:
+    path = route_path(route)
+    if path.startswith(SKIPPED_PREFIXES) or path.startswith("("):
+        return False
+    # Из параметров пути в записи есть только сессия
+    return "{" not in path.replace(SESSION_PARAM, "")
+
+
+class Identities:
+    """Данные заглушки, детерминированно полученные из хешей записи."""
+
+    def __init__(self):
+        from src.services import JWTService
+
+        self.jwt = JWTService
+        self.sessions: dict[int, asyncio.Future] = {}
+        self.approved: set[int] = set()
+        self.tokens: dict[int, tuple[str, str]] = {}
+
+    @staticmethod
+    def user_id(subject: int) -> str:
+        return str(uuid.uuid5(USER_NAMESPACE, str(subject)))
+
+    @staticmethod
+    def phone(subject: int) -> str:
+        return f"+7999{subject % 10_000_000:07d}"
+
+    @staticmethod
+    def telegram_id(subject: int) -> int:
+        return 1_000_000_000 + subject % 1_000_000_000
+
+    def user_row(self, subject: int) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "id": self.user_id(subject),
+            "phone_number": self.phone(subject),
+            "telegram_id": self.telegram_id(subject),
+            "telegram_username": None,
+            "bot_index": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    def token_pair(self, subject: int) -> tuple[str, str]:
+        if subject not in self.tokens:
+            user_id, phone = self.user_id(subject), self.phone(subject)
+            self.tokens[subject] = (
+                self.jwt.create_access_token(user_id, phone),
+                self.jwt.create_refresh_token(user_id, phone),
+            )
+        return self.tokens[subject]
+
+    def session_future(self, session: int) -> asyncio.Future:
+        if session not in self.sessions:
+            self.sessions[session] = asyncio.get_running_loop().create_future()
+        return self.sessions[session]
+
+
+class Replay:
+    def __init__(self, args: argparse.Namespace, api: httpx.AsyncClient, fake: httpx.AsyncClient):
+        self.args = args
+        self.api = api
+        self.fake = fake
+        self.ids = Identities()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.mismatches: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.unmapped = 0
+        self.lag: list[float] = []
+
+    async def seed(self, requests: list[CapturedRequest]) -> None:
+        subjects = sorted({request.subject for request in requests if request.subject})
+        rows = [self.ids.user_row(subject) for subject in subjects]
+        for start in range(0, len(rows), 1000):
+            response = await self.fake.post("/rest/v1/users", json=rows[start:start + 1000])
+            response.raise_for_status()
+        print(f"seeded {len(rows)} users")
+
+    async def run(self, requests: list[CapturedRequest]) -> None:
+        semaphore = asyncio.Semaphore(self.args.max_in_flight)
+        tasks = []
+        first = requests[0].at
+        started = time.monotonic()
+        for request in requests:
+            if not is_replayable(request.route):
+                self.skipped[request.route] += 1
+                continue
+
+            due = (request.at - first) / self.args.speed
+            delay = due - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await semaphore.acquire()
+            self.lag.append(max(0.0, time.monotonic() - started - due) * 1000)
+            task = asyncio.create_task(self.send(request))
+            task.add_done_callback(lambda _: semaphore.release())
+            tasks.append(task)
+        await asyncio.gather(*tasks)
+
+    async def send(self, captured: CapturedRequest) -> None:
+        method, path = captured.route.split(" ", 1)
+        headers = {}
+        body = None
+        if captured.subject and path not in ("/api/auth/init", "/api/auth/refresh"):
+            headers["Authorization"] = f"Bearer {self.ids.token_pair(captured.subject)[0]}"
+        if captured.flags & FLAG_IDEMPOTENCY_KEY:
+            headers["Idempotency-Key"] = uuid.uuid4().hex
+
+        if path == "/api/auth/init":
+            body = {"phone_number": self.ids.phone(captured.subject)}
+        elif path == "/api/auth/refresh":
+            body = {"refresh_token": self.ids.token_pair(captured.subject)[1]}
+        elif path == "/api/progress/complete":
+            body = {"quest_id": captured.arg}
+        elif captured.arg:
+            path = f"{path}?{captured.arg}"
+
+        if SESSION_PARAM in path:
+            session_id = await self._session_id(captured)
+            path = path.replace(SESSION_PARAM, session_id)
+
+        created = None
+        started = time.perf_counter()
+        try:
+            response = await self.api.request(method, path, json=body, headers=headers)
+            status = response.status_code
+            if status == 201 and captured.route == "POST /api/auth/init":
+                created = response.json()["session_id"]
+        except httpx.HTTPError:
+            status = 0
+        self.latencies[captured.route].append(round((time.perf_counter() - started) * 1000, 3))
+        self.statuses[captured.route][status] += 1
+        if status != captured.status:
+            self.mismatches[captured.route] += 1
+
+        if captured.route == "POST /api/auth/init" and captured.session:
+            future = self.ids.session_future(captured.session)
+            if not future.done():
+                future.set_result(created)
+
+    async def _session_id(self, captured: CapturedRequest) -> str:
+        future = self.ids.session_future(captured.session)
+        try:
+            session_id = await asyncio.wait_for(asyncio.shield(future), SESSION_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            session_id = None
+        if session_id is None:
+            # /init этой сессии не попал в запись - запрос к несуществующей сессии
+            self.unmapped += 1
+            return str(uuid.uuid4())
+
+        if captured.status == 200 and captured.session not in self.ids.approved:
+            self.ids.approved.add(captured.session)
+            await self.fake.patch(f"/rest/v1/auth_sessions?id=eq.{session_id}", json={
+                "status": "approved",
+                "telegram_id": self.ids.telegram_id(captured.subject or captured.session),
+                "approved_at": datetime.now(timezone.utc).isoformat(),
+            })
+        return session_id
+
+    def result(self, args: argparse.Namespace, requests: list[CapturedRequest]) -> dict:
+        captured_ms: dict[str, list[float]] = defaultdict(list)
+        for request in requests:
+            captured_ms[request.route].append(request.duration_ms)
+        return {
+            "label": args.label,
+            "server_dir": os.path.abspath(args.server_dir),
+            "speed": args.speed,
+            "replayed": sum(len(values) for values in self.latencies.values()),
+            "skipped": dict(self.skipped),
+            "unmapped_sessions": self.unmapped,
+            "schedule_lag_ms": {"p50": percentile(self.lag, 0.5), "p99": percentile(self.lag, 0.99)},
+            "routes": {
+                route: {
+                    "latencies_ms": values,
+                    "statuses": {str(status): count for status, count in self.statuses[route].items()},
+                    "status_mismatches": self.mismatches[route],
+                    "captured_p50_ms": percentile(captured_ms[route], 0.5),
+                    "captured_p99_ms": percentile(captured_ms[route], 0.99),
+                }
+                for route, values in self.latencies.items()
+            },
+        }
+
+
+def print_replay(result: dict) -> None:
+    lag = result["schedule_lag_ms"]
+    print(f"\nreplayed: {result['replayed']}, skipped: {sum(result['skipped'].values())}, "
+          f"unmapped sessions: {result['unmapped_sessions']}, schedule lag p50/p99: {lag['p50']:.1f}/{lag['p99']:.1f} ms")
+    print(f"\n{'route':<44} {'count':>7} {'5xx':>5} {'status!=':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'prod p99':>9}")
+    for route, data in sorted(result["routes"].items()):
+        values = data["latencies_ms"]
+        # 0 - запрос не дошел до сервиса
+        errors = sum(count for status, count in data["statuses"].items() if int(status) == 0 or int(status) >= 500)
+        print(f"{route:<44} {len(values):>7} {errors:>5} {data['status_mismatches']:>8} "
+              f"{percentile(values, 0.5):>9.1f} {percentile(values, 0.9):>9.1f} {percentile(values, 0.99):>9.1f} "
+              f"{data['captured_p99_ms']:>9.1f}")
+
+
+def inspect(requests: list[CapturedRequest]) -> None:
+    span = requests[-1].at - requests[0].at if requests else 0.0
+    print(f"requests: {len(requests)} over {span:.0f}s ({len(requests) / span if span else 0:.1f} rps), "
+          f"users: {len({r.subject for r in requests if r.subject})}, sessions: {len({r.session for r in requests if r.session})}")
+    by_route: dict[str, list[CapturedRequest]] = defaultdict(list)
+    for request in requests:
+        by_route[request.route].append(request)
+    print(f"\n{'route':<44} {'count':>7} {'replay':>6} {'p50 ms':>9} {'p99 ms':>9}  statuses")
+    for route, items in sorted(by_route.items(), key=lambda item: -len(item[1])):
+        durations = [request.duration_ms for request in items]
+        statuses = Counter(request.status for request in items)
+        print(f"{route:<44} {len(items):>7} {'yes' if is_replayable(route) else 'no':>6} "
+              f"{percentile(durations, 0.5):>9.1f} {percentile(durations, 0.99):>9.1f}  {dict(statuses)}")
+
+
+def compare(base_path: str, head_path: str, max_regression: float, min_count: int) -> bool:
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(head_path, encoding="utf-8") as f:
+        head = json.load(f)
+
+    print(f"base: {base['label']} ({base['server_dir']}), head: {head['label']} ({head['server_dir']})")
+    print(f"\n{'route':<44} {'count':>7} {'p50 ms':>15} {'p90 ms':>15} {'p99 ms':>15} {'p99':>8}")
+    ok = True
+    rows = sorted(set(base["routes"]) & set(head["routes"]))
+    all_base = [value for route in rows for value in base["routes"][route]["latencies_ms"]]
+    all_head = [value for route in rows for value in head["routes"][route]["latencies_ms"]]
+    for route, before, after in [("(all)", all_base, all_head)] + [
+        (route, base["routes"][route]["latencies_ms"], head["routes"][route]["latencies_ms"]) for route in rows
+    ]:
+        cells = " ".join(
+            f"{percentile(before, q):>7.1f}>{percentile(after, q):<7.1f}" for q in (0.5, 0.9, 0.99)
+        )
+        p99_before = percentile(before, 0.99)
+        change = (percentile(after, 0.99) - p99_before) / p99_before if p99_before else 0.0
+        # Редкие маршруты не решают: их p99 - один-два запроса
+        regressed = min(len(before), len(after)) >= min_count and change > max_regression
+        ok = ok and not regressed
+        print(f"{route:<44} {len(after):>7} {cells} {change:>+7.0%}{' FAIL' if regressed else ''}")
+
+    for name, result in (("base", base), ("head", head)):
+        lag = result["schedule_lag_ms"]["p99"]
+        if lag > 50:
+            print(f"\n{name}: schedule lag p99 {lag:.0f} ms - replay did not keep up, raise --max-in-flight or lower --speed")
+    return ok
+
+
+def start_process(command: list[str], env: dict[str, str], cwd: Optional[str] = None) -> subprocess.Popen:
+    return subprocess.Popen(command, env=env, cwd=cwd, start_new_session=True)
+
+
+async def wait_ready(api: httpx.AsyncClient) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            response = await api.get("/ready")
+            if response.status_code == 200 and response.json()["telegram_bot"] == "running":
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("service did not become ready")
+
+
+async def replay(args: argparse.Namespace, requests: list[CapturedRequest]) -> dict:
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with (
+        httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30.0, limits=limits) as api,
+        httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.fake_port}", timeout=30.0) as fake,
+    ):
+        await wait_ready(api)
+        session = Replay(args, api, fake)
+        await session.seed(requests)
+        await session.run(requests)
+        return session.result(args, requests)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="файлы записи трафика")
+    parser.add_argument("--inspect", action="store_true", help="только вывести содержимое записи")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="сравнить два результата --out")
+    parser.add_argument("--out", help="сохранить задержки в JSON для --compare")
+    parser.add_argument("--label", default="replay")
+    parser.add_argument("--server-dir", default=".", help="каталог server/ сборки, которую нагружать")
+    parser.add_argument("--speed", type=float, default=1.0, help="во сколько раз сжать интервалы между запросами")
+    parser.add_argument("--limit", type=int, default=0, help="воспроизвести только первые N запросов")
+    parser.add_argument("--max-in-flight", type=int, default=512)
+    parser.add_argument("--port", type=int, default=8631)
+    parser.add_argument("--fake-port", type=int, default=8630)
+    parser.add_argument("--max-regression", type=float, default=0.2, help="допустимый рост p99, доля")
+    parser.add_argument("--min-count", type=int, default=50, help="маршруты с меньшим числом запросов не проверяются")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.max_regression, args.min_count) else 1)
+    if not args.paths:
+        parser.error("capture files are required")
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    os.environ.update({
+        "SUPABASE_URL": fake_url,
+        "SUPABASE_KEY": "replay.anon.key",
+        "SUPABASE_SERVICE_KEY": "replay.service.key",
+        "TELEGRAM_BOT_TOKEN": "123456:replay",
+        "TELEGRAM_BASE_URL": f"{fake_url}/bot",
+        "JWT_SECRET_KEY": os.environ.get("JWT_SECRET_KEY", "replay-secret"),
+        # Весь трафик идет с одного адреса
+        "RATE_LIMIT_ENABLED": "false",
+        "TRAFFIC_CAPTURE_PATH": "",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        "DEBUG": "false",
+    })
+
+    requests = read_capture(args.paths)
+    if args.limit:
+        requests = requests[:args.limit]
+    if args.inspect or not requests:
+        inspect(requests)
+        return
+
+    env = dict(os.environ)
+    fake = start_process([sys.executable, "-m", "scripts.fake_backends", "--port", str(args.fake_port)], env)
+    server = start_process(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        env,
+        cwd=args.server_dir,
+    )
+    try:
+        result = asyncio.run(replay(args, requests))
+    finally:
+        # Сервис останавливается первым: бот при выключении еще обращается к заглушке Telegram
+        for process in (server, fake):
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print_replay(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        print(f"\nsaved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
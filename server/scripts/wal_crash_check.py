@@ -0,0 +1,126 @@
+"""
+Проверка write-behind буфера прогресса на потерю данных при kill -9.
+
+Каждый раунд:
+  1. Дочерний процесс пишет выполнения через ProgressWriteBuffer и печатает
+     ACK после каждого подтверждения; фоновый поток отправляет пачки в
+     "БД" (файл с fsync), часть отправок падает с ошибкой.
+  2. Через случайное время дочерний процесс убивается SIGKILL.
+  3. Новый буфер на том же WAL делает replay и flush.
+  4. Каждое подтвержденное выполнение должно оказаться в "БД".
+
+Запуск из каталога server/:
+
+    python -m scripts.wal_crash_check --rounds 20
+"""
+import argparse
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from src.services.progress_buffer import Completion, ProgressWriteBuffer
+
+
+def file_db_writer(db_path: Path, failure_rate: float = 0.0):
+    def flush(batch: list[Completion]) -> None:
+        if random.random() < failure_rate:
+            raise ConnectionError("simulated database failure")
+        time.sleep(random.random() * 0.02)
+        with open(db_path, "a", encoding="utf-8") as db:
+            for completion in batch:
+                db.write(f"{completion.user_id} {completion.quest_id}\n")
+            db.flush()
+            os.fsync(db.fileno())
+
+    return flush
+
+
+def run_child(wal_path: Path, db_path: Path) -> None:
+    buffer = ProgressWriteBuffer(wal_path, file_db_writer(db_path, failure_rate=0.1), flush_interval=0.02, max_batch=50)
+    buffer.replay()
+
+    def flusher() -> None:
+        while True:
+            time.sleep(buffer.flush_interval)
+            buffer.flush()
+
+    threading.Thread(target=flusher, daemon=True).start()
+
+    i = 0
+    while True:
+        user_id, quest_id = f"user-{i % 37}", f"quest-{i}"
+        buffer.append(user_id, quest_id)
+        print(f"ACK {user_id} {quest_id}", flush=True)
+        i += 1
+
+
+def run_round(workdir: Path, rng: random.Random) -> tuple[int, int]:
+    wal_path = workdir / "progress.wal"
+    db_path = workdir / "db.txt"
+    for path in (wal_path, db_path):
+        path.unlink(missing_ok=True)
+    db_path.touch()
+
+    child = subprocess.Popen(
+        [sys.executable, "-m", "scripts.wal_crash_check", "--child", str(wal_path), str(db_path)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+    acked: set[str] = set()
+
+    def reader() -> None:
+        for line in child.stdout:
+            if line.startswith("ACK "):
+                _, user_id, quest_id = line.split()
+                acked.add(f"{user_id} {quest_id}")
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+
+    time.sleep(0.3 + rng.random() * 1.5)
+    os.kill(child.pid, signal.SIGKILL)
+    child.wait()
+    thread.join()
+
+    # Рестарт: replay WAL и отправка всего, что не успело уйти
+    buffer = ProgressWriteBuffer(wal_path, file_db_writer(db_path))
+    buffer.replay()
+    buffer.close()
+
+    stored = set(db_path.read_text(encoding="utf-8").splitlines())
+    lost = acked - stored
+    return len(acked), len(lost)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="kill -9 durability check for the progress WAL")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--child", nargs=2, metavar=("WAL", "DB"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(Path(args.child[0]), Path(args.child[1]))
+        return 0
+
+    rng = random.Random(args.seed)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for round_number in range(1, args.rounds + 1):
+            acked, lost = run_round(Path(tmp), rng)
+            status = "OK" if lost == 0 else "LOST"
+            print(f"round {round_number:>3}: acked {acked:>6}, lost {lost} - {status}")
+            failed = failed or lost > 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
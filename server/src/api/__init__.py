@@ -1,5 +1,9 @@
 from .auth import router as auth_router
 from .progress import router as progress_router
+from .metrics import router as metrics_router
+from .stats import router as stats_router
+from .admin import router as admin_router
+from .broadcast import router as broadcast_router
 from .dependencies import get_current_user_id
 
-__all__ = ["auth_router", "progress_router", "get_current_user_id"]
+__all__ = ["auth_router", "progress_router", "metrics_router", "stats_router", "admin_router", "broadcast_router", "get_current_user_id"]
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from src.api.dependencies import require_admin
+from src.utils.profiling import ProfilerBusy, memory_profiler, sample_cpu
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin/profile", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.post("/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+) -> PlainTextResponse:
+    """
+    Снимает стеки всех потоков seconds секунд и возвращает collapsed stacks:
+    curl ... | flamegraph.pl > cpu.svg (или загрузить в speedscope).
+    """
+    try:
+        # Ожидание в потоке: event loop продолжает обслуживать запросы и попадает в профиль
+        sampler = await asyncio.to_thread(sample_cpu, seconds, interval_ms / 1000)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    logger.info("CPU profile collected: %d samples, %d stacks", sampler.samples, len(sampler.stacks))
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
+
+
+@router.post("/memory/start")
+async def start_memory_profile(frames: int = Query(10, ge=1, le=100)):
+    try:
+        await asyncio.to_thread(memory_profiler.start, frames)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    logger.info("tracemalloc started with %d frames", frames)
+    return {"status": "started", "frames": frames}
+
+
+@router.post("/memory/snapshot")
+async def memory_snapshot(
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """Рост аллокаций с предыдущего снимка (или со старта), крупнейшие сначала."""
+    try:
+        return await asyncio.to_thread(memory_profiler.snapshot_diff, limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/memory/stop")
+async def stop_memory_profile():
+    await asyncio.to_thread(memory_profiler.stop)
+    logger.info("tracemalloc stopped")
+    return {"status": "stopped"}
@@ -1,14 +1,20 @@
+import asyncio
 import logging
+import math
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, status, Header, Depends
+from fastapi import APIRouter, HTTPException, status, Header, Depends, Request
 from pydantic import BaseModel, Field
 
-from src.models import AuthSessionResponse, TokenPair, AuthStatus
-from src.services import AuthService, UserService
-from src.bot import get_bot
+from src.models import AuthSessionResponse, TokenPair, AuthStatus, User
+from src.services import AuthService, JWTService, UserService, ProgressService
 from src.api.dependencies import get_current_user_id
 
-from src.utils import to_e164
+from src.utils import to_e164, get_rate_limiter
+from src.utils.bots import bot_index_for_link, bot_index_of, bot_username
+from src.utils.log import bind_session_id
+from src.utils.resilience import DependencyUnavailable
+from src.utils.traffic_capture import capture_subject
 
 logger = logging.getLogger(__name__)
 
@@ -19,32 +25,76 @@ class InitAuthRequest(BaseModel):
     phone_number: str = Field(..., description="User phone number")
 
 
+def _client_ip(request: Request) -> str:
+    from src.config import settings
+
+    if settings.rate_limit_trust_proxy:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else ""
+
+
+def _telegram_link(session_id: str, bot_index: int) -> Optional[str]:
+    # Подписанный payload /start: бот находит сессию по id без поиска по telegram_id и телефону
+    username = bot_username(bot_index)
+    if not username:
+        return None
+    return f"https://t.me/{username}?start={JWTService.create_start_token(session_id)}"
+
+
+def _enforce_rate_limit(scope: str, key: str) -> None:
+    retry_after = get_rate_limiter().check(scope, key)
+    if retry_after > 0:
+        logger.warning("Rate limit exceeded for %s", scope)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication requests",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
 @router.post("/init", response_model=AuthSessionResponse, status_code=status.HTTP_201_CREATED)
-async def init_auth(request: InitAuthRequest) -> AuthSessionResponse:
+async def init_auth(request: InitAuthRequest, http_request: Request) -> AuthSessionResponse:
     try:
-        auth_service = AuthService()
-        user_service = UserService()
+        # Лимиты проверяются до любых обращений к БД и Telegram
+        _enforce_rate_limit("ip", _client_ip(http_request))
 
         phone_number = to_e164(request.phone_number)
+        capture_subject(phone_number)
+        _enforce_rate_limit("phone", phone_number)
+
+        auth_service = AuthService()
+        user_service = UserService()
 
         session = auth_service.create_auth_session(phone_number)
+        bind_session_id(session.id)
 
         user = user_service.get_user_by_phone(phone_number)
 
         # Есть связка с ботом -> отправляем запрос на авторизацию
         if user and user.telegram_id:
-            bot = get_bot()
-            await bot.notify_new_auth_request(user.telegram_id, session.id)
+            if get_rate_limiter().check("telegram_id", str(user.telegram_id)) > 0:
+                logger.warning("Auth notification for %s skipped: rate limit exceeded", user.telegram_id)
+            else:
+                from src.bot import get_bot
+
+                bot = get_bot()
+                # Через бот пользователя: другие боты он мог не запускать
+                await bot.notify_new_auth_request(user.telegram_id, session.id, bot_index_of(user))
 
-        logger.info(f"Auth session created: {session.id} for {phone_number}")
+        logger.info("Auth session created: %s for %s", session.id, phone_number)
 
         return AuthSessionResponse(
             session_id=session.id,
             expires_in=(session.expires_at - session.created_at).seconds,
+            telegram_link=_telegram_link(session.id, bot_index_for_link(user, phone_number)),
         )
 
+    except (HTTPException, DependencyUnavailable):
+        raise
     except Exception as e:
-        logger.error(f"Error initiating auth: {e}")
+        logger.error("Error initiating auth: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to initiate authentication",
@@ -54,9 +104,11 @@ async def init_auth(request: InitAuthRequest) -> AuthSessionResponse:
 @router.get("/tokens/{session_id}", response_model=TokenPair)
 async def get_auth_tokens(session_id: str) -> TokenPair:
     try:
+        bind_session_id(session_id)
         auth_service = AuthService()
 
-        session = auth_service.get_auth_session(session_id)
+        # Чтения уходят в поток: одновременные запросы разделяют один запрос в БД
+        session = await asyncio.to_thread(auth_service.get_auth_session, session_id)
 
         if not session:
             raise HTTPException(
@@ -70,7 +122,7 @@ async def get_auth_tokens(session_id: str) -> TokenPair:
                 detail="Auth session not approved",
             )
 
-        tokens = auth_service.generate_tokens_for_session(session_id)
+        tokens = await asyncio.to_thread(auth_service.generate_tokens_for_session, session_id)
 
         if not tokens:
             raise HTTPException(
@@ -80,10 +132,10 @@ async def get_auth_tokens(session_id: str) -> TokenPair:
 
         return tokens
 
-    except HTTPException:
+    except (HTTPException, DependencyUnavailable):
         raise
     except Exception as e:
-        logger.error(f"Error getting auth tokens: {e}")
+        logger.error("Error getting auth tokens: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get tokens",
@@ -112,6 +164,7 @@ async def refresh_token(request: RefreshTokenRequest) -> TokenPair:
 
         user_id = payload.get("sub")
         phone_number = payload.get("phone")
+        capture_subject(user_id)
 
         if not user_id or not phone_number:
             raise HTTPException(
@@ -128,17 +181,17 @@ async def refresh_token(request: RefreshTokenRequest) -> TokenPair:
             refresh_expires_in=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
         )
 
-    except HTTPException:
+    except (HTTPException, DependencyUnavailable):
         raise
     except Exception as e:
-        logger.error(f"Error refreshing token: {e}")
+        logger.error("Error refreshing token: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to refresh token",
         )
 
 
-@router.get("/me")
+@router.get("/me", response_model=User)
 async def get_current_user(user_id: str = Depends(get_current_user_id)):
     """
     Получить информацию о текущем пользователе.
@@ -147,22 +200,29 @@ async def get_current_user(user_id: str = Depends(get_current_user_id)):
         - Valid access token (проверяется декодирование + срок действия)
     """
     try:
-        from src.database import get_supabase_client
-        db = get_supabase_client()
-        response = db.table("users").select("*").eq("id", user_id).execute()
+        user_service = UserService()
+        progress_service = ProgressService(user_service.db)
+
+        user, completed_quests = await asyncio.gather(
+            asyncio.to_thread(user_service.get_user_by_id, user_id),
+            asyncio.to_thread(progress_service.get_progress, user_id),
+        )
 
-        if not response.data:
+        if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found",
             )
 
-        return response.data[0]
+        # Валидация и сериализация - на границе API
+        response = User.model_validate(user)
+        response.completed_quests = completed_quests
+        return response
 
-    except HTTPException:
+    except (HTTPException, DependencyUnavailable):
         raise
     except Exception as e:
-        logger.error(f"Error getting current user: {e}")
+        logger.error("Error getting current user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get user info",
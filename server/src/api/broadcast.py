@@ -0,0 +1,109 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+
+from src.api.dependencies import require_admin
+from src.database import get_supabase_client
+from src.models import BroadcastCreate, BroadcastJob
+from src.services import BroadcastService
+from src.services.broadcast_service import broadcast_runner_stats, cancel_broadcast, start_broadcast
+from src.utils.resilience import DependencyUnavailable
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/admin/broadcasts", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+def _to_job(row: dict) -> BroadcastJob:
+    # Темп есть только у заданий, которые выполняются в этом процессе
+    return BroadcastJob.model_validate({**row, "throughput": broadcast_runner_stats(row["id"])})
+
+
+@router.post("", response_model=BroadcastJob, status_code=status.HTTP_201_CREATED)
+async def create_broadcast(body: BroadcastCreate, request: Request) -> BroadcastJob:
+    """
+    Рассылка text всем пользователям с telegram_id. Задание выполняется в
+    фоне, прогресс и темп - GET /admin/broadcasts/{job_id}.
+    """
+    bot = request.app.state.bot
+    if bot is None or not bot.is_running:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Telegram bot is not running",
+        )
+
+    try:
+        supabase = get_supabase_client()
+        job = await asyncio.to_thread(BroadcastService(supabase).create_job, body.text, body.parse_mode)
+        start_broadcast(supabase, job, bot.send_broadcast_message)
+        logger.info("Broadcast %s started", job["id"])
+        return _to_job(job)
+
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error starting broadcast: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to start broadcast",
+        )
+
+
+@router.get("", response_model=list[BroadcastJob])
+async def list_broadcasts(limit: int = Query(20, ge=1, le=100)) -> list[BroadcastJob]:
+    try:
+        rows = await asyncio.to_thread(BroadcastService(get_supabase_client()).list_jobs, limit)
+        return [_to_job(row) for row in rows]
+
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error listing broadcasts: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to list broadcasts",
+        )
+
+
+@router.get("/{job_id}", response_model=BroadcastJob)
+async def get_broadcast(job_id: str) -> BroadcastJob:
+    try:
+        row = await asyncio.to_thread(BroadcastService(get_supabase_client()).get_job, job_id)
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Broadcast not found",
+            )
+        return _to_job(row)
+
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error getting broadcast %s: %s", job_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get broadcast",
+        )
+
+
+@router.post("/{job_id}/cancel", response_model=BroadcastJob)
+async def cancel(job_id: str) -> BroadcastJob:
+    try:
+        row = await cancel_broadcast(get_supabase_client(), job_id)
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Broadcast is not running",
+            )
+        logger.info("Broadcast %s cancelled", job_id)
+        return _to_job(row)
+
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error cancelling broadcast %s: %s", job_id, e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to cancel broadcast",
+        )
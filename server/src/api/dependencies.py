@@ -1,10 +1,13 @@
 """
 FastAPI dependencies for authentication and authorization.
 """
+import hmac
+
 from fastapi import Header, HTTPException, status
-from typing import Annotated
+from typing import Annotated, Optional
 
 from src.services import JWTService
+from src.utils.traffic_capture import capture_subject
 
 
 def get_current_user_id(authorization: str = Header(...)) -> str:
@@ -39,8 +42,20 @@ def get_current_user_id(authorization: str = Header(...)) -> str:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    capture_subject(user_id)
     return user_id
 
 
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    from src.config import settings
+
+    # Без настроенного токена служебных эндпоинтов как будто нет
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
 # Type alias для удобного использования в роутах
 CurrentUserId = Annotated[str, Header()]
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+from fastapi import APIRouter
+
+from src.database import database_router_stats
+from src.services.broadcast_service import broadcast_stats
+from src.services.progress_service import get_write_buffer
+from src.utils import get_rate_limiter
+from src.utils.idempotency import get_idempotency_store
+from src.utils.log import logging_stats
+from src.utils.loop_watchdog import loop_watchdog_stats
+from src.utils.resilience import circuit_breaker_stats
+from src.utils.single_flight import single_flight_stats
+from src.utils.tracing import tracing_stats
+from src.utils.traffic_capture import capture_stats
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics():
+    progress_buffer = get_write_buffer()
+
+    return {
+        "rate_limit": get_rate_limiter().stats(),
+        "single_flight": single_flight_stats(),
+        "circuit_breakers": circuit_breaker_stats(),
+        "read_replicas": database_router_stats(),
+        "idempotency": get_idempotency_store().stats(),
+        "logging": logging_stats(),
+        "event_loop_lag": loop_watchdog_stats(),
+        "tracing": tracing_stats(),
+        "traffic_capture": capture_stats(),
+        "progress_buffer": progress_buffer.stats() if progress_buffer else None,
+        "broadcasts": broadcast_stats(),
+        "runtime": {
+            "asyncio_tasks": len(asyncio.all_tasks()),
+            "threads": threading.active_count(),
+        },
+    }
@@ -1,32 +1,64 @@
+import asyncio
 import logging
-
-from fastapi import APIRouter, HTTPException, status, Depends
-
-from src.models.progress import CompleteQuestRequest, ProgressResponse
-from src.services import ProgressService
+from typing import Literal, Optional, Union
+
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query, Response
+
+from src.config.quest_catalog import get_quest_catalog
+from src.models.progress import (
+    CompleteQuestRequest,
+    CompactProgressResponse,
+    LeaderboardResponse,
+    ProgressResponse,
+    QuestCatalogResponse,
+)
+from src.services import ProgressService, LeaderboardService
 from src.database import get_supabase_client
 from src.api.dependencies import get_current_user_id
+from src.utils.idempotency import IdempotencyConflict, get_idempotency_store
+from src.utils.resilience import DependencyUnavailable
+from src.utils.traffic_capture import UNKNOWN_ARG, capture_arg
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/progress", tags=["progress"])
 
 
-@router.get("", response_model=ProgressResponse)
-async def get_progress(user_id: str = Depends(get_current_user_id)):
+def format_mask(mask: int) -> str:
+    return format(mask, "x")
+
+
+@router.get("/catalog", response_model=QuestCatalogResponse)
+async def get_catalog():
+    return get_quest_catalog().to_dict()
+
+
+@router.get("", response_model=Union[ProgressResponse, CompactProgressResponse])
+async def get_progress(
+    format: Literal["full", "compact"] = Query("full", description="compact - hex bitmask over the quest catalog"),
+    user_id: str = Depends(get_current_user_id),
+):
     try:
 
         db = get_supabase_client()
         progress_service = ProgressService(db)
 
-        completed_quests = progress_service.get_progress(user_id)
+        mask = await asyncio.to_thread(progress_service.get_progress_mask, user_id)
+        catalog = get_quest_catalog()
+
+        if format == "compact":
+            return CompactProgressResponse(
+                mask=format_mask(mask),
+                catalog_version=catalog.version,
+                all_done=catalog.all_done(mask),
+            )
 
-        return ProgressResponse(completed_quests=completed_quests)
+        return ProgressResponse(completed_quests=catalog.ids_of(mask))
 
-    except HTTPException:
+    except (HTTPException, DependencyUnavailable):
         raise
     except Exception as e:
-        logger.error(f"Error getting progress: {e}")
+        logger.error("Error getting progress: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get progress",
@@ -36,28 +68,84 @@ async def get_progress(user_id: str = Depends(get_current_user_id)):
 @router.post("/complete", status_code=status.HTTP_200_OK)
 async def complete_quest(
     request: CompleteQuestRequest,
-    user_id: str = Depends(get_current_user_id)
+    response: Response,
+    user_id: str = Depends(get_current_user_id),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
 ):
     try:
+        known = get_quest_catalog().is_known(request.quest_id)
+        # В запись трафика - только id из каталога, а не произвольная строка клиента
+        capture_arg(request.quest_id if known else UNKNOWN_ARG)
+        if not known:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown quest",
+            )
 
-        db = get_supabase_client()
-        progress_service = ProgressService(db)
+        async def complete() -> dict:
+            db = get_supabase_client()
+            progress_service = ProgressService(db)
+
+            success = await asyncio.to_thread(progress_service.complete_quest, user_id, request.quest_id)
+
+            if not success:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to complete quest",
+                )
+
+            return {"success": True, "quest_id": request.quest_id}
 
-        success = progress_service.complete_quest(user_id, request.quest_id)
+        if not idempotency_key:
+            return await complete()
 
-        if not success:
+        # Повтор клиента с тем же ключом получает сохраненный ответ без обращения к БД
+        result, replayed = await get_idempotency_store().run(
+            f"progress_complete:{user_id}:{idempotency_key}",
+            complete,
+            fingerprint=request.quest_id,
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different quest",
+        )
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error completing quest: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to complete quest",
+        )
+
+
+@router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100),
+    user_id: str = Depends(get_current_user_id),
+):
+    try:
+        leaderboard_service = LeaderboardService(get_supabase_client())
+
+        if not leaderboard_service.is_ready:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to complete quest",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Leaderboard is not ready yet",
+                headers={"Retry-After": "5"},
             )
 
-        return {"success": True, "quest_id": request.quest_id}
+        return await asyncio.to_thread(leaderboard_service.get_leaderboard, user_id, limit)
 
-    except HTTPException:
+    except (HTTPException, DependencyUnavailable):
         raise
     except Exception as e:
-        logger.error(f"Error completing quest: {e}")
+        logger.error("Error getting leaderboard: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to complete quest",
+            detail="Failed to get leaderboard",
         )
@@ -0,0 +1,34 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, HTTPException, status
+
+from src.services import StatsService
+from src.database import get_supabase_client
+from src.utils.resilience import DependencyUnavailable
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+
+@router.get("")
+async def get_stats():
+    """
+    Сколько игроков прошли каждый квест и воронка сессий авторизации.
+
+    Отдается из агрегированных счетчиков (stats_counters), время ответа
+    не зависит от числа пользователей.
+    """
+    try:
+        stats_service = StatsService(get_supabase_client())
+        return await asyncio.to_thread(stats_service.get_stats)
+
+    except (HTTPException, DependencyUnavailable):
+        raise
+    except Exception as e:
+        logger.error("Error getting stats: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get stats",
+        )
@@ -1,7 +1,12 @@
+import asyncio
+import functools
 import logging
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -12,29 +17,61 @@ from telegram.ext import (
 )
 
 from src.config import settings
-from src.services import AuthService, UserService, EventService
+from src.models import AuthSessionRecord, AuthStatus
+from src.services import AuthService, JWTService, UserService, EventService
+from src.services.broadcast_service import BLOCKED, FAILED, SENT, RetryLater
 from src.bot import messages
 from src.utils import to_e164
+from src.utils.bots import bot_tokens
+from src.utils.idempotency import get_idempotency_store
+from src.utils.log import bind_session_id
+from src.utils.resilience import DependencyUnavailable, get_circuit_breaker, timeout_for
+from src.utils.tracing import span, trace_hop
 
 logger = logging.getLogger(__name__)
 
 
+class TracedHTTPXRequest(HTTPXRequest):
+    """Вызовы Telegram Bot API как span'ы trace входа."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with span("telegram", method=url.rsplit("/", 1)[-1]):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+def traced_update(name: str):
+    """Апдейт бота - участок trace; session_id привязывает сам обработчик."""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            with trace_hop(name):
+                return await handler(self, update, context)
+
+        return wrapper
+
+    return decorator
+
+
 class TelegramBot:
     def __init__(self):
         self.auth_service = AuthService()
         self.user_service = UserService()
         self.event_service = EventService()
-        self.application: Optional[Application] = None
+        # Одно Application на токен (src/utils/bots.py), индекс - users.bot_index
+        self.applications: list[Application] = []
 
+    @traced_update("bot /start")
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
         if not user:
             return
 
-        logger.info(f"User {user.id} started the bot")
+        logger.info("User %s started the bot", user.id)
 
-        existing_user = self.user_service.get_user_by_telegram_id(user.id)
-        pending_session = self.auth_service.get_pending_session_by_telegram(user.id)
+        existing_user, pending_session = self._resolve_start(user.id, context.args)
+        # Обработчики бота идут в одной задаче - привязку обновляем на каждом апдейте
+        bind_session_id(pending_session.id if pending_session else None)
 
         # Пользователь зарегистрирован
         if existing_user:
@@ -57,6 +94,27 @@ class TelegramBot:
             if pending_session:
                 await self.event_service.send_bot_phone_requested_event(pending_session.id, user.id)
 
+    def _resolve_start(self, telegram_id: int, args: Optional[list[str]]) -> tuple[bool, Optional[AuthSessionRecord]]:
+        """Зарегистрирован ли пользователь и его ожидающая сессия."""
+        # Подписанный deep link с сайта: сессия и владелец номера одним запросом
+        session_id = JWTService.verify_start_token(args[0]) if args else None
+        if session_id:
+            found = self.auth_service.get_session_with_owner(session_id)
+            if found:
+                session, owner = found
+                # Номер привязан к другому аккаунту Telegram - ссылку не используем
+                if owner is not None and owner.telegram_id in (None, telegram_id):
+                    is_pending = (
+                        session.status == AuthStatus.PENDING
+                        and session.expires_at >= datetime.now(timezone.utc)
+                    )
+                    return owner.telegram_id == telegram_id, session if is_pending else None
+
+        existing_user = self.user_service.get_user_by_telegram_id(telegram_id)
+        pending_session = self.auth_service.get_pending_session_by_telegram(telegram_id)
+        return existing_user is not None, pending_session
+
+    @traced_update("bot contact")
     async def handle_contact(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user = update.effective_user
         contact = update.message.contact
@@ -72,17 +130,17 @@ class TelegramBot:
             return
 
         phone_number = to_e164(contact.phone_number)
-        logger.info(f"User {user.id} shared phone number: {phone_number}")
+        logger.info("User %s shared phone number: %s", user.id, phone_number)
 
-        pending_session = self.auth_service.get_pending_session_by_phone(phone_number)
+        _, pending_session = self.user_service.link_telegram_contact(
+            phone_number=phone_number,
+            telegram_id=user.id,
+            telegram_username=user.username,
+            bot_index=context.bot_data["bot_index"],
+        )
+        bind_session_id(pending_session.id if pending_session else None)
 
         if pending_session:
-            self.user_service.update_user_telegram_info(
-                phone_number=phone_number,
-                telegram_id=user.id,
-                telegram_username=user.username,
-            )
-
             await self.event_service.send_phone_shared_event(pending_session.id, phone_number)
 
             await update.message.reply_text(
@@ -92,18 +150,12 @@ class TelegramBot:
 
             await self._show_auth_approval(update, pending_session.id)
         else:
-            self.user_service.get_or_create_user(phone_number)
-            self.user_service.update_user_telegram_info(
-                phone_number=phone_number,
-                telegram_id=user.id,
-                telegram_username=user.username,
-            )
-
             await update.message.reply_text(
                 messages.MSG_PHONE_RECEIVED_NO_SESSION,
                 reply_markup=ReplyKeyboardRemove()
             )
 
+    @traced_update("bot callback")
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         query = update.callback_query
         if not query or not query.data:
@@ -117,14 +169,29 @@ class TelegramBot:
 
         data_parts = query.data.split(":")
         action = data_parts[0]
+        bind_session_id(data_parts[1] if len(data_parts) == 2 else None)
+
+        # Двойное нажатие дает два callback query с разными id, но одинаковыми data и пользователем:
+        # второе ждет первое и не повторяет запись в БД и события
+        idempotency_key = f"bot_callback:{user.id}:{query.data}"
 
         if action == "approve" and len(data_parts) == 2:
             session_id = data_parts[1]
-            await self._approve_auth(query, user, session_id)
+            _, replayed = await get_idempotency_store().run(
+                idempotency_key, lambda: self._approve_auth(query, user, session_id)
+            )
 
         elif action == "reject" and len(data_parts) == 2:
             session_id = data_parts[1]
-            await self._reject_auth(query, session_id)
+            _, replayed = await get_idempotency_store().run(
+                idempotency_key, lambda: self._reject_auth(query, session_id)
+            )
+
+        else:
+            return
+
+        if replayed:
+            logger.info("Duplicate callback %s for %s ignored", query.id, action)
 
     async def _show_auth_approval(self, update: Update, session_id: str) -> None:
         keyboard = [
@@ -149,23 +216,41 @@ class TelegramBot:
 
         if session:
             await query.edit_message_text(messages.MSG_AUTH_APPROVED)
-            logger.info(f"Session {session_id} approved by user {user.id}")
+            logger.info("Session %s approved by user %s", session_id, user.id)
         else:
             await query.edit_message_text(messages.MSG_AUTH_APPROVE_FAILED)
-            logger.warning(f"Failed to approve session {session_id} for user {user.id}")
+            logger.warning("Failed to approve session %s for user %s", session_id, user.id)
 
     async def _reject_auth(self, query, session_id: str) -> None:
         session = await self.auth_service.reject_session(session_id)
 
         if session:
             await query.edit_message_text(messages.MSG_AUTH_REJECTED)
-            logger.info(f"Session {session_id} rejected")
+            logger.info("Session %s rejected", session_id)
         else:
             await query.edit_message_text(messages.MSG_AUTH_REJECT_NOT_FOUND)
 
-    async def notify_new_auth_request(self, telegram_id: int, session_id: str) -> bool:
-        if not self.application:
-            logger.error("Bot application not initialized")
+    @property
+    def is_running(self) -> bool:
+        return bool(self.applications) and all(application.running for application in self.applications)
+
+    def _application(self, bot_index: int) -> Optional[Application]:
+        if bot_index >= len(self.applications) or not self.applications[bot_index].running:
+            return None
+        return self.applications[bot_index]
+
+    async def notify_new_auth_request(self, telegram_id: int, session_id: str, bot_index: int = 0) -> bool:
+        application = self._application(bot_index)
+        if application is None:
+            logger.error("Bot application %d not initialized", bot_index)
+            return False
+
+        breaker = get_circuit_breaker("telegram")
+        try:
+            timeout = timeout_for(settings.telegram_timeout_seconds)
+            breaker.before_call()
+        except DependencyUnavailable as e:
+            logger.warning("Auth notification to %s skipped: %s", telegram_id, e)
             return False
 
         try:
@@ -177,50 +262,137 @@ class TelegramBot:
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
 
-            await self.application.bot.send_message(
-                chat_id=telegram_id,
-                text=messages.MSG_AUTH_REQUEST,
-                reply_markup=reply_markup,
+            await asyncio.wait_for(
+                application.bot.send_message(
+                    chat_id=telegram_id,
+                    text=messages.MSG_AUTH_REQUEST,
+                    reply_markup=reply_markup,
+                ),
+                timeout=timeout,
             )
-            logger.info(f"Auth notification sent to user {telegram_id}")
+            breaker.record_success()
+            logger.info("Auth notification sent to user %s via bot %d", telegram_id, bot_index)
             return True
 
+        except (NetworkError, asyncio.TimeoutError) as e:
+            # Сеть или таймаут - отказ Telegram
+            breaker.record_failure()
+            logger.error("Failed to send auth notification to %s: %s", telegram_id, e)
+            return False
         except Exception as e:
-            logger.error(f"Failed to send auth notification to {telegram_id}: {e}")
+            # Forbidden/BadRequest: Telegram ответил, зависимость жива
+            breaker.record_success()
+            logger.error("Failed to send auth notification to %s: %s", telegram_id, e)
             return False
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+
+    async def send_broadcast_message(
+        self,
+        telegram_id: int,
+        text: str,
+        parse_mode: Optional[str] = None,
+        bot_index: int = 0,
+    ) -> str:
+        """Одно сообщение рассылки; темп и повторы - на стороне BroadcastRunner."""
+        application = self._application(bot_index)
+        if application is None:
+            raise RuntimeError(f"Bot application {bot_index} not initialized")
+
+        breaker = get_circuit_breaker("telegram")
+        try:
+            breaker.before_call()
+        except DependencyUnavailable as e:
+            # Telegram недоступен - ждем вместе со всей рассылкой, а не списываем получателей
+            raise RetryLater(e.retry_after)
 
-    def setup_handlers(self) -> None:
-        if not self.application:
-            return
-
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(MessageHandler(filters.CONTACT, self.handle_contact))
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback))
-
-        logger.info("Bot handlers configured")
-
-    async def initialize(self) -> None:
-        self.application = (
-            Application.builder()
-            .token(settings.telegram_bot_token)
+        try:
+            await asyncio.wait_for(
+                application.bot.send_message(chat_id=telegram_id, text=text, parse_mode=parse_mode),
+                timeout=settings.telegram_timeout_seconds,
+            )
+        except RetryAfter as e:
+            breaker.record_success()
+            retry_after = e.retry_after
+            raise RetryLater(
+                retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after),
+                rate_limited=True,
+            )
+        except Forbidden:
+            # Пользователь заблокировал бота или удалил аккаунт
+            breaker.record_success()
+            return BLOCKED
+        except BadRequest as e:
+            # Чат не найден или текст не прошел parse_mode - повтор не поможет
+            breaker.record_success()
+            logger.warning("Broadcast message to %s rejected: %s", telegram_id, e)
+            return FAILED
+        except (NetworkError, asyncio.TimeoutError):
+            breaker.record_failure()
+            raise
+        except TelegramError:
+            # Остальные ошибки Bot API - ответ Telegram, зависимость жива
+            breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+
+        breaker.record_success()
+        return SENT
+
+    def setup_handlers(self, application: Application) -> None:
+        # Обработчики общие: ответы уходят через бот, получивший апдейт
+        application.add_handler(CommandHandler("start", self.start_command))
+        application.add_handler(MessageHandler(filters.CONTACT, self.handle_contact))
+        application.add_handler(CallbackQueryHandler(self.handle_callback))
+
+    def _build_application(self, bot_index: int, token: str) -> Application:
+        builder = Application.builder()
+        if settings.telegram_base_url:
+            builder = builder.base_url(settings.telegram_base_url)
+
+        application = (
+            builder
+            .token(token)
+            # Размер пула как у запроса PTB по умолчанию, таймауты - TELEGRAM_TIMEOUT_SECONDS
+            .request(TracedHTTPXRequest(
+                connection_pool_size=256,
+                connect_timeout=settings.telegram_timeout_seconds,
+                read_timeout=settings.telegram_timeout_seconds,
+                write_timeout=settings.telegram_timeout_seconds,
+                pool_timeout=settings.telegram_timeout_seconds,
+            ))
             .build()
         )
+        # Обработчик узнает, через какой бот пришел пользователь (link_telegram_contact)
+        application.bot_data["bot_index"] = bot_index
+        self.setup_handlers(application)
+        return application
 
-        self.setup_handlers()
+    async def _start_application(self, application: Application) -> None:
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling()
 
-        await self.application.initialize()
-        await self.application.start()
-        await self.application.updater.start_polling()
+    async def initialize(self) -> None:
+        self.applications = [self._build_application(index, token) for index, token in enumerate(bot_tokens())]
+        await asyncio.gather(*(self._start_application(application) for application in self.applications))
 
-        logger.info("Telegram bot initialized and started")
+        logger.info("Telegram bots initialized and started: %d", len(self.applications))
 
     async def shutdown(self) -> None:
-        if self.application:
-            await self.application.updater.stop()
-            await self.application.stop()
-            await self.application.shutdown()
-
-            logger.info("Telegram bot shut down")
+        for application in self.applications:
+            # Бот мог не успеть стартовать, если сервис останавливают сразу после запуска
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+
+        if self.applications:
+            logger.info("Telegram bots shut down")
 
 
 bot_instance: Optional[TelegramBot] = None
@@ -0,0 +1,99 @@
+"""
+Серверный каталог квестов.
+
+Каждому квесту назначен стабильный номер бита (src/config/quests.json),
+поэтому прогресс игрока - это битовая маска: проверка, объединение и
+"все пройдено" - операции над int. Биты только добавляются: у удаленного
+квеста бит не переиспользуется.
+
+Каталог читается один раз при первом обращении и перечитывается по
+reload_quest_catalog() (сервис вызывает его по SIGHUP).
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEST_CATALOG_PATH = Path(__file__).with_name("quests.json")
+
+
+class QuestCatalog:
+    def __init__(self, version: int, quests: dict[str, int]):
+        self.version = version
+        self.bits = quests
+        self.ids_by_bit = {bit: quest_id for quest_id, bit in quests.items()}
+        self.all_mask = 0
+        for bit in quests.values():
+            self.all_mask |= 1 << bit
+
+    @classmethod
+    def load(cls, path: Path) -> "QuestCatalog":
+        data = json.loads(path.read_text(encoding="utf-8"))
+
+        quests: dict[str, int] = {}
+        seen_bits: set[int] = set()
+        for quest in data["quests"]:
+            quest_id, bit = quest["id"], int(quest["bit"])
+            if quest_id in quests or bit in seen_bits or bit < 0:
+                raise ValueError(f"Duplicate or invalid quest entry: {quest}")
+            quests[quest_id] = bit
+            seen_bits.add(bit)
+
+        return cls(int(data.get("version", 1)), quests)
+
+    def bit(self, quest_id: str) -> Optional[int]:
+        return self.bits.get(quest_id)
+
+    def is_known(self, quest_id: str) -> bool:
+        return quest_id in self.bits
+
+    def mask_of(self, quest_ids: Iterable[str]) -> int:
+        """Маска по списку квестов; неизвестные id пропускаются."""
+        mask = 0
+        for quest_id in quest_ids:
+            bit = self.bits.get(quest_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def ids_of(self, mask: int) -> list[str]:
+        ids = []
+        while mask:
+            low = mask & -mask
+            quest_id = self.ids_by_bit.get(low.bit_length() - 1)
+            if quest_id is not None:
+                ids.append(quest_id)
+            mask ^= low
+        return ids
+
+    def all_done(self, mask: int) -> bool:
+        return mask & self.all_mask == self.all_mask
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "quests": [{"id": quest_id, "bit": bit} for quest_id, bit in sorted(self.bits.items(), key=lambda item: item[1])],
+        }
+
+
+_catalog: Optional[QuestCatalog] = None
+
+
+def get_quest_catalog() -> QuestCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = QuestCatalog.load(QUEST_CATALOG_PATH)
+    return _catalog
+
+
+def reload_quest_catalog() -> QuestCatalog:
+    global _catalog
+    try:
+        _catalog = QuestCatalog.load(QUEST_CATALOG_PATH)
+        logger.info("Quest catalog reloaded: version %s, %d quests", _catalog.version, len(_catalog.bits))
+    except Exception as e:
+        # Битый файл не должен ломать работающий сервис - остаемся на старом каталоге
+        logger.error("Failed to reload quest catalog: %s", e)
+    return get_quest_catalog()
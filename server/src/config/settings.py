@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import Any
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -22,12 +25,114 @@ class Settings(BaseSettings):
 
     telegram_bot_token: str
     telegram_bot_username: str = ""
+    # Дополнительные боты (JSON списки в одном порядке): у каждого токена свой лимит отправки Telegram,
+    # пользователь закрепляется за ботом, через который связал номер (users.bot_index)
+    telegram_extra_bot_tokens: list[str] = []
+    telegram_extra_bot_usernames: list[str] = []
+    # Bot API сервер (self-hosted или заглушка scripts/fake_backends.py); пусто - api.telegram.org
+    telegram_base_url: str = ""
 
     supabase_url: str
     supabase_key: str
     supabase_service_key: str
+    # Read-реплики PostgREST (JSON список URL, как SUPABASE_URL); пусто - все чтения на primary
+    supabase_replica_urls: list[str] = []
+    # После записи чтения по тем же ключам (пользователь, сессия) столько секунд идут на primary
+    read_your_writes_seconds: float = 5.0
 
     jwt_secret_key: str
 
+    # Токен для /admin/* (заголовок X-Admin-Token); пустой - эндпоинты выключены
+    admin_token: str = ""
+
+    # Rate limiting для /api/auth/init (запросов в минуту на ключ)
+    rate_limit_enabled: bool = True
+    rate_limit_ip_per_minute: int = 30
+    rate_limit_phone_per_minute: int = 5
+    rate_limit_telegram_per_minute: int = 3
+    rate_limit_max_keys: int = 100_000
+    rate_limit_redis_url: str = ""
+    rate_limit_trust_proxy: bool = False
+
+    # Write-behind для complete_quest: подтверждение после fsync в локальный WAL
+    progress_write_behind: bool = False
+    progress_wal_path: str = "data/progress.wal"
+    progress_flush_interval_ms: int = 300
+    progress_flush_batch_size: int = 500
+
+    # Суточные партиции auth_sessions: старше retention отсоединяются и удаляются
+    auth_session_partition_maintenance: bool = True
+    auth_session_retention_days: int = 7
+    auth_session_archive: bool = True
+
+    # Дедлайн запроса и таймауты исходящих вызовов (секунды)
+    request_deadline_seconds: float = 10.0
+    supabase_timeout_seconds: float = 5.0
+    realtime_timeout_seconds: float = 3.0
+    telegram_timeout_seconds: float = 5.0
+    # Circuit breaker: ошибок подряд до открытия и пауза до пробного вызова
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+
+    # Рассылки бота (/admin/broadcasts): общий темп ниже лимита Telegram (~30 сообщений/с),
+    # остаток - уведомлениям о входе
+    broadcast_rate_per_second: float = 25.0
+    broadcast_concurrency: int = 16
+    broadcast_page_size: int = 200
+    broadcast_max_retries: int = 3
+    # Аренда задания инстансом: без продления дольше этого срока задание подхватывает другой
+    broadcast_lease_seconds: float = 60.0
+
+    # Idempotency-Key для POST /api/progress/complete и повторные нажатия кнопок бота
+    idempotency_ttl_seconds: int = 86400
+    idempotency_max_keys: int = 100_000
+    idempotency_redis_url: str = ""
+
+    # Логи пишутся через очередь фоновым потоком (src/utils/log.py)
+    log_level: str = "INFO"
+    log_format: str = "text"  # text | json
+    # Доля INFO записей по логгерам, например {"src.services.progress_service": 0.1}
+    log_sample_rates: dict[str, float] = {}
+    log_queue_size: int = 10_000
+
+    # Трассировка входа (src/utils/tracing.py): файл NDJSON или URL коллектора; пусто - выключена
+    trace_export: str = ""
+    trace_sample_rate: float = 0.1
+
+    # Запись трафика для scripts/traffic_replay.py (src/utils/traffic_capture.py): путь к файлу,
+    # {pid} заменяется на pid процесса; пусто - выключена
+    traffic_capture_path: str = ""
+    traffic_capture_sample_rate: float = 1.0
+    # Ключ хешей идентификаторов; пусто - случайный на процесс (хеши разных процессов не совпадут)
+    traffic_capture_salt: str = ""
+    traffic_capture_max_mb: int = 512
+
+    # Watchdog event loop: гистограмма задержки и стек при блокировке дольше порога
+    loop_watchdog_enabled: bool = True
+    loop_watchdog_interval_ms: int = 100
+    loop_watchdog_threshold_ms: int = 200
+    # Один и тот же стек логируется не чаще раза в столько секунд
+    loop_watchdog_log_interval_seconds: float = 60.0
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
+
+
+class _LazySettings:
+    """
+    Прокси к Settings: .env читается и валидируется при первом обращении
+    к атрибуту, а не при импорте модуля.
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
 
-settings = Settings()
+settings: Settings = _LazySettings()  # type: ignore[assignment]
@@ -1,3 +1,4 @@
+from .router import database_router_stats, get_read_client, mark_written
 from .supabase_client import get_supabase_client
 
-__all__ = ["get_supabase_client"]
+__all__ = ["get_supabase_client", "get_read_client", "mark_written", "database_router_stats"]
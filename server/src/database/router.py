@@ -0,0 +1,187 @@
+"""
+Маршрутизация чтений между primary и read-репликами PostgREST.
+
+Безопасные чтения (пользователь по номеру/id/telegram_id, сессия входа,
+прогресс) берут клиента через get_read_client(*keys), записи остаются на
+primary (get_supabase_client). Реплика выбирается случайно с весом
+1 / EWMA задержки: медленная реплика получает меньше чтений, реплика с
+открытым breaker - ни одного, в half-open - небольшую долю для проверки.
+Если все реплики недоступны, чтение идет на primary.
+
+Реплики отстают от primary. После записи сервис вызывает
+mark_written(*keys) с ключами затронутых данных (id и номер пользователя,
+id сессии), и чтения по этим ключам read_your_writes_seconds секунд идут на
+primary - например, /tokens сразу после approve_session или прогресс сразу
+после complete_quest. Окно хранится в памяти процесса.
+"""
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Optional
+
+from src.config import settings
+from src.database.supabase_client import create_postgrest_client, get_supabase_client
+from src.utils.resilience import HALF_OPEN, OPEN, get_circuit_breaker
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Сглаживание EWMA задержки и задержка реплики без замеров (секунды)
+LATENCY_ALPHA = 0.2
+DEFAULT_LATENCY = 0.05
+# Доля веса реплики в half-open: пробные чтения без перекоса нагрузки
+PROBE_WEIGHT_SHARE = 0.1
+MAX_WRITTEN_KEYS = 100_000
+
+
+class Replica:
+    def __init__(self, url: str):
+        import httpx
+
+        self.url = url
+        self.name = httpx.URL(url).netloc.decode()
+        self.breaker = get_circuit_breaker(f"supabase_replica:{self.name}")
+        self.client: Optional["Client"] = None
+        self.latency: Optional[float] = None
+
+        self.reads = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def weight(self) -> float:
+        state = self.breaker.state
+        if state == OPEN:
+            return 0.0
+        weight = 1.0 / max(self.latency or DEFAULT_LATENCY, 0.001)
+        if state == HALF_OPEN:
+            weight *= PROBE_WEIGHT_SHARE
+        return weight
+
+    def record_success(self, latency: float) -> None:
+        self.breaker.record_success()
+        self.latency = latency if self.latency is None else self.latency + LATENCY_ALPHA * (latency - self.latency)
+
+    def record_failure(self) -> None:
+        self.breaker.record_failure()
+        self.failures += 1
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.state,
+            "weight": round(self.weight(), 3),
+            "latency_ms": round(self.latency * 1000, 3) if self.latency is not None else None,
+            "reads": self.reads,
+            "failures": self.failures,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class DatabaseRouter:
+    def __init__(self, primary: "Client", replicas: list[Replica], read_your_writes_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.read_your_writes_seconds = read_your_writes_seconds
+
+        self._lock = threading.Lock()
+        # ключ -> monotonic время, до которого чтения по нему идут на primary
+        self._written: OrderedDict[str, float] = OrderedDict()
+
+        self.primary_reads = 0
+        self.pinned_reads = 0
+
+    def read_client(self, *keys: Any) -> "Client":
+        if not self.replicas:
+            return self.primary
+
+        if self._recently_written(keys):
+            self.pinned_reads += 1
+            return self.primary
+
+        weights = [replica.weight() for replica in self.replicas]
+        if sum(weights) <= 0:
+            self.primary_reads += 1
+            return self.primary
+
+        replica = random.choices(self.replicas, weights)[0]
+        replica.reads += 1
+        return replica.client
+
+    def mark_written(self, *keys: Any) -> None:
+        if not self.replicas or self.read_your_writes_seconds <= 0:
+            return
+
+        until = time.monotonic() + self.read_your_writes_seconds
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                key = str(key)
+                self._written[key] = until
+                self._written.move_to_end(key)
+            while len(self._written) > MAX_WRITTEN_KEYS:
+                self._written.popitem(last=False)
+
+    def _recently_written(self, keys: tuple) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            # Самые старые записи в начале - срезаем истекшие окна
+            while self._written:
+                key, until = next(iter(self._written.items()))
+                if until > now:
+                    break
+                self._written.popitem(last=False)
+            return any(str(key) in self._written for key in keys if key is not None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pinned_keys = len(self._written)
+        return {
+            "read_your_writes_seconds": self.read_your_writes_seconds,
+            "pinned_keys": pinned_keys,
+            "pinned_reads": self.pinned_reads,
+            "primary_reads": self.primary_reads,
+            "replicas": {replica.name: replica.stats() for replica in self.replicas},
+        }
+
+
+def _create_replica(url: str, primary: "Client") -> Replica:
+    from src.database.transport import ReplicaTransport
+
+    replica = Replica(url)
+    client = create_postgrest_client(url)
+    session = client.postgrest.session
+    session._transport = ReplicaTransport(
+        session._transport, replica, primary.postgrest.session._transport, settings.supabase_url
+    )
+    replica.client = client
+    return replica
+
+
+@lru_cache(maxsize=1)
+def get_database_router() -> DatabaseRouter:
+    primary = get_supabase_client()
+    replicas = [_create_replica(url, primary) for url in settings.supabase_replica_urls]
+    if replicas:
+        logger.info("Read replicas: %s", ", ".join(replica.name for replica in replicas))
+    return DatabaseRouter(primary, replicas, settings.read_your_writes_seconds)
+
+
+def get_read_client(*keys: Any) -> "Client":
+    """Клиент для безопасного чтения по ключам (id/номер пользователя, id сессии)."""
+    return get_database_router().read_client(*keys)
+
+
+def mark_written(*keys: Any) -> None:
+    """После записи: чтения по этим ключам какое-то время идут на primary."""
+    get_database_router().mark_written(*keys)
+
+
+def database_router_stats() -> Optional[dict]:
+    if not settings.supabase_replica_urls:
+        return None
+    return get_database_router().stats()
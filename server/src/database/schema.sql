@@ -10,36 +10,236 @@ CREATE TABLE IF NOT EXISTS users (
     phone_number VARCHAR(20) UNIQUE NOT NULL,
     telegram_id BIGINT UNIQUE,
     telegram_username VARCHAR(255),
-    completed_quests TEXT[] DEFAULT '{}',
+    -- Bot the user linked through: index in the bot token list (0 = TELEGRAM_BOT_TOKEN)
+    bot_index SMALLINT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
--- Create index on phone_number for faster lookups
-CREATE INDEX IF NOT EXISTS idx_users_phone_number ON users(phone_number);
-CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+-- phone_number and telegram_id lookups use the indexes created by the UNIQUE constraints
 
--- Auth sessions table
+-- Broadcast recipients: keyset pages over users with telegram_id
+CREATE INDEX IF NOT EXISTS idx_users_telegram_recipients ON users(id) WHERE telegram_id IS NOT NULL;
+
+-- Auth sessions table, partitioned by day (see maintain_auth_session_partitions below)
 CREATE TABLE IF NOT EXISTS auth_sessions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     phone_number VARCHAR(20) NOT NULL,
     telegram_id BIGINT,
     status VARCHAR(20) NOT NULL DEFAULT 'pending',
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
     approved_at TIMESTAMP WITH TIME ZONE,
 
+    -- The partition key must be part of the primary key
+    PRIMARY KEY (id, created_at),
     CONSTRAINT fk_user_phone FOREIGN KEY (phone_number)
         REFERENCES users(phone_number)
         ON DELETE CASCADE,
     CONSTRAINT chk_status CHECK (status IN ('pending', 'approved', 'rejected', 'expired'))
-);
+) PARTITION BY RANGE (created_at);
+
+-- Partitions live outside the API-exposed schema
+CREATE SCHEMA IF NOT EXISTS partitions;
+
+-- Rows outside the daily partitions (clock skew, missed maintenance)
+CREATE TABLE IF NOT EXISTS partitions.auth_sessions_default PARTITION OF auth_sessions DEFAULT;
 
 -- Create indexes for auth sessions
+-- Foreign key lookups for ON DELETE CASCADE from users
 CREATE INDEX IF NOT EXISTS idx_auth_sessions_phone ON auth_sessions(phone_number);
-CREATE INDEX IF NOT EXISTS idx_auth_sessions_telegram_id ON auth_sessions(telegram_id);
-CREATE INDEX IF NOT EXISTS idx_auth_sessions_status ON auth_sessions(status);
-CREATE INDEX IF NOT EXISTS idx_auth_sessions_created_at ON auth_sessions(created_at DESC);
+-- Latest pending session for a phone number
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_pending_phone ON auth_sessions(phone_number, created_at DESC)
+    WHERE status = 'pending';
+-- Expiration sweep (expire_old_auth_sessions)
+CREATE INDEX IF NOT EXISTS idx_auth_sessions_pending_expires ON auth_sessions(expires_at)
+    WHERE status = 'pending';
+
+-- Per-day session counts kept when old partitions are dropped
+CREATE TABLE IF NOT EXISTS auth_sessions_daily_stats (
+    day DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    sessions BIGINT NOT NULL,
+
+    PRIMARY KEY (day, status)
+);
+
+-- Completed quests, one row per (user, quest)
+CREATE TABLE IF NOT EXISTS user_quest_completions (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    quest_id TEXT NOT NULL,
+    completed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+
+    PRIMARY KEY (user_id, quest_id)
+);
+
+-- Per-quest queries (the primary key covers lookups by user)
+CREATE INDEX IF NOT EXISTS idx_user_quest_completions_quest ON user_quest_completions(quest_id, completed_at);
+
+-- Paged snapshot used to build the in-memory leaderboard
+CREATE OR REPLACE FUNCTION leaderboard_snapshot(p_after UUID DEFAULT NULL, p_limit INT DEFAULT 1000)
+RETURNS TABLE (user_id UUID, quest_count BIGINT, last_completed_at TIMESTAMP WITH TIME ZONE) AS $$
+    SELECT c.user_id, count(*), max(c.completed_at)
+    FROM user_quest_completions c
+    WHERE p_after IS NULL OR c.user_id > p_after
+    GROUP BY c.user_id
+    ORDER BY c.user_id
+    LIMIT p_limit;
+$$ LANGUAGE sql STABLE;
+
+-- Incrementally maintained counters (quest completions, auth session transitions)
+CREATE TABLE IF NOT EXISTS stats_counters (
+    scope VARCHAR(32) NOT NULL,
+    key TEXT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+
+    PRIMARY KEY (scope, key)
+);
+
+CREATE OR REPLACE FUNCTION increment_stats_counter(p_scope TEXT, p_key TEXT, p_delta BIGINT DEFAULT 1)
+RETURNS BIGINT AS $$
+    INSERT INTO stats_counters (scope, key, value)
+    VALUES (p_scope, p_key, p_delta)
+    ON CONFLICT (scope, key) DO UPDATE
+        SET value = stats_counters.value + EXCLUDED.value,
+            updated_at = NOW()
+    RETURNING value;
+$$ LANGUAGE sql;
+
+-- Bot broadcasts (POST /admin/broadcasts), resumed after a restart
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    text TEXT NOT NULL,
+    parse_mode VARCHAR(16),
+    status VARCHAR(16) NOT NULL DEFAULT 'running'
+        CHECK (status IN ('running', 'completed', 'cancelled')),
+    -- Last users.id processed; a restarted job continues after it
+    cursor UUID,
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    -- Instance running the job; another one may take it over once lease_until passes
+    locked_by TEXT,
+    lease_until TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Creates daily auth_sessions partitions ahead of time and drops the ones older
+-- than the retention period, optionally archiving per-day counts first.
+-- Called hourly by the service (AUTH_SESSION_RETENTION_DAYS) or by pg_cron.
+CREATE OR REPLACE FUNCTION maintain_auth_session_partitions(
+    p_retention_days INT DEFAULT 7,
+    p_premake_days INT DEFAULT 3,
+    p_archive BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (action TEXT, partition_name TEXT)
+SECURITY DEFINER
+SET search_path = public, partitions
+AS $$
+DECLARE
+    v_today DATE := (NOW() AT TIME ZONE 'UTC')::date;
+    v_cutoff DATE := v_today - p_retention_days;
+    v_day DATE;
+    v_from TIMESTAMPTZ;
+    v_to TIMESTAMPTZ;
+    v_name TEXT;
+BEGIN
+    -- Only one service instance runs maintenance at a time
+    IF NOT pg_try_advisory_xact_lock(hashtext('maintain_auth_session_partitions')) THEN
+        RETURN;
+    END IF;
+
+    FOR v_day IN
+        SELECT d::date FROM generate_series(v_today, v_today + p_premake_days, interval '1 day') AS d
+    LOOP
+        v_name := 'auth_sessions_p' || to_char(v_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass('partitions.' || v_name) IS NOT NULL;
+        v_from := v_day::timestamp AT TIME ZONE 'UTC';
+        v_to := (v_day + 1)::timestamp AT TIME ZONE 'UTC';
+        BEGIN
+            -- Rows that reached the default partition while maintenance was missed would make
+            -- CREATE ... PARTITION OF fail: move them out and back in through the new partition
+            CREATE TEMP TABLE IF NOT EXISTS auth_sessions_moved (LIKE public.auth_sessions) ON COMMIT DROP;
+            TRUNCATE pg_temp.auth_sessions_moved;
+            WITH moved AS (
+                DELETE FROM partitions.auth_sessions_default s
+                WHERE s.created_at >= v_from AND s.created_at < v_to
+                RETURNING s.*
+            )
+            INSERT INTO pg_temp.auth_sessions_moved SELECT * FROM moved;
+
+            EXECUTE format(
+                'CREATE TABLE partitions.%I PARTITION OF public.auth_sessions FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_from, v_to
+            );
+            INSERT INTO public.auth_sessions SELECT * FROM pg_temp.auth_sessions_moved;
+            action := 'created';
+        EXCEPTION WHEN OTHERS THEN
+            -- Subtransaction is rolled back (the rows stay in default); other days and retention still run
+            RAISE WARNING 'auth_sessions partition % not created: %', v_name, SQLERRM;
+            action := 'failed';
+        END;
+        partition_name := v_name;
+        RETURN NEXT;
+    END LOOP;
+
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE i.inhparent = 'public.auth_sessions'::regclass
+          AND n.nspname = 'partitions'
+          AND c.relname ~ '^auth_sessions_p[0-9]{8}$'
+          AND to_date(substring(c.relname FROM 16), 'YYYYMMDD') < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        BEGIN
+            IF p_archive THEN
+                EXECUTE format(
+                    'INSERT INTO auth_sessions_daily_stats (day, status, sessions)
+                     SELECT (created_at AT TIME ZONE ''UTC'')::date, status, count(*)
+                     FROM partitions.%I
+                     GROUP BY 1, 2
+                     ON CONFLICT (day, status) DO UPDATE
+                         SET sessions = auth_sessions_daily_stats.sessions + EXCLUDED.sessions',
+                    v_name
+                );
+            END IF;
+            EXECUTE format('ALTER TABLE public.auth_sessions DETACH PARTITION partitions.%I', v_name);
+            EXECUTE format('DROP TABLE partitions.%I', v_name);
+            action := 'dropped';
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'auth_sessions partition % not dropped: %', v_name, SQLERRM;
+            action := 'failed';
+        END;
+        partition_name := v_name;
+        RETURN NEXT;
+    END LOOP;
+
+    -- Old rows in the default partition are archived and removed the same way
+    IF p_archive THEN
+        INSERT INTO auth_sessions_daily_stats (day, status, sessions)
+        SELECT (s.created_at AT TIME ZONE 'UTC')::date, s.status, count(*)
+        FROM partitions.auth_sessions_default s
+        WHERE s.created_at < v_cutoff::timestamp AT TIME ZONE 'UTC'
+        GROUP BY 1, 2
+        ON CONFLICT (day, status) DO UPDATE
+            SET sessions = auth_sessions_daily_stats.sessions + EXCLUDED.sessions;
+    END IF;
+    DELETE FROM partitions.auth_sessions_default s
+    WHERE s.created_at < v_cutoff::timestamp AT TIME ZONE 'UTC';
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE ALL ON FUNCTION maintain_auth_session_partitions(INT, INT, BOOLEAN) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION maintain_auth_session_partitions(INT, INT, BOOLEAN) TO service_role;
+
+-- Create today's partitions
+SELECT * FROM maintain_auth_session_partitions();
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -67,6 +267,46 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Links a Telegram account to a phone number (creating the user if needed)
+-- and returns the latest live pending session for that phone in one call.
+-- bot_index is kept from the first link unless another Telegram account claims the phone.
+-- Result: {"user": {...}, "session": {...} | null}
+CREATE OR REPLACE FUNCTION link_telegram_contact(
+    p_phone_number TEXT,
+    p_telegram_id BIGINT,
+    p_telegram_username TEXT DEFAULT NULL,
+    p_bot_index SMALLINT DEFAULT 0
+)
+RETURNS JSON AS $$
+    WITH linked AS (
+        INSERT INTO users (phone_number, telegram_id, telegram_username, bot_index)
+        VALUES (p_phone_number, p_telegram_id, p_telegram_username, p_bot_index)
+        ON CONFLICT (phone_number) DO UPDATE
+            SET telegram_id = EXCLUDED.telegram_id,
+                telegram_username = COALESCE(EXCLUDED.telegram_username, users.telegram_username),
+                bot_index = CASE
+                    WHEN users.bot_index IS NULL OR users.telegram_id IS DISTINCT FROM EXCLUDED.telegram_id
+                        THEN EXCLUDED.bot_index
+                    ELSE users.bot_index
+                END
+        RETURNING id, phone_number, telegram_id, telegram_username, bot_index, created_at, updated_at
+    )
+    SELECT json_build_object(
+        'user', (SELECT row_to_json(linked) FROM linked),
+        'session', (
+            SELECT row_to_json(s)
+            FROM auth_sessions s
+            WHERE s.phone_number = p_phone_number
+              AND s.status = 'pending'
+              AND s.expires_at > NOW()
+              -- Partition key bound (2 x AUTH_SESSION_TIMEOUT, as in auth_service): only the newest partitions are scanned
+              AND s.created_at >= NOW() - interval '10 minutes'
+            ORDER BY s.created_at DESC
+            LIMIT 1
+        )
+    );
+$$ LANGUAGE sql;
+
 -- Optional: Create a scheduled job to run expiration function
 -- You can set this up in Supabase Dashboard -> Database -> Cron Jobs
 -- Or call this function periodically from your application
@@ -74,6 +314,10 @@ $$ LANGUAGE plpgsql;
 -- Row Level Security (RLS) policies
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE auth_sessions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_quest_completions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE stats_counters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE auth_sessions_daily_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE broadcast_jobs ENABLE ROW LEVEL SECURITY;
 
 -- Policy: Users can read their own data
 CREATE POLICY "Users can read own data" ON users
@@ -89,10 +333,33 @@ CREATE POLICY "Service role full access auth_sessions" ON auth_sessions
     FOR ALL
     USING (auth.role() = 'service_role');
 
+CREATE POLICY "Users can read own quest completions" ON user_quest_completions
+    FOR SELECT
+    USING (auth.uid()::text = user_id::text);
+
+CREATE POLICY "Service role full access user_quest_completions" ON user_quest_completions
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access stats_counters" ON stats_counters
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access auth_sessions_daily_stats" ON auth_sessions_daily_stats
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
+CREATE POLICY "Service role full access broadcast_jobs" ON broadcast_jobs
+    FOR ALL
+    USING (auth.role() = 'service_role');
+
 -- Comments for documentation
 COMMENT ON TABLE users IS 'Registered users with phone numbers and Telegram info';
-COMMENT ON TABLE auth_sessions IS 'Temporary authentication sessions for login flow';
+COMMENT ON TABLE auth_sessions IS 'Temporary authentication sessions for login flow, partitioned by day';
+COMMENT ON TABLE user_quest_completions IS 'Completed quests, one row per (user, quest)';
+COMMENT ON TABLE broadcast_jobs IS 'Bot broadcasts to all users with telegram_id, resumable by keyset cursor';
 COMMENT ON COLUMN users.phone_number IS 'User phone number (unique identifier)';
 COMMENT ON COLUMN users.telegram_id IS 'Telegram user ID from bot interaction';
+COMMENT ON COLUMN users.bot_index IS 'Bot the user linked through (index in the bot token list)';
 COMMENT ON COLUMN auth_sessions.status IS 'Session status: pending, approved, rejected, expired';
 COMMENT ON COLUMN auth_sessions.expires_at IS 'When the session expires (typically 5 minutes)';
@@ -1,7 +1,31 @@
-from supabase import create_client, Client
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
 from src.config import settings
 
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+def create_postgrest_client(url: str) -> "Client":
+    # supabase тянет за собой gotrue/postgrest/realtime/storage - импортируем по требованию
+    from supabase import ClientOptions, create_client
+
+    return create_client(
+        url,
+        settings.supabase_key,
+        options=ClientOptions(postgrest_client_timeout=settings.supabase_timeout_seconds),
+    )
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> "Client":
+    from src.database.transport import GuardedTransport
 
-def get_supabase_client() -> Client:
-    return create_client(settings.supabase_url, settings.supabase_key)
+    # Один клиент на процесс: пул соединений к PostgREST переиспользуется между запросами
+    client = create_postgrest_client(settings.supabase_url)
 
+    # postgrest не принимает свой transport, поэтому оборачиваем транспорт созданной сессии
+    session = client.postgrest.session
+    session._transport = GuardedTransport(session._transport)
+    return client
@@ -0,0 +1,109 @@
+import logging
+import time
+
+import httpx
+
+from src.config import settings
+from src.utils.resilience import CircuitOpenError, get_circuit_breaker, timeout_for
+from src.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class GuardedTransport(httpx.BaseTransport):
+    """
+    Единая точка для всех запросов к PostgREST: таймаут по дедлайну запроса
+    и circuit breaker "supabase". 5xx и сетевые ошибки считаются отказами,
+    4xx - нет (зависимость отвечает).
+    """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+        self.breaker = get_circuit_breaker("supabase")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timeout = timeout_for(settings.supabase_timeout_seconds)
+        self.breaker.before_call()
+        request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
+
+        try:
+            with span("supabase", method=request.method, path=request.url.path) as record:
+                response = self.transport.handle_request(request)
+                if record is not None:
+                    record["attrs"]["status"] = response.status_code
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class ReplicaTransport(httpx.BaseTransport):
+    """
+    Транспорт клиента read-реплики: свой breaker на реплику и замер задержки
+    для балансировки (src/database/router.py). Через реплику идут только
+    чтения, их безопасно повторить - при открытом breaker, сетевой ошибке или
+    5xx запрос уходит на primary, вызывающий код отказа реплики не видит.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, replica, primary: httpx.BaseTransport, primary_url: str):
+        self.transport = transport
+        self.replica = replica
+        self.primary = primary
+        self.primary_url = httpx.URL(primary_url)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timeout = timeout_for(settings.supabase_timeout_seconds)
+        try:
+            self.replica.breaker.before_call()
+        except CircuitOpenError:
+            return self._fallback(request)
+        request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
+
+        started = time.perf_counter()
+        try:
+            with span("supabase", method=request.method, path=request.url.path, replica=self.replica.name) as record:
+                response = self.transport.handle_request(request)
+                if record is not None:
+                    record["attrs"]["status"] = response.status_code
+        except Exception as e:
+            self.replica.record_failure()
+            logger.warning("Replica %s failed, reading from primary: %s", self.replica.name, e)
+            return self._fallback(request)
+        except BaseException:
+            self.replica.breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            response.close()
+            self.replica.record_failure()
+            logger.warning("Replica %s returned %d, reading from primary", self.replica.name, response.status_code)
+            return self._fallback(request)
+
+        self.replica.record_success(time.perf_counter() - started)
+        return response
+
+    def _fallback(self, request: httpx.Request) -> httpx.Response:
+        self.replica.fallbacks += 1
+        # Пути PostgREST у реплики и primary совпадают, меняется только адрес
+        url = request.url.copy_with(
+            scheme=self.primary_url.scheme,
+            host=self.primary_url.host,
+            port=self.primary_url.port,
+        )
+        headers = [(name, value) for name, value in request.headers.raw if name.lower() != b"host"]
+        primary_request = httpx.Request(request.method, url, headers=headers, content=request.read())
+        return self.primary.handle_request(primary_request)
+
+    def close(self) -> None:
+        self.transport.close()
@@ -1,5 +1,7 @@
 from .user import User, UserCreate
 from .auth import AuthSession, AuthSessionResponse, AuthStatus, TokenPair
+from .records import UserRecord, AuthSessionRecord
+from .broadcast import BroadcastCreate, BroadcastJob, BroadcastStatus
 
 __all__ = [
     "User",
@@ -8,4 +10,9 @@ __all__ = [
     "AuthSessionResponse",
     "AuthStatus",
     "TokenPair",
+    "UserRecord",
+    "AuthSessionRecord",
+    "BroadcastCreate",
+    "BroadcastJob",
+    "BroadcastStatus",
 ]
@@ -31,6 +31,7 @@ class AuthSessionCreate(BaseModel):
 class AuthSessionResponse(BaseModel):
     session_id: str = Field(..., description="Session ID for polling")
     expires_in: int = Field(..., description="Expiration time in seconds")
+    telegram_link: Optional[str] = Field(None, description="Signed t.me deep link bound to this session")
 
 
 class TokenPair(BaseModel):
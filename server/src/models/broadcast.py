@@ -0,0 +1,39 @@
+from datetime import datetime
+from enum import Enum
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BroadcastStatus(str, Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class BroadcastCreate(BaseModel):
+    text: str = Field(..., min_length=1, max_length=4096, description="Message text")
+    parse_mode: Optional[Literal["HTML", "MarkdownV2"]] = Field(None, description="Telegram parse mode")
+
+
+class BroadcastThroughput(BaseModel):
+    elapsed_seconds: float = Field(..., description="Time since this process started or resumed the job")
+    messages_per_second: float = Field(..., description="Processed recipients per second in this run")
+    rate_limited: int = Field(..., description="429 responses from Telegram in this run")
+    retries: int = Field(..., description="Resends after network errors in this run")
+
+
+class BroadcastJob(BaseModel):
+    id: str = Field(..., description="Broadcast job UUID")
+    text: str = Field(..., description="Message text")
+    parse_mode: Optional[str] = Field(None, description="Telegram parse mode")
+    status: BroadcastStatus = Field(..., description="Job status")
+    sent: int = Field(..., description="Messages delivered")
+    blocked: int = Field(..., description="Recipients who blocked the bot")
+    failed: int = Field(..., description="Recipients that failed after retries")
+    locked_by: Optional[str] = Field(None, description="Service instance running the job")
+    lease_until: Optional[datetime] = Field(None, description="Lease expiry; then another instance may resume the job")
+    created_at: datetime = Field(..., description="Creation timestamp")
+    updated_at: Optional[datetime] = Field(None, description="Last progress checkpoint")
+    finished_at: Optional[datetime] = Field(None, description="Completion or cancellation timestamp")
+    throughput: Optional[BroadcastThroughput] = Field(None, description="Live stats while the job runs here")
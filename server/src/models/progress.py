@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -7,3 +10,39 @@ class CompleteQuestRequest(BaseModel):
 
 class ProgressResponse(BaseModel):
     completed_quests: list[str] = Field(..., description="List of completed quest IDs")
+
+
+class CompactProgressResponse(BaseModel):
+    mask: str = Field(..., description="Completed quests as a hex bitmask over the quest catalog")
+    catalog_version: int = Field(..., description="Quest catalog version the mask refers to")
+    all_done: bool = Field(..., description="Whether every quest in the catalog is completed")
+
+
+class QuestCatalogEntry(BaseModel):
+    id: str = Field(..., description="Quest ID")
+    bit: int = Field(..., description="Stable bit index of the quest in progress masks")
+
+
+class QuestCatalogResponse(BaseModel):
+    version: int = Field(..., description="Quest catalog version")
+    quests: list[QuestCatalogEntry] = Field(..., description="Known quests")
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int = Field(..., description="Position in the leaderboard (1-based)")
+    telegram_username: Optional[str] = Field(None, description="Telegram username")
+    completed_count: int = Field(..., description="Number of completed quests")
+    last_completed_at: datetime = Field(..., description="When the last quest was completed")
+    is_me: bool = Field(False, description="Whether this entry is the caller")
+
+
+class LeaderboardPosition(BaseModel):
+    rank: int = Field(..., description="Caller position in the leaderboard (1-based)")
+    completed_count: int = Field(..., description="Number of completed quests")
+    last_completed_at: datetime = Field(..., description="When the last quest was completed")
+
+
+class LeaderboardResponse(BaseModel):
+    total_players: int = Field(..., description="Players with at least one completed quest")
+    top: list[LeaderboardEntry] = Field(..., description="Top players")
+    me: Optional[LeaderboardPosition] = Field(None, description="Caller position, if ranked")
@@ -0,0 +1,133 @@
+"""
+Легковесные записи для внутреннего использования в сервисах и боте.
+
+Строки из Supabase оборачиваются без валидации pydantic: поля копируются
+как есть, а timestamp'ы разбираются в datetime только при первом обращении.
+Pydantic модели (User, AuthSession) остаются на границе API - FastAPI
+валидирует и сериализует ответ по response_model.
+"""
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from src.models.auth import AuthStatus
+
+
+def _parse_datetime(value: Union[str, datetime, None]) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class UserRecord:
+    __slots__ = (
+        "id",
+        "phone_number",
+        "telegram_id",
+        "telegram_username",
+        "bot_index",
+        "_created_at",
+        "_updated_at",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        phone_number: str,
+        telegram_id: Optional[int] = None,
+        telegram_username: Optional[str] = None,
+        created_at: Union[str, datetime, None] = None,
+        updated_at: Union[str, datetime, None] = None,
+        bot_index: Optional[int] = None,
+    ):
+        self.id = id
+        self.phone_number = phone_number
+        self.telegram_id = telegram_id
+        self.telegram_username = telegram_username
+        self.bot_index = bot_index
+        self._created_at = created_at
+        self._updated_at = updated_at
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "UserRecord":
+        return cls(
+            row["id"],
+            row["phone_number"],
+            row.get("telegram_id"),
+            row.get("telegram_username"),
+            row.get("created_at"),
+            row.get("updated_at"),
+            row.get("bot_index"),
+        )
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        self._created_at = _parse_datetime(self._created_at)
+        return self._created_at
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        self._updated_at = _parse_datetime(self._updated_at)
+        return self._updated_at
+
+    def __repr__(self) -> str:
+        return f"UserRecord(id={self.id!r}, phone_number={self.phone_number!r}, telegram_id={self.telegram_id!r})"
+
+
+class AuthSessionRecord:
+    __slots__ = (
+        "id",
+        "phone_number",
+        "telegram_id",
+        "status",
+        "_created_at",
+        "_expires_at",
+        "_approved_at",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        phone_number: str,
+        telegram_id: Optional[int] = None,
+        status: AuthStatus = AuthStatus.PENDING,
+        created_at: Union[str, datetime, None] = None,
+        expires_at: Union[str, datetime, None] = None,
+        approved_at: Union[str, datetime, None] = None,
+    ):
+        self.id = id
+        self.phone_number = phone_number
+        self.telegram_id = telegram_id
+        self.status = AuthStatus(status)
+        self._created_at = created_at
+        self._expires_at = expires_at
+        self._approved_at = approved_at
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "AuthSessionRecord":
+        return cls(
+            row["id"],
+            row["phone_number"],
+            row.get("telegram_id"),
+            row.get("status", AuthStatus.PENDING),
+            row.get("created_at"),
+            row.get("expires_at"),
+            row.get("approved_at"),
+        )
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        self._created_at = _parse_datetime(self._created_at)
+        return self._created_at
+
+    @property
+    def expires_at(self) -> Optional[datetime]:
+        self._expires_at = _parse_datetime(self._expires_at)
+        return self._expires_at
+
+    @property
+    def approved_at(self) -> Optional[datetime]:
+        self._approved_at = _parse_datetime(self._approved_at)
+        return self._approved_at
+
+    def __repr__(self) -> str:
+        return f"AuthSessionRecord(id={self.id!r}, status={self.status.value!r})"
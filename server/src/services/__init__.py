@@ -3,6 +3,10 @@ from .auth_service import AuthService
 from .jwt_service import JWTService
 from .event_service import EventService
 from .progress_service import ProgressService
+from .stats_service import StatsService
+from .leaderboard_service import LeaderboardService
+from .session_retention_service import SessionRetentionService
+from .broadcast_service import BroadcastService
 
 __all__ = [
     "UserService",
@@ -10,4 +14,8 @@ __all__ = [
     "JWTService",
     "EventService",
     "ProgressService",
+    "StatsService",
+    "LeaderboardService",
+    "SessionRetentionService",
+    "BroadcastService",
 ]
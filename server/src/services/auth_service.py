@@ -2,8 +2,8 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 import uuid
 
-from src.database import get_supabase_client
-from src.models import AuthSession, AuthStatus, TokenPair
+from src.database import get_read_client, get_supabase_client, mark_written
+from src.models import AuthSessionRecord, AuthStatus, TokenPair, UserRecord
 from src.config.settings import (
     settings,
     AUTH_SESSION_TIMEOUT,
@@ -11,8 +11,20 @@ from src.config.settings import (
     REFRESH_TOKEN_EXPIRE_DAYS
 )
 from src.services.jwt_service import JWTService
-from src.services.user_service import UserService
+from src.services.user_service import USER_COLUMNS, UserService
 from src.services.event_service import EventService
+from src.services.stats_service import StatsService
+from src.utils.single_flight import SingleFlight
+
+_session_flight = SingleFlight("auth_sessions")
+
+# auth_sessions секционирована по created_at: граница в запросах отсекает все партиции,
+# кроме последних. Сессия живет AUTH_SESSION_TIMEOUT, окно с запасом на поздний обмен токенов
+AUTH_SESSION_LOOKUP_SECONDS = 2 * AUTH_SESSION_TIMEOUT
+
+
+def _lookup_since() -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=AUTH_SESSION_LOOKUP_SECONDS)).isoformat()
 
 
 class AuthService:
@@ -21,8 +33,9 @@ class AuthService:
         self.jwt_service = JWTService()
         self.user_service = UserService()
         self.event_service = EventService()
+        self.stats_service = StatsService(self.db)
 
-    def create_auth_session(self, phone_number: str) -> AuthSession:
+    def create_auth_session(self, phone_number: str) -> AuthSessionRecord:
         self.user_service.get_or_create_user(phone_number)
 
         self._expire_old_sessions(phone_number)
@@ -38,38 +51,51 @@ class AuthService:
         }
 
         response = self.db.table("auth_sessions").insert(data).execute()
+        self.stats_service.record_auth_transition("created")
+
+        session = AuthSessionRecord.from_row(response.data[0])
+        # Фронтенд сразу начинает опрашивать сессию - реплика может ее еще не видеть
+        mark_written(session.id)
+        return session
 
-        return AuthSession(**response.data[0])
+    def get_auth_session(self, session_id: str) -> Optional[AuthSessionRecord]:
+        return _session_flight.do(session_id, self._fetch_auth_session, session_id)
 
-    def get_auth_session(self, session_id: str) -> Optional[AuthSession]:
+    def _fetch_auth_session(self, session_id: str, primary: bool = False) -> Optional[AuthSessionRecord]:
+        db = self.db if primary else get_read_client(session_id)
         response = (
-            self.db.table("auth_sessions")
+            db.table("auth_sessions")
             .select("*")
             .eq("id", session_id)
+            .gte("created_at", _lookup_since())
             .execute()
         )
 
         if response.data:
-            session = AuthSession(**response.data[0])
+            session = AuthSessionRecord.from_row(response.data[0])
             if session.status == AuthStatus.PENDING and session.expires_at < datetime.now(timezone.utc):
+                if db is not self.db:
+                    # Реплика могла не догнать подтверждение - решение о записи только по primary
+                    return self._fetch_auth_session(session_id, primary=True)
                 session = self.expire_session(session_id)
             return session
 
         return None
 
-    def get_pending_session_by_phone(self, phone_number: str) -> Optional[AuthSession]:
+    def get_pending_session_by_phone(self, phone_number: str) -> Optional[AuthSessionRecord]:
         response = (
             self.db.table("auth_sessions")
             .select("*")
             .eq("phone_number", phone_number)
             .eq("status", AuthStatus.PENDING.value)
+            .gte("created_at", _lookup_since())
             .order("created_at", desc=True)
             .limit(1)
             .execute()
         )
 
         if response.data:
-            session = AuthSession(**response.data[0])
+            session = AuthSessionRecord.from_row(response.data[0])
             if session.expires_at < datetime.now(timezone.utc):
                 self.expire_session(session.id)
                 return None
@@ -77,7 +103,28 @@ class AuthService:
 
         return None
 
-    def get_pending_session_by_telegram(self, telegram_id: int) -> Optional[AuthSession]:
+    def get_session_with_owner(self, session_id: str) -> Optional[tuple[AuthSessionRecord, Optional[UserRecord]]]:
+        """
+        Сессия и владелец номера одним запросом (embed по fk_user_phone) -
+        для /start по подписанному deep link вместо поиска пользователя и сессии.
+        """
+        response = (
+            self.db.table("auth_sessions")
+            .select(f"*, owner:users!fk_user_phone({USER_COLUMNS})")
+            .eq("id", session_id)
+            .gte("created_at", _lookup_since())
+            .limit(1)
+            .execute()
+        )
+
+        if not response.data:
+            return None
+
+        row = response.data[0]
+        owner = row.pop("owner", None)
+        return AuthSessionRecord.from_row(row), UserRecord.from_row(owner) if owner else None
+
+    def get_pending_session_by_telegram(self, telegram_id: int) -> Optional[AuthSessionRecord]:
         user = self.user_service.get_user_by_telegram_id(telegram_id)
         if not user:
             return None
@@ -89,8 +136,9 @@ class AuthService:
         session_id: str,
         telegram_id: int,
         telegram_username: Optional[str] = None,
-    ) -> Optional[AuthSession]:
-        session = self.get_auth_session(session_id)
+    ) -> Optional[AuthSessionRecord]:
+        # Перед записью читаем свежее состояние с primary, а не присоединяемся к чтению в полете
+        session = self._fetch_auth_session(session_id, primary=True)
 
         if not session or session.status != AuthStatus.PENDING:
             return None
@@ -115,41 +163,53 @@ class AuthService:
             self.db.table("auth_sessions")
             .update(update_data)
             .eq("id", session_id)
+            .gte("created_at", _lookup_since())
             .execute()
         )
+        _session_flight.forget(session_id)
+        mark_written(session_id)
 
         if response.data:
+            self.stats_service.record_auth_transition(AuthStatus.APPROVED.value)
             await self.event_service.send_auth_approved_event(session_id)
-            return AuthSession(**response.data[0])
+            return AuthSessionRecord.from_row(response.data[0])
         return None
 
-    async def reject_session(self, session_id: str) -> Optional[AuthSession]:
+    async def reject_session(self, session_id: str) -> Optional[AuthSessionRecord]:
         update_data = {"status": AuthStatus.REJECTED.value}
 
         response = (
             self.db.table("auth_sessions")
             .update(update_data)
             .eq("id", session_id)
+            .gte("created_at", _lookup_since())
             .execute()
         )
+        _session_flight.forget(session_id)
+        mark_written(session_id)
 
         if response.data:
+            self.stats_service.record_auth_transition(AuthStatus.REJECTED.value)
             await self.event_service.send_auth_rejected_event(session_id)
-            return AuthSession(**response.data[0])
+            return AuthSessionRecord.from_row(response.data[0])
         return None
 
-    def expire_session(self, session_id: str) -> Optional[AuthSession]:
+    def expire_session(self, session_id: str) -> Optional[AuthSessionRecord]:
         update_data = {"status": AuthStatus.EXPIRED.value}
 
         response = (
             self.db.table("auth_sessions")
             .update(update_data)
             .eq("id", session_id)
+            .gte("created_at", _lookup_since())
             .execute()
         )
+        _session_flight.forget(session_id)
+        mark_written(session_id)
 
         if response.data:
-            return AuthSession(**response.data[0])
+            self.stats_service.record_auth_transition(AuthStatus.EXPIRED.value)
+            return AuthSessionRecord.from_row(response.data[0])
         return None
 
     def generate_tokens_for_session(self, session_id: str) -> Optional[TokenPair]:
@@ -172,6 +232,13 @@ class AuthService:
         )
 
     def _expire_old_sessions(self, phone_number: str) -> None:
-        self.db.table("auth_sessions").update(
-            {"status": AuthStatus.EXPIRED.value}
-        ).eq("phone_number", phone_number).eq("status", AuthStatus.PENDING.value).execute()
+        response = (
+            self.db.table("auth_sessions")
+            .update({"status": AuthStatus.EXPIRED.value})
+            .eq("phone_number", phone_number)
+            .eq("status", AuthStatus.PENDING.value)
+            .gte("created_at", _lookup_since())
+            .execute()
+        )
+
+        self.stats_service.record_auth_transition(AuthStatus.EXPIRED.value, len(response.data))
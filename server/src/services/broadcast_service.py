@@ -0,0 +1,472 @@
+"""
+Рассылки бота всем пользователям с telegram_id (POST /admin/broadcasts).
+
+Задание хранится в broadcast_jobs. Получатели читаются страницами
+keyset-пагинацией по users.id - следующая страница грузится, пока
+отправляется текущая. Отправляют несколько воркеров через общий на процесс
+RatePacer бота получателя (users.bot_index): не больше
+BROADCAST_RATE_PER_SECOND сообщений в секунду на бот по всем рассылкам и не
+чаще раза в секунду в один чат - с каждым токеном общий темп растет. 429 от Telegram (RetryLater)
+ставит на паузу всех воркеров на retry_after, сообщение отправляется
+повторно - не больше MAX_RATE_LIMITED_ATTEMPTS раз. Пока открыт breaker
+Telegram, рассылка ждет без расхода попыток. Заблокировавшие бота считаются в blocked и пропускаются, сетевые
+ошибки повторяются до BROADCAST_MAX_RETRIES раз.
+
+После каждой страницы в задание пишутся cursor и счетчики, при остановке
+посреди страницы - cursor последнего получателя, до которого обработаны
+все. После падения процесса повторно могут уйти только сообщения
+незавершенной страницы.
+
+Задание выполняет один инстанс - владелец аренды (locked_by, lease_until).
+Аренда продлевается с каждой страницей и фоном раз в треть
+BROADCAST_LEASE_SECONDS; все записи раннера условны по status = running и
+locked_by. Если запись не прошла - задание отменено (в том числе на другом
+инстансе) или аренда перешла другому, и раннер останавливается.
+Задания running с истекшей арендой подхватывает run_broadcast_supervisor
+любого инстанса.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from src.config import settings
+from src.models import BroadcastStatus
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Исход отправки одному получателю
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+
+PER_CHAT_INTERVAL = 1.0
+# Повторы после 429 не расходуют попытки, но и не бесконечны
+MAX_RATE_LIMITED_ATTEMPTS = 10
+
+# Владелец аренды заданий в broadcast_jobs.locked_by
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# chat_id, text, parse_mode, bot_index -> SENT | BLOCKED | FAILED
+Sender = Callable[[int, str, Optional[str], int], Awaitable[str]]
+
+
+class RetryLater(Exception):
+    """
+    Пауза для всех отправок: Telegram просит подождать (429, rate_limited)
+    или недоступен (открыт circuit breaker).
+    """
+
+    def __init__(self, retry_after: float, rate_limited: bool = False):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+
+
+class RatePacer:
+    def __init__(self, rate: float, per_chat_interval: float = PER_CHAT_INTERVAL):
+        self.interval = 1.0 / rate
+        self.per_chat_interval = per_chat_interval
+        self._next_slot = 0.0
+        self._paused_until = 0.0
+        self._chat_next: dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        # Один event loop: слоты раздаются без блокировок
+        while True:
+            now = time.monotonic()
+            wait = max(self._paused_until, self._chat_next.get(chat_id, 0.0)) - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            # Пока ждали слот, другой воркер мог получить 429 - тогда ждем паузу
+            if self._paused_until <= time.monotonic():
+                break
+
+        now = time.monotonic()
+        self._chat_next[chat_id] = now + self.per_chat_interval
+        if len(self._chat_next) > 4096:
+            self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._next_slot = max(self._next_slot, self._paused_until)
+
+
+def _lease_until() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=settings.broadcast_lease_seconds)).isoformat()
+
+
+class BroadcastService:
+    def __init__(self, supabase: "Client"):
+        self.supabase = supabase
+
+    def create_job(self, text: str, parse_mode: Optional[str] = None) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        response = self.supabase.table("broadcast_jobs").insert({
+            "text": text,
+            "parse_mode": parse_mode,
+            "status": BroadcastStatus.RUNNING.value,
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "locked_by": INSTANCE_ID,
+            "lease_until": _lease_until(),
+            "created_at": now,
+            "updated_at": now,
+        }).execute()
+        return response.data[0]
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        response = self.supabase.table("broadcast_jobs").select("*").eq("id", job_id).execute()
+        return response.data[0] if response.data else None
+
+    def list_jobs(self, limit: int) -> list[dict]:
+        response = (
+            self.supabase.table("broadcast_jobs")
+            .select("*")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+    def running_jobs(self) -> list[dict]:
+        response = (
+            self.supabase.table("broadcast_jobs")
+            .select("*")
+            .eq("status", BroadcastStatus.RUNNING.value)
+            .order("created_at")
+            .execute()
+        )
+        return response.data
+
+    def claim(self, job_id: str) -> Optional[dict]:
+        """Аренда задания, которое никто не выполняет; None - задание занято или уже не running."""
+        now = datetime.now(timezone.utc).isoformat()
+        response = (
+            self.supabase.table("broadcast_jobs")
+            .update({"locked_by": INSTANCE_ID, "lease_until": _lease_until()})
+            .eq("id", job_id)
+            .eq("status", BroadcastStatus.RUNNING.value)
+            .or_(f'lease_until.is.null,lease_until.lt."{now}"')
+            .execute()
+        )
+        return response.data[0] if response.data else None
+
+    def renew_lease(self, job_id: str) -> bool:
+        """False - задание отменено или аренда перешла другому инстансу."""
+        response = (
+            self.supabase.table("broadcast_jobs")
+            .update({"lease_until": _lease_until()})
+            .eq("id", job_id)
+            .eq("status", BroadcastStatus.RUNNING.value)
+            .eq("locked_by", INSTANCE_ID)
+            .execute()
+        )
+        return bool(response.data)
+
+    def release(self, job_id: str) -> None:
+        (
+            self.supabase.table("broadcast_jobs")
+            .update({"lease_until": None})
+            .eq("id", job_id)
+            .eq("locked_by", INSTANCE_ID)
+            .execute()
+        )
+
+    def fetch_recipients(self, after: Optional[str], limit: int) -> list[dict]:
+        # Keyset по id: страница не дорожает к концу таблицы, новые пользователи попадают в хвост
+        query = self.supabase.table("users").select("id, telegram_id, bot_index").not_.is_("telegram_id", "null")
+        if after is not None:
+            query = query.gt("id", after)
+        return query.order("id").limit(limit).execute().data
+
+    def save_progress(self, job_id: str, cursor: Optional[str], counters: dict[str, int]) -> bool:
+        """Чекпойнт страницы с продлением аренды; False - как у renew_lease."""
+        response = (
+            self.supabase.table("broadcast_jobs")
+            .update({
+                "cursor": cursor,
+                **counters,
+                "lease_until": _lease_until(),
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            })
+            .eq("id", job_id)
+            .eq("status", BroadcastStatus.RUNNING.value)
+            .eq("locked_by", INSTANCE_ID)
+            .execute()
+        )
+        return bool(response.data)
+
+    def finish(
+        self,
+        job_id: str,
+        status: BroadcastStatus,
+        counters: Optional[dict[str, int]] = None,
+        owned: bool = False,
+    ) -> Optional[dict]:
+        """owned - только если аренда у этого инстанса (завершение раннером, а не отмена)."""
+        now = datetime.now(timezone.utc).isoformat()
+        query = self.supabase.table("broadcast_jobs").update({
+            "status": status.value,
+            **(counters or {}),
+            "lease_until": None,
+            "updated_at": now,
+            "finished_at": now,
+        }).eq("id", job_id).eq("status", BroadcastStatus.RUNNING.value)
+        if owned:
+            query = query.eq("locked_by", INSTANCE_ID)
+        response = query.execute()
+        return response.data[0] if response.data else None
+
+
+class BroadcastRunner:
+    def __init__(self, service: BroadcastService, job: dict, send: Sender, pacer_for: Callable[[int], RatePacer]):
+        self.service = service
+        self.job_id = job["id"]
+        self.text = job["text"]
+        self.parse_mode = job.get("parse_mode")
+        self.cursor: Optional[str] = job.get("cursor")
+        self.send = send
+        self.pacer_for = pacer_for
+        self.counters = {SENT: job.get("sent", 0), BLOCKED: job.get("blocked", 0), FAILED: job.get("failed", 0)}
+
+        self.started = time.monotonic()
+        # Задание только что создано или взято в аренду этим инстансом
+        self.lease_expires = self.started + settings.broadcast_lease_seconds
+        self.processed = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def run(self) -> None:
+        page_size = settings.broadcast_page_size
+        heartbeat = asyncio.create_task(self._keep_lease(asyncio.current_task()))
+        next_page = asyncio.create_task(
+            asyncio.to_thread(self.service.fetch_recipients, self.cursor, page_size)
+        )
+        try:
+            while True:
+                page = await next_page
+                if not page:
+                    break
+                # Следующая страница читается, пока отправляется текущая
+                next_page = asyncio.create_task(
+                    asyncio.to_thread(self.service.fetch_recipients, page[-1]["id"], page_size)
+                )
+                await self._send_page(page)
+                self.cursor = page[-1]["id"]
+                if not await self._save_progress():
+                    logger.warning("Broadcast %s stopped: cancelled or leased by another instance", self.job_id)
+                    return
+                logger.info(
+                    "Broadcast %s: %d sent, %d blocked, %d failed, %.1f msg/s",
+                    self.job_id, self.counters[SENT], self.counters[BLOCKED], self.counters[FAILED],
+                    self.messages_per_second(),
+                )
+        finally:
+            next_page.cancel()
+            heartbeat.cancel()
+
+        finished = await asyncio.to_thread(
+            self.service.finish, self.job_id, BroadcastStatus.COMPLETED, self.counters, True
+        )
+        if finished is None:
+            logger.warning("Broadcast %s finished but was cancelled or leased by another instance", self.job_id)
+            return
+        logger.info(
+            "Broadcast %s completed: %d sent, %d blocked, %d failed",
+            self.job_id, self.counters[SENT], self.counters[BLOCKED], self.counters[FAILED],
+        )
+
+    async def _send_page(self, page: list[dict]) -> None:
+        done = [False] * len(page)
+        pending = iter(enumerate(page))
+
+        async def worker() -> None:
+            for index, recipient in pending:
+                await self._deliver(recipient["telegram_id"], recipient.get("bot_index") or 0)
+                done[index] = True
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(settings.broadcast_concurrency, len(page)))]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for task in workers:
+                task.cancel()
+            # Остановка посреди страницы: cursor до первого необработанного получателя
+            prefix = done.index(False) if False in done else len(page)
+            if prefix:
+                self.cursor = page[prefix - 1]["id"]
+                await asyncio.shield(self._save_progress())
+            raise
+
+    async def _save_progress(self) -> bool:
+        renewed_at = time.monotonic()
+        owned = await asyncio.to_thread(self.service.save_progress, self.job_id, self.cursor, self.counters)
+        if owned:
+            self.lease_expires = renewed_at + settings.broadcast_lease_seconds
+        return owned
+
+    async def _keep_lease(self, run_task: asyncio.Task) -> None:
+        # Страница может идти дольше аренды (паузы 429, недоступный Telegram) - продлеваем фоном
+        while True:
+            await asyncio.sleep(settings.broadcast_lease_seconds / 3)
+            renewed_at = time.monotonic()
+            try:
+                owned = await asyncio.to_thread(self.service.renew_lease, self.job_id)
+            except Exception as e:
+                logger.warning("Broadcast %s lease renewal failed: %s", self.job_id, e)
+                # Без подтверждения аренды после ее истечения задание может взять другой инстанс
+                owned = renewed_at < self.lease_expires
+            else:
+                if owned:
+                    self.lease_expires = renewed_at + settings.broadcast_lease_seconds
+
+            if not owned:
+                logger.warning("Broadcast %s stopped: cancelled or lease lost", self.job_id)
+                run_task.cancel()
+                return
+
+    async def _deliver(self, chat_id: int, bot_index: int) -> None:
+        pacer = self.pacer_for(bot_index)
+        errors = 0
+        rate_limited = 0
+        while True:
+            await pacer.acquire(chat_id)
+            try:
+                outcome = await self.send(chat_id, self.text, self.parse_mode, bot_index)
+            except RetryLater as e:
+                pacer.pause(e.retry_after)
+                if not e.rate_limited:
+                    # Telegram недоступен - ответа на это сообщение не было, попытка не тратится
+                    continue
+                self.rate_limited += 1
+                rate_limited += 1
+                if rate_limited < MAX_RATE_LIMITED_ATTEMPTS:
+                    continue
+                outcome = FAILED
+            except Exception as e:
+                errors += 1
+                if errors <= settings.broadcast_max_retries:
+                    self.retries += 1
+                    await asyncio.sleep(min(2 ** errors, 10))
+                    continue
+                logger.warning("Broadcast %s to %s failed: %s", self.job_id, chat_id, e)
+                outcome = FAILED
+
+            self.counters[outcome] += 1
+            self.processed += 1
+            return
+
+    def messages_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "elapsed_seconds": round(time.monotonic() - self.started, 1),
+            "messages_per_second": round(self.messages_per_second(), 2),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
+
+
+_runners: dict[str, tuple[BroadcastRunner, asyncio.Task]] = {}
+_pacers: dict[int, RatePacer] = {}
+
+
+def _get_pacer(bot_index: int) -> RatePacer:
+    # Темп на бот, общий для всех рассылок процесса: лимит Telegram - на токен
+    pacer = _pacers.get(bot_index)
+    if pacer is None:
+        pacer = _pacers[bot_index] = RatePacer(settings.broadcast_rate_per_second)
+    return pacer
+
+
+def start_broadcast(supabase: "Client", job: dict, send: Sender) -> BroadcastRunner:
+    runner = BroadcastRunner(BroadcastService(supabase), job, send, _get_pacer)
+    # Чистый контекст: задание переживает запрос и не наследует его дедлайн
+    task = asyncio.create_task(runner.run(), context=contextvars.Context())
+    _runners[runner.job_id] = (runner, task)
+
+    def _done(finished: asyncio.Task) -> None:
+        _runners.pop(runner.job_id, None)
+        if not finished.cancelled() and finished.exception() is not None:
+            # Задание остается running и продолжится при следующем старте
+            logger.error("Broadcast %s stopped: %s", runner.job_id, finished.exception())
+
+    task.add_done_callback(_done)
+    return runner
+
+
+async def resume_broadcasts(supabase: "Client", send: Sender) -> None:
+    service = BroadcastService(supabase)
+    jobs = await asyncio.to_thread(service.running_jobs)
+    for job in jobs:
+        if job["id"] in _runners:
+            continue
+        # Задание с живой арендой выполняет другой инстанс
+        claimed = await asyncio.to_thread(service.claim, job["id"])
+        if claimed is not None:
+            logger.info("Resuming broadcast %s after %s", claimed["id"], claimed.get("cursor"))
+            start_broadcast(supabase, claimed, send)
+
+
+async def run_broadcast_supervisor(supabase: "Client", send: Sender) -> None:
+    """Подхватывает задания с истекшей арендой: после рестарта или падения другого инстанса."""
+    while True:
+        try:
+            await resume_broadcasts(supabase, send)
+        except Exception as e:
+            logger.error("Failed to resume broadcasts: %s", e)
+        await asyncio.sleep(settings.broadcast_lease_seconds)
+
+
+async def cancel_broadcast(supabase: "Client", job_id: str) -> Optional[dict]:
+    # Задание другого инстанса остановится при следующей записи или продлении аренды
+    entry = _runners.get(job_id)
+    counters = None
+    if entry is not None:
+        runner, task = entry
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        counters = runner.counters
+    return await asyncio.to_thread(BroadcastService(supabase).finish, job_id, BroadcastStatus.CANCELLED, counters)
+
+
+async def stop_broadcasts() -> None:
+    """При остановке процесса: прогресс сохраняется, задания остаются running без аренды."""
+    entries = list(_runners.values())
+    for _, task in entries:
+        task.cancel()
+    await asyncio.gather(*(task for _, task in entries), return_exceptions=True)
+
+    # Другой инстанс подхватит задания сразу, а не после истечения аренды
+    for runner, _ in entries:
+        try:
+            await asyncio.to_thread(runner.service.release, runner.job_id)
+        except Exception as e:
+            logger.warning("Failed to release broadcast %s: %s", runner.job_id, e)
+
+
+def broadcast_runner_stats(job_id: str) -> Optional[dict]:
+    entry = _runners.get(job_id)
+    return entry[0].stats() if entry is not None else None
+
+
+def broadcast_stats() -> dict:
+    return {job_id: {**runner.counters, **runner.stats()} for job_id, (runner, _) in list(_runners.items())}
@@ -1,11 +1,32 @@
+import asyncio
 import logging
-import httpx
 from typing import Optional, Dict, Any
 
 from src.config import settings
+from src.utils.resilience import DependencyUnavailable, get_circuit_breaker, timeout_for
+from src.utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# Общий клиент на процесс: соединение к Realtime не открывается на каждое событие
+_http_client = None
+
+
+def _get_http_client():
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.AsyncClient()
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 class EventService:
     def __init__(self):
@@ -18,6 +39,15 @@ class EventService:
         event_type: str,
         data: Optional[Dict[str, Any]] = None
     ) -> bool:
+        breaker = get_circuit_breaker("realtime")
+        try:
+            timeout = timeout_for(settings.realtime_timeout_seconds)
+            breaker.before_call()
+        except DependencyUnavailable as e:
+            # События best-effort: при деградации Realtime не ждем
+            logger.warning("Auth event %s for session %s skipped: %s", event_type, session_id, e)
+            return False
+
         try:
             channel_name = f"auth_events"
 
@@ -29,8 +59,8 @@ class EventService:
                 "Content-Type": "application/json"
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            with span("realtime", event=event_type):
+                response = await _get_http_client().post(
                     url,
                     json={
                         "messages": [{
@@ -39,19 +69,29 @@ class EventService:
                             "payload": data or {}
                         }]
                     },
-                    headers=headers
+                    headers=headers,
+                    timeout=timeout,
                 )
 
-                if response.status_code in [200, 201, 204]:
-                    logger.info(f"Auth event sent: {event_type} for session {session_id}")
-                    return True
-                else:
-                    logger.error(f"Failed to send auth event: {event_type}, status: {response.status_code}")
-                    return False
+            if response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if 200 <= response.status_code < 300:
+                logger.info("Auth event sent: %s for session %s", event_type, session_id)
+                return True
+            else:
+                logger.error("Failed to send auth event: %s, status: %s", event_type, response.status_code)
+                return False
 
         except Exception as e:
-            logger.error(f"Error sending auth event: {e}")
+            breaker.record_failure()
+            logger.error("Error sending auth event: %s", e)
             return False
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
 
     async def send_bot_started_event(self, session_id: str, telegram_id: int) -> bool:
         return await self.send_auth_event(
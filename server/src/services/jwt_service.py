@@ -1,3 +1,7 @@
+import base64
+import hashlib
+import hmac
+import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Optional
 import jwt
@@ -10,6 +14,15 @@ from src.config.settings import (
     REFRESH_TOKEN_EXPIRE_DAYS
 )
 
+# Подпись deep link усечена: payload /start ограничен 64 символами [A-Za-z0-9_-]
+START_TOKEN_MAC_BYTES = 12
+
+
+def _start_token_mac(session_bytes: bytes) -> bytes:
+    # Отдельный ключ, чтобы подпись deep link нельзя было использовать в другом контексте
+    key = hmac.new(settings.jwt_secret_key.encode(), b"telegram-start-link", hashlib.sha256).digest()
+    return hmac.new(key, session_bytes, hashlib.sha256).digest()[:START_TOKEN_MAC_BYTES]
+
 
 class JWTService:
     @staticmethod
@@ -104,3 +117,26 @@ class JWTService:
     def get_user_id_from_token(token: str) -> Optional[str]:
         payload = JWTService.verify_token(token)
         return payload.get("sub") if payload else None
+
+    @staticmethod
+    def create_start_token(session_id: str) -> str:
+        """Payload для t.me/<bot>?start=...: id сессии + HMAC, base64url (38 символов)."""
+        session_bytes = uuid.UUID(session_id).bytes
+        raw = session_bytes + _start_token_mac(session_bytes)
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    @staticmethod
+    def verify_start_token(token: str) -> Optional[str]:
+        """Возвращает id сессии из подписанного payload или None."""
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            return None
+
+        if len(raw) != 16 + START_TOKEN_MAC_BYTES:
+            return None
+
+        session_bytes, mac = raw[:16], raw[16:]
+        if not hmac.compare_digest(mac, _start_token_mac(session_bytes)):
+            return None
+        return str(uuid.UUID(bytes=session_bytes))
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Optional
+
+from src.utils.ranking import RankEntry, RankIndex
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Размер страницы при построении индекса (не больше max-rows PostgREST)
+SNAPSHOT_PAGE_SIZE = 1000
+# Полная перестройка подтягивает выполнения, прошедшие через другие инстансы
+LEADERBOARD_REBUILD_SECONDS = 600
+
+
+class _LeaderboardState:
+    def __init__(self):
+        self.index = RankIndex()
+        self.ready = False
+        self.lock = threading.Lock()
+        # Игроки, выполнившие квест, пока индекс перестраивался
+        self.touched_during_build: Optional[set[str]] = None
+
+
+_state = _LeaderboardState()
+
+
+def _timestamp(value: Optional[str]) -> float:
+    if not value:
+        return datetime.now(timezone.utc).timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+class LeaderboardService:
+    def __init__(self, supabase: "Client"):
+        self.supabase = supabase
+
+    @property
+    def is_ready(self) -> bool:
+        return _state.ready
+
+    def build(self) -> None:
+        with _state.lock:
+            _state.touched_during_build = set()
+
+        entries: list[RankEntry] = []
+        after: Optional[str] = None
+        try:
+            while True:
+                # Keyset-пагинация по user_id внутри leaderboard_snapshot
+                result = self.supabase.rpc(
+                    "leaderboard_snapshot",
+                    {"p_after": after, "p_limit": SNAPSHOT_PAGE_SIZE},
+                ).execute()
+                rows = result.data or []
+
+                for row in rows:
+                    entries.append(RankEntry(
+                        row["user_id"],
+                        row["quest_count"],
+                        _timestamp(row["last_completed_at"]),
+                    ))
+
+                if len(rows) < SNAPSHOT_PAGE_SIZE:
+                    break
+                after = rows[-1]["user_id"]
+
+            _state.index.load(entries)
+        finally:
+            with _state.lock:
+                touched, _state.touched_during_build = _state.touched_during_build, None
+
+        # Снимок мог не увидеть выполнения, пришедшие во время построения
+        for user_id in touched or ():
+            self._reload_user(user_id)
+
+        _state.ready = True
+        logger.info("Leaderboard built: %d players", len(entries))
+
+    def _reload_user(self, user_id: str) -> None:
+        result = (
+            self.supabase.table("user_quest_completions")
+            .select("completed_at")
+            .eq("user_id", user_id)
+            .execute()
+        )
+        if result.data:
+            last = max(_timestamp(row["completed_at"]) for row in result.data)
+            _state.index.set(user_id, len(result.data), last)
+
+    def record_completion(self, user_id: str, completed_at: Optional[str]) -> None:
+        with _state.lock:
+            if _state.touched_during_build is not None:
+                _state.touched_during_build.add(user_id)
+        _state.index.increment(user_id, _timestamp(completed_at))
+
+    def get_leaderboard(self, user_id: str, limit: int) -> dict:
+        top = _state.index.top(limit)
+
+        usernames = {}
+        if top:
+            result = (
+                self.supabase.table("users")
+                .select("id, telegram_username")
+                .in_("id", [entry.user_id for entry in top])
+                .execute()
+            )
+            usernames = {row["id"]: row["telegram_username"] for row in result.data}
+
+        me = _state.index.get(user_id)
+
+        return {
+            "total_players": len(_state.index),
+            "top": [
+                {
+                    "rank": position,
+                    "telegram_username": usernames.get(entry.user_id),
+                    "completed_count": entry.completed_count,
+                    "last_completed_at": datetime.fromtimestamp(entry.last_completed_at, timezone.utc),
+                    "is_me": entry.user_id == user_id,
+                }
+                for position, entry in enumerate(top, start=1)
+            ],
+            "me": {
+                "rank": _state.index.rank(user_id),
+                "completed_count": me.completed_count,
+                "last_completed_at": datetime.fromtimestamp(me.last_completed_at, timezone.utc),
+            } if me else None,
+        }
+
+
+async def run_leaderboard_builder(supabase: "Client") -> None:
+    """Строит индекс при старте и периодически перестраивает его целиком."""
+    service = LeaderboardService(supabase)
+    while True:
+        try:
+            await asyncio.to_thread(service.build)
+        except Exception as e:
+            logger.error("Error building leaderboard: %s", e)
+        # Пока индекс не построен ни разу, повторяем чаще
+        await asyncio.sleep(LEADERBOARD_REBUILD_SECONDS if service.is_ready else 30)
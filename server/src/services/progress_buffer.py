@@ -0,0 +1,199 @@
+"""
+Write-behind буфер выполнений квестов с локальным write-ahead log.
+
+complete_quest подтверждается, как только запись дописана в WAL и сделан
+fsync; в БД выполнения уходят пачками раз в flush_interval. После падения
+процесса неотправленные записи восстанавливаются из WAL (replay).
+
+Формат WAL - одна JSON-строка на выполнение. Недописанная последняя строка
+(падение посреди write) при replay отбрасывается: такая запись не была
+подтверждена клиенту. После успешной отправки пачки WAL атомарно
+переписывается без отправленных записей (checkpoint).
+
+WAL блокируется flock: один файл - один процесс. Второй процесс с тем же
+путем получит BlockingIOError и должен работать без write-behind.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Callable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Completion(NamedTuple):
+    user_id: str
+    quest_id: str
+    completed_at: str
+
+
+FlushFn = Callable[[list[Completion]], None]
+
+
+def _open_locked(path: Path) -> BinaryIO:
+    wal = open(path, "ab")
+    try:
+        fcntl.flock(wal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BaseException:
+        # WAL занят другим процессом: не оставляем открытый дескриптор
+        wal.close()
+        raise
+    return wal
+
+
+class ProgressWriteBuffer:
+    def __init__(
+        self,
+        wal_path: Path,
+        flush_fn: FlushFn,
+        flush_interval: float = 0.3,
+        max_batch: int = 500,
+    ):
+        self.wal_path = Path(wal_path)
+        self.flush_fn = flush_fn
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: list[Completion] = []
+        # user_id -> quest_id -> Completion: неотправленные выполнения по игрокам
+        self._by_user: dict[str, dict[str, Completion]] = {}
+
+        self._flushed_total = 0
+        self._flush_errors = 0
+
+        self.wal_path.parent.mkdir(parents=True, exist_ok=True)
+        self._wal = _open_locked(self.wal_path)
+
+    def append(self, user_id: str, quest_id: str) -> bool:
+        """
+        Подтверждает выполнение после fsync в WAL.
+        Возвращает False, если это выполнение уже ждет отправки.
+        """
+        with self._lock:
+            if quest_id in self._by_user.get(user_id, ()):
+                return False
+
+            completion = Completion(user_id, quest_id, datetime.now(timezone.utc).isoformat())
+            self._write(completion)
+            self._add(completion)
+            return True
+
+    def pending_quests(self, user_id: str) -> list[str]:
+        with self._lock:
+            return list(self._by_user.get(user_id, ()))
+
+    def replay(self) -> int:
+        """Загружает в память все записи WAL, не отправленные до падения."""
+        restored = 0
+        with self._lock:
+            for completion in self._read_wal():
+                if completion.quest_id not in self._by_user.get(completion.user_id, ()):
+                    self._add(completion)
+                    restored += 1
+            # Переписываем WAL начисто: отбрасываем недописанный хвост и дубликаты
+            self._checkpoint()
+
+        if restored:
+            logger.info("Restored %d quest completions from %s", restored, self.wal_path)
+        return restored
+
+    def flush(self) -> int:
+        """Отправляет в БД накопленные выполнения. Возвращает число отправленных."""
+        with self._flush_lock:
+            flushed = 0
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.max_batch]
+                if not batch:
+                    return flushed
+
+                try:
+                    self.flush_fn(batch)
+                except Exception as e:
+                    self._flush_errors += 1
+                    logger.error("Error flushing %d quest completions: %s", len(batch), e)
+                    return flushed
+
+                with self._lock:
+                    del self._pending[:len(batch)]
+                    for completion in batch:
+                        quests = self._by_user.get(completion.user_id)
+                        if quests is not None:
+                            quests.pop(completion.quest_id, None)
+                            if not quests:
+                                del self._by_user[completion.user_id]
+                    self._checkpoint()
+
+                flushed += len(batch)
+                self._flushed_total += len(batch)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.to_thread(self.flush)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._wal.close()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "flushed": self._flushed_total,
+            "flush_errors": self._flush_errors,
+        }
+
+    def _add(self, completion: Completion) -> None:
+        self._pending.append(completion)
+        self._by_user.setdefault(completion.user_id, {})[completion.quest_id] = completion
+
+    def _write(self, completion: Completion) -> None:
+        line = json.dumps(completion._asdict(), separators=(",", ":")) + "\n"
+        self._wal.write(line.encode("utf-8"))
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+
+    def _read_wal(self) -> list[Completion]:
+        completions = []
+        with open(self.wal_path, "rb") as wal:
+            for line in wal:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    completions.append(Completion(**json.loads(line)))
+                except (ValueError, TypeError):
+                    logger.warning("Skipping corrupted WAL record in %s", self.wal_path)
+        return completions
+
+    def _checkpoint(self) -> None:
+        # Новый WAL пишется во временный файл и атомарно подменяет старый
+        tmp_path = self.wal_path.with_suffix(self.wal_path.suffix + ".tmp")
+        with open(tmp_path, "wb") as tmp:
+            for completion in self._pending:
+                tmp.write((json.dumps(completion._asdict(), separators=(",", ":")) + "\n").encode("utf-8"))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+
+        wal = _open_locked(tmp_path)
+        os.replace(tmp_path, self.wal_path)
+        self._fsync_dir()
+
+        self._wal.close()
+        self._wal = wal
+
+    def _fsync_dir(self) -> None:
+        fd = os.open(self.wal_path.parent, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,41 +1,151 @@
 import logging
-from typing import Optional
-from supabase import Client
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from src.config import settings
+from src.config.quest_catalog import get_quest_catalog
+from src.database import get_read_client, mark_written
+from src.services.progress_buffer import Completion, ProgressWriteBuffer
+from src.services.stats_service import StatsService
+from src.services.leaderboard_service import LeaderboardService
+from src.utils.resilience import DependencyUnavailable
+from src.utils.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
+_progress_flight = SingleFlight("progress")
+
 
 class ProgressService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: "Client"):
         self.supabase = supabase
+        self.stats_service = StatsService(supabase)
+        self.leaderboard_service = LeaderboardService(supabase)
 
     def get_progress(self, user_id: str) -> Optional[list[str]]:
+        return get_quest_catalog().ids_of(self.get_progress_mask(user_id))
+
+    def get_progress_mask(self, user_id: str) -> int:
+        """Прогресс как битовая маска по каталогу квестов."""
+        mask = _progress_flight.do(user_id, self._fetch_progress_mask, user_id)
+
+        # Выполнения, подтвержденные, но еще не отправленные в БД
+        if _write_buffer is not None:
+            mask |= get_quest_catalog().mask_of(_write_buffer.pending_quests(user_id))
+        return mask
+
+    def _fetch_progress_mask(self, user_id: str) -> int:
         try:
-            result = self.supabase.table("users").select("completed_quests").eq("id", user_id).single().execute()
+            result = (
+                get_read_client(user_id).table("user_quest_completions")
+                .select("quest_id")
+                .eq("user_id", user_id)
+                .execute()
+            )
 
-            if result.data:
-                return result.data.get("completed_quests", [])
-            return []
+            return get_quest_catalog().mask_of(row["quest_id"] for row in result.data)
+        except DependencyUnavailable:
+            # Supabase недоступен - 503, а не пустой прогресс с 200
+            raise
         except Exception as e:
-            logger.error(f"Error getting progress for user {user_id}: {e}")
-            return []
+            logger.error("Error getting progress for user %s: %s", user_id, e)
+            return 0
 
     def complete_quest(self, user_id: str, quest_id: str) -> bool:
-        try:
-            current_progress = self.get_progress(user_id)
+        if not get_quest_catalog().is_known(quest_id):
+            logger.warning("Unknown quest %s from user %s", quest_id, user_id)
+            return False
 
-            if quest_id in current_progress:
-                logger.info(f"Quest {quest_id} already completed for user {user_id}")
+        if _write_buffer is not None:
+            try:
+                # Подтверждаем после fsync в WAL, в БД уйдет пачкой
+                if _write_buffer.append(user_id, quest_id):
+                    logger.info("Quest %s queued for user %s", quest_id, user_id)
                 return True
+            except Exception as e:
+                logger.error("Error queueing quest %s for user %s: %s", quest_id, user_id, e)
+                return False
 
-            updated_quests = current_progress + [quest_id]
+        try:
+            inserted = self._insert_completions([{"user_id": user_id, "quest_id": quest_id}])
 
-            self.supabase.table("users").update({
-                "completed_quests": updated_quests
-            }).eq("id", user_id).execute()
+            if not inserted:
+                logger.info("Quest %s already completed for user %s", quest_id, user_id)
+                return True
 
-            logger.info(f"Quest {quest_id} completed for user {user_id}")
+            logger.info("Quest %s completed for user %s", quest_id, user_id)
             return True
+        except DependencyUnavailable:
+            raise
         except Exception as e:
-            logger.error(f"Error completing quest {quest_id} for user {user_id}: {e}")
+            logger.error("Error completing quest %s for user %s: %s", quest_id, user_id, e)
             return False
+
+    def flush_completions(self, batch: list[Completion]) -> None:
+        """Пишет пачку из write-behind буфера одним запросом."""
+        self._insert_completions([
+            {"user_id": completion.user_id, "quest_id": completion.quest_id, "completed_at": completion.completed_at}
+            for completion in batch
+        ])
+
+    def _insert_completions(self, rows: list[dict]) -> list[dict]:
+        # INSERT ... ON CONFLICT DO NOTHING: повторное выполнение квеста ничего не меняет,
+        # в ответе только реально вставленные строки
+        result = (
+            self.supabase.table("user_quest_completions")
+            .upsert(rows, on_conflict="user_id,quest_id", ignore_duplicates=True)
+            .execute()
+        )
+
+        for user_id in {row["user_id"] for row in rows}:
+            _progress_flight.forget(user_id)
+            mark_written(user_id)
+
+        per_quest = Counter(row["quest_id"] for row in result.data)
+        for quest_id, count in per_quest.items():
+            self.stats_service.record_quest_completed(quest_id, count)
+        for row in result.data:
+            self.leaderboard_service.record_completion(row["user_id"], row.get("completed_at"))
+
+        return result.data
+
+
+_write_buffer: Optional[ProgressWriteBuffer] = None
+
+
+def start_write_behind(supabase: "Client") -> Optional[ProgressWriteBuffer]:
+    """Включает write-behind режим: replay WAL после падения и пачечная отправка."""
+    global _write_buffer
+
+    service = ProgressService(supabase)
+    try:
+        buffer = ProgressWriteBuffer(
+            Path(settings.progress_wal_path),
+            service.flush_completions,
+            flush_interval=settings.progress_flush_interval_ms / 1000,
+            max_batch=settings.progress_flush_batch_size,
+        )
+    except BlockingIOError:
+        logger.warning("%s is used by another process, write-behind disabled", settings.progress_wal_path)
+        return None
+
+    buffer.replay()
+    buffer.flush()
+
+    _write_buffer = buffer
+    return buffer
+
+
+def stop_write_behind() -> None:
+    global _write_buffer
+    if _write_buffer is not None:
+        buffer, _write_buffer = _write_buffer, None
+        buffer.close()
+
+
+def get_write_buffer() -> Optional[ProgressWriteBuffer]:
+    return _write_buffer
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Партиции создаются на несколько дней вперед, поэтому часа с запасом хватает
+SESSION_RETENTION_INTERVAL_SECONDS = 3600
+PARTITION_PREMAKE_DAYS = 3
+
+
+class SessionRetentionService:
+    """Обслуживание суточных партиций auth_sessions (maintain_auth_session_partitions)."""
+
+    def __init__(self, supabase: "Client"):
+        self.supabase = supabase
+
+    def maintain(self) -> list[dict]:
+        result = self.supabase.rpc(
+            "maintain_auth_session_partitions",
+            {
+                "p_retention_days": settings.auth_session_retention_days,
+                "p_premake_days": PARTITION_PREMAKE_DAYS,
+                "p_archive": settings.auth_session_archive,
+            },
+        ).execute()
+
+        changes = result.data or []
+        for change in changes:
+            if change["action"] == "failed":
+                # Подробности - в WARNING Postgres; следующий запуск попробует снова
+                logger.error("auth_sessions partition maintenance failed for %s", change["partition_name"])
+            else:
+                logger.info("auth_sessions partition %s: %s", change["action"], change["partition_name"])
+        return changes
+
+
+async def run_session_retention(supabase: "Client") -> None:
+    service = SessionRetentionService(supabase)
+    while True:
+        try:
+            await asyncio.to_thread(service.maintain)
+        except Exception as e:
+            logger.error("Error maintaining auth_sessions partitions: %s", e)
+        await asyncio.sleep(SESSION_RETENTION_INTERVAL_SECONDS)
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Как часто перечитывать stats_counters, чтобы подтянуть счетчики других инстансов
+STATS_REFRESH_SECONDS = 30
+# Как часто отправлять накопленные инкременты в stats_counters
+STATS_FLUSH_SECONDS = 5
+
+QUESTS_SCOPE = "quests"
+AUTH_SESSIONS_SCOPE = "auth_sessions"
+
+
+class _StatsRollup:
+    """
+    In-memory копия stats_counters: локальные инкременты + периодическая синхронизация.
+
+    Инкременты копятся в pending и уходят в БД пачкой раз в STATS_FLUSH_SECONDS
+    (run_stats_flusher): /init и approve не ждут RPC на горячей строке счетчика.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: defaultdict[str, defaultdict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.pending: defaultdict[tuple[str, str], int] = defaultdict(int)
+        self.loaded_at = 0.0
+
+    def add(self, scope: str, key: str, delta: int) -> None:
+        with self.lock:
+            self.counters[scope][key] += delta
+            self.pending[(scope, key)] += delta
+
+    def take_pending(self) -> dict[tuple[str, str], int]:
+        with self.lock:
+            pending, self.pending = dict(self.pending), defaultdict(int)
+        return pending
+
+    def restore_pending(self, pending: dict[tuple[str, str], int]) -> None:
+        with self.lock:
+            for counter, delta in pending.items():
+                self.pending[counter] += delta
+
+    def replace(self, rows: list[dict]) -> None:
+        counters: defaultdict[str, defaultdict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for row in rows:
+            counters[row["scope"]][row["key"]] = row["value"]
+        with self.lock:
+            # Еще не отправленные инкременты в БД не видны - добавляем их сверху
+            for (scope, key), delta in self.pending.items():
+                counters[scope][key] += delta
+            self.counters = counters
+            self.loaded_at = time.monotonic()
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self.lock:
+            return {scope: dict(values) for scope, values in self.counters.items()}
+
+
+_rollup = _StatsRollup()
+
+
+class StatsService:
+    def __init__(self, supabase: "Client"):
+        self.supabase = supabase
+
+    def record(self, scope: str, key: str, delta: int = 1) -> None:
+        # Без обращения к БД: инкремент уйдет со следующим flush()
+        _rollup.add(scope, key, delta)
+
+    def record_quest_completed(self, quest_id: str, count: int = 1) -> None:
+        self.record(QUESTS_SCOPE, quest_id, count)
+
+    def record_auth_transition(self, status: str, count: int = 1) -> None:
+        if count > 0:
+            self.record(AUTH_SESSIONS_SCOPE, status, count)
+
+    def get_stats(self) -> dict:
+        if time.monotonic() - _rollup.loaded_at > STATS_REFRESH_SECONDS:
+            self.refresh()
+
+        counters = _rollup.snapshot()
+        quests = counters.get(QUESTS_SCOPE, {})
+        auth_sessions = counters.get(AUTH_SESSIONS_SCOPE, {})
+
+        created = auth_sessions.get("created", 0)
+        approved = auth_sessions.get("approved", 0)
+
+        return {
+            "quests": quests,
+            "quest_completions_total": sum(quests.values()),
+            "auth_sessions": auth_sessions,
+            "auth_approval_rate": approved / created if created else 0.0,
+        }
+
+    def flush(self) -> int:
+        """Отправляет накопленные инкременты; неотправленные вернутся в следующий раз."""
+        pending = [(counter, delta) for counter, delta in _rollup.take_pending().items() if delta]
+        for index, ((scope, key), delta) in enumerate(pending):
+            try:
+                self.supabase.rpc(
+                    "increment_stats_counter",
+                    {"p_scope": scope, "p_key": key, "p_delta": delta},
+                ).execute()
+            except BaseException:
+                _rollup.restore_pending(dict(pending[index:]))
+                raise
+        return len(pending)
+
+    def refresh(self) -> None:
+        try:
+            # Таблица маленькая: строк столько, сколько квестов и статусов
+            result = self.supabase.table("stats_counters").select("scope, key, value").execute()
+            _rollup.replace(result.data)
+        except Exception as e:
+            logger.error("Error refreshing stats: %s", e)
+            # Не долбим БД на каждый запрос, пока она недоступна
+            _rollup.loaded_at = time.monotonic()
+
+
+async def run_stats_flusher(supabase: "Client") -> None:
+    service = StatsService(supabase)
+    try:
+        while True:
+            await asyncio.sleep(STATS_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(service.flush)
+            except Exception as e:
+                # Статистика не должна ломать авторизацию и прогресс
+                logger.error("Error flushing stats: %s", e)
+    finally:
+        # При остановке отправляем то, что накопилось с последнего flush
+        try:
+            await asyncio.shield(asyncio.to_thread(service.flush))
+        except Exception as e:
+            logger.error("Error flushing stats on shutdown: %s", e)
@@ -1,29 +1,49 @@
-from typing import Optional
+from typing import Any, Optional
 from datetime import datetime, timezone
 
-from src.database import get_supabase_client
-from src.models import User, UserCreate
+from src.config import settings
+from src.database import get_read_client, get_supabase_client, mark_written
+from src.models import AuthSessionRecord, UserCreate, UserRecord
+from src.utils.single_flight import SingleFlight
+
+# Общий на процесс: UserService создается на каждый запрос
+_user_flight = SingleFlight("users")
+
+USER_COLUMNS = "id, phone_number, telegram_id, telegram_username, bot_index, created_at, updated_at"
+
+
+def _forget_user(user: UserRecord) -> None:
+    # После записи чтения, начатые до нее, не должны отдаваться новым вызовам
+    _user_flight.forget(("id", user.id))
+    _user_flight.forget(("phone_number", user.phone_number))
+    if user.telegram_id is not None:
+        _user_flight.forget(("telegram_id", user.telegram_id))
+    # и какое-то время идут на primary: реплики могут еще не видеть запись
+    mark_written(user.id, user.phone_number, user.telegram_id)
 
 
 class UserService:
     def __init__(self):
         self.db = get_supabase_client()
 
-    def get_user_by_phone(self, phone_number: str) -> Optional[User]:
-        response = self.db.table("users").select("*").eq("phone_number", phone_number).execute()
+    def get_user_by_phone(self, phone_number: str) -> Optional[UserRecord]:
+        return _user_flight.do(("phone_number", phone_number), self._select_user, "phone_number", phone_number)
 
-        if response.data:
-            return User(**response.data[0])
-        return None
+    def get_user_by_id(self, user_id: str) -> Optional[UserRecord]:
+        return _user_flight.do(("id", user_id), self._select_user, "id", user_id)
 
-    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
-        response = self.db.table("users").select("*").eq("telegram_id", telegram_id).execute()
+    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[UserRecord]:
+        return _user_flight.do(("telegram_id", telegram_id), self._select_user, "telegram_id", telegram_id)
+
+    def _select_user(self, column: str, value: Any, primary: bool = False) -> Optional[UserRecord]:
+        db = self.db if primary else get_read_client(value)
+        response = db.table("users").select(USER_COLUMNS).eq(column, value).execute()
 
         if response.data:
-            return User(**response.data[0])
+            return UserRecord.from_row(response.data[0])
         return None
 
-    def create_user(self, user_data: UserCreate) -> User:
+    def create_user(self, user_data: UserCreate) -> UserRecord:
         now = datetime.now(timezone.utc)
 
         data = {
@@ -36,14 +56,16 @@ class UserService:
 
         response = self.db.table("users").insert(data).execute()
 
-        return User(**response.data[0])
+        user = UserRecord.from_row(response.data[0])
+        _forget_user(user)
+        return user
 
     def update_user_telegram_info(
         self,
         phone_number: str,
         telegram_id: int,
         telegram_username: Optional[str] = None,
-    ) -> Optional[User]:
+    ) -> Optional[UserRecord]:
         update_data = {
             "telegram_id": telegram_id,
             "updated_at": datetime.now(timezone.utc).isoformat(),
@@ -60,11 +82,45 @@ class UserService:
         )
 
         if response.data:
-            return User(**response.data[0])
+            user = UserRecord.from_row(response.data[0])
+            _forget_user(user)
+            return user
         return None
 
-    def get_or_create_user(self, phone_number: str) -> User:
+    def link_telegram_contact(
+        self,
+        phone_number: str,
+        telegram_id: int,
+        telegram_username: Optional[str] = None,
+        bot_index: int = 0,
+    ) -> tuple[UserRecord, Optional[AuthSessionRecord]]:
+        """
+        Создает или обновляет пользователя с telegram_id и возвращает его
+        действующую pending сессию - один вызов вместо поиска сессии,
+        get_or_create_user и update_user_telegram_info. bot_index - бот, через
+        который пришел контакт: закрепляется за пользователем при первой привязке.
+        """
+        response = self.db.rpc(
+            "link_telegram_contact",
+            {
+                "p_phone_number": phone_number,
+                "p_telegram_id": telegram_id,
+                "p_telegram_username": telegram_username,
+                "p_bot_index": bot_index,
+            },
+        ).execute()
+
+        user = UserRecord.from_row(response.data["user"])
+        _forget_user(user)
+
+        session_row = response.data["session"]
+        return user, AuthSessionRecord.from_row(session_row) if session_row else None
+
+    def get_or_create_user(self, phone_number: str) -> UserRecord:
         user = self.get_user_by_phone(phone_number)
+        if not user and settings.supabase_replica_urls:
+            # Отсутствие на реплике может быть отставанием - перед вставкой проверяем primary
+            user = self._select_user("phone_number", phone_number, primary=True)
 
         if not user:
             user_data = UserCreate(phone_number=phone_number)
@@ -1,5 +1,8 @@
 from .phone import to_e164
+from .rate_limit import RateLimiter, get_rate_limiter
 
 __all__ = [
-    "to_e164"
+    "to_e164",
+    "RateLimiter",
+    "get_rate_limiter",
 ]
\ No newline at end of file
@@ -0,0 +1,47 @@
+"""
+Несколько ботов: индекс 0 - TELEGRAM_BOT_TOKEN, дальше TELEGRAM_EXTRA_BOT_TOKENS.
+
+Писать пользователю может только бот, которого он запустил, поэтому за
+пользователем закрепляется бот, через который он связал номер
+(users.bot_index), и уведомления идут через него. Новым пользователям
+ссылка на бота выбирается по хешу номера - входы распределяются между
+ботами равномерно, и повторный /init ведет в тот же бот.
+"""
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from src.config import settings
+
+if TYPE_CHECKING:
+    from src.models import UserRecord
+
+logger = logging.getLogger(__name__)
+
+
+def bot_tokens() -> list[str]:
+    return [settings.telegram_bot_token, *settings.telegram_extra_bot_tokens]
+
+
+def bot_index_of(user: "UserRecord") -> int:
+    """Бот для отправки пользователю; до миграции и для удаленного токена - первый."""
+    index = user.bot_index or 0
+    if index >= len(bot_tokens()):
+        logger.warning("Bot %d of user %s is not configured, using bot 0", index, user.id)
+        return 0
+    return index
+
+
+def bot_index_for_link(user: Optional["UserRecord"], phone_number: str) -> int:
+    if user is not None and user.bot_index is not None:
+        return bot_index_of(user)
+    digest = hashlib.sha256(phone_number.encode()).digest()
+    return int.from_bytes(digest[:4], "big") % len(bot_tokens())
+
+
+def bot_username(index: int) -> Optional[str]:
+    if index == 0:
+        return settings.telegram_bot_username or None
+    usernames = settings.telegram_extra_bot_usernames
+    # Без username дополнительного бота ссылка ведет в первый
+    return usernames[index - 1] if index - 1 < len(usernames) else settings.telegram_bot_username or None
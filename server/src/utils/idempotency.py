@@ -0,0 +1,189 @@
+"""
+Идемпотентность операций записи.
+
+Повтор операции с тем же ключом не выполняет ее снова: пока первая попытка
+в полете, повторы ждут ее и получают тот же результат; после завершения
+результат хранится ttl секунд и отдается из хранилища без обращения к БД.
+Ошибки не запоминаются - следующий повтор выполняет операцию заново.
+
+Результаты должны сериализоваться в JSON. По умолчанию хранилище в процессе
+(LRU на max_keys ключей); с IDEMPOTENCY_REDIS_URL готовые результаты общие
+для всех инстансов (нужен пакет redis). Ожидание операции в полете -
+только в пределах процесса.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже использован для операции с другими параметрами."""
+
+
+class IdempotencyBackend(Protocol):
+    # Вызовы блокирующие (сеть) - выполнять в потоке
+    blocking: bool
+
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        ...
+
+
+class MemoryIdempotencyBackend:
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisIdempotencyBackend:
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "idem:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self.prefix + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000))
+
+
+class IdempotencyStore:
+    def __init__(self, backend: IdempotencyBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        self._executed = 0
+        self._replayed = 0
+        self._joined = 0
+        self._backend_errors = 0
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        fingerprint: str = "",
+    ) -> tuple[Any, bool]:
+        """
+        Выполняет fn один раз на ключ. Возвращает (результат, был ли это повтор).
+        fingerprint - параметры операции: тот же ключ с другими параметрами -> IdempotencyConflict.
+        """
+        stored = await self._get(key)
+        if stored is not None:
+            return self._replay(key, stored, fingerprint), True
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self._joined += 1
+            stored = await asyncio.shield(future)
+            return self._replay(key, stored, fingerprint), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await fn()
+            stored = json.dumps({"fingerprint": fingerprint, "result": result})
+            self._executed += 1
+            await self._set(key, stored)
+            future.set_result(stored)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим повторам
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    def _replay(self, key: str, stored: str, fingerprint: str) -> Any:
+        entry = json.loads(stored)
+        if entry["fingerprint"] != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key reused with different parameters: {key}")
+        self._replayed += 1
+        return entry["result"]
+
+    async def _get(self, key: str) -> Optional[str]:
+        try:
+            if self.backend.blocking:
+                return await asyncio.to_thread(self.backend.get, key)
+            return self.backend.get(key)
+        except Exception as e:
+            # Недоступное общее хранилище не должно блокировать запись: выполняем как новую
+            self._backend_errors += 1
+            logger.error("Idempotency backend error: %s", e)
+            return None
+
+    async def _set(self, key: str, value: str) -> None:
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.set, key, value, self.ttl)
+            else:
+                self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self._backend_errors += 1
+            logger.error("Idempotency backend error: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "executed": self._executed,
+            "replayed": self._replayed,
+            "joined_in_flight": self._joined,
+            "in_flight": len(self._in_flight),
+            "backend_errors": self._backend_errors,
+            "stored_keys": len(self.backend) if hasattr(self.backend, "__len__") else None,
+        }
+
+
+_idempotency_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _idempotency_store
+    if _idempotency_store is None:
+        from src.config import settings
+
+        if settings.idempotency_redis_url:
+            backend: IdempotencyBackend = RedisIdempotencyBackend(settings.idempotency_redis_url)
+        else:
+            backend = MemoryIdempotencyBackend(max_keys=settings.idempotency_max_keys)
+
+        _idempotency_store = IdempotencyStore(backend, ttl=settings.idempotency_ttl_seconds)
+    return _idempotency_store
@@ -0,0 +1,178 @@
+"""
+Неблокирующее логирование.
+
+Логгеры пишут только в очередь (QueueHandler): форматирование и запись в
+stderr выполняет фоновый поток QueueListener, поэтому медленный sink не
+добавляет задержку запросам. Очередь ограничена - при переполнении записи
+отбрасываются и считаются, event loop не ждет.
+
+В вызывающем потоке остается только дешевая работа:
+  - сэмплирование INFO/DEBUG по логгерам (LOG_SAMPLE_RATES);
+  - привязка request_id / session_id из contextvars.
+
+Сообщение собирается из msg % args уже в фоновом потоке, поэтому в горячих
+путях логировать в %-стиле: logger.info("Session %s approved", session_id).
+"""
+import logging
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from src.utils.tracing import bind_trace_session
+from src.utils.traffic_capture import capture_session
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Шумные библиотеки
+QUIET_LOGGERS = ("telegram", "telegram.ext", "httpx", "httpcore")
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def bind_session_id(session_id: Optional[str]) -> None:
+    """Привязывает session_id к логам и trace текущего запроса / обработчика бота."""
+    session_id_var.set(session_id)
+    bind_trace_session(session_id)
+    capture_session(session_id)
+
+
+class CorrelationFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate INFO/DEBUG записей логгера (и его потомков); WARNING и выше - всегда."""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        import orjson
+
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        session_id = getattr(record, "session_id", None)
+        if session_id:
+            entry["session_id"] = session_id
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry).decode("utf-8")
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Базовый prepare форматирует сообщение в вызывающем потоке - откладываем до listener'а
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[_NonBlockingQueueHandler] = None
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    sample_rates: Optional[dict[str, float]] = None,
+    queue_size: int = 10_000,
+    stream=None,
+) -> None:
+    global _listener, _queue_handler
+    stop_logging()
+
+    sink = logging.StreamHandler(stream or sys.stderr)
+    sink.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = _NonBlockingQueueHandler(log_queue)
+    # Сначала сэмплирование: отброшенным записям correlation id не нужен
+    if sample_rates:
+        _queue_handler.addFilter(SamplingFilter(sample_rates))
+    _queue_handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    # Access log uvicorn тоже пишется синхронно - переводим его на общую очередь и формат
+    for name in UVICORN_LOGGERS:
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, sink, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            # Очередь забита - поток-daemon дописывает ее сам
+            pass
+        _listener = None
+
+
+def logging_stats() -> dict:
+    if _queue_handler is None:
+        return {}
+    return {
+        "queued": _queue_handler.queue.qsize(),
+        "dropped": _queue_handler.dropped,
+    }
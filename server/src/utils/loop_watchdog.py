@@ -0,0 +1,154 @@
+"""
+Watchdog задержки event loop.
+
+Heartbeat-корутина засыпает на interval и меряет, насколько позже она
+проснулась - это задержка loop, она копится в гистограмму для /metrics.
+
+Отдельный поток следит за временем последнего heartbeat. Если loop не
+отвечает дольше threshold, поток снимает стек потока loop в этот момент -
+это и есть блокирующий вызов (синхронный supabase-py, JWT, phonenumbers) - и
+пишет его в лог. Один и тот же стек логируется не чаще раза в log_interval
+секунд, поэтому в логах появляется каждое место блокировки, а не тысяча
+копий самого частого.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержки, секунды
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MAX_TRACKED_STACKS = 1000
+
+
+def _format_loop_stack(frame) -> str:
+    entries = traceback.extract_stack(frame)
+    # Кадры asyncio до обработчика (run_forever, _run_once, Handle._run) одинаковы у всех стеков
+    start = 0
+    for i, entry in enumerate(entries):
+        if f"{os.sep}asyncio{os.sep}" in entry.filename:
+            start = i + 1
+    return "".join(traceback.format_list(entries[start:] or entries))
+
+
+class LagHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LAG_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def to_dict(self) -> dict:
+        # Накопительные корзины, как в Prometheus: le -> число наблюдений <= le
+        cumulative = {}
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            cumulative[f"{bound * 1000:g}ms"] = running
+        cumulative["+Inf"] = self.total
+        return {
+            "count": self.total,
+            "sum_ms": round(self.sum * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": cumulative,
+        }
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float, threshold: float, log_interval: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.log_interval = log_interval
+        self.histogram = LagHistogram()
+
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._reported_beat = 0.0
+        self._stack_logged_at: dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.stalls = 0
+        self.stacks_logged = 0
+        self.stacks_suppressed = 0
+
+    async def run(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self.histogram.observe(max(0.0, now - started - self.interval))
+                self._last_beat = now
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        # Проверяем чаще порога, чтобы застать loop еще внутри блокирующего вызова
+        while not self._stop.wait(min(self.threshold, self.interval) / 2):
+            last_beat = self._last_beat
+            blocked = time.monotonic() - last_beat - self.interval
+            if blocked < self.threshold or last_beat == self._reported_beat:
+                continue
+
+            # Одна остановка loop - один отчет
+            self._reported_beat = last_beat
+            self.stalls += 1
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._log_stack(_format_loop_stack(frame), blocked)
+
+    def _log_stack(self, stack: str, blocked: float) -> None:
+        now = time.monotonic()
+        logged_at = self._stack_logged_at.get(stack)
+        if logged_at is not None and now - logged_at < self.log_interval:
+            self.stacks_suppressed += 1
+            return
+
+        if len(self._stack_logged_at) >= MAX_TRACKED_STACKS:
+            self._stack_logged_at.clear()
+        self._stack_logged_at[stack] = now
+        self.stacks_logged += 1
+        logger.warning("Event loop blocked for %.0f ms at:\n%s", blocked * 1000, stack)
+
+    def stats(self) -> dict:
+        return {
+            **self.histogram.to_dict(),
+            "stalls": self.stalls,
+            "stacks_logged": self.stacks_logged,
+            "stacks_suppressed": self.stacks_suppressed,
+        }
+
+
+_watchdog: Optional[LoopWatchdog] = None
+
+
+def start_loop_watchdog(interval: float, threshold: float, log_interval: float) -> asyncio.Task:
+    global _watchdog
+    _watchdog = LoopWatchdog(interval, threshold, log_interval)
+    return asyncio.create_task(_watchdog.run())
+
+
+def loop_watchdog_stats() -> Optional[dict]:
+    return _watchdog.stats() if _watchdog is not None else None
@@ -1,7 +1,6 @@
-import phonenumbers
-
-
 def to_e164(raw: str) -> str:
+    import phonenumbers
+
     parsed = phonenumbers.parse(raw, "RU")
     e164 = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
     return e164
\ No newline at end of file
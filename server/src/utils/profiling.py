@@ -0,0 +1,149 @@
+"""
+Профилирование работающего процесса по запросу.
+
+CPU: фоновый поток раз в interval секунд снимает стеки всех потоков
+(sys._current_frames) и считает одинаковые стеки. Результат - collapsed
+stacks ("поток;кадр;кадр N"), их понимают flamegraph.pl, speedscope и
+inferno. Для event loop видна цепочка корутины, которая сейчас занимает
+поток: ожидающие корутины стеков не имеют, поэтому профиль показывает
+именно блокирующий код (JWT, pydantic, phonenumbers, синхронные вызовы БД).
+
+Память: tracemalloc включается только на время исследования; каждый снимок
+сравнивается с предыдущим - рост по строкам кода показывает утечки вроде
+клиента httpx на каждый вызов.
+
+Пока профилирование выключено, ни поток, ни tracemalloc не работают.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+
+class ProfilerBusy(Exception):
+    """Профилирование уже идет."""
+
+
+def _frame_label(code) -> str:
+    # Первая строка функции, а не текущая: стеки одной функции сливаются
+    path = code.co_filename.split(os.sep)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    def __init__(self, interval: float, skip_thread: Optional[int] = None):
+        self.interval = interval
+        self.skip_thread = skip_thread
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        skip = {threading.get_ident(), self.skip_thread}
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id in skip:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                labels.reverse()
+                self.stacks[";".join(labels)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+_cpu_lock = threading.Lock()
+
+
+def sample_cpu(duration: float, interval: float) -> StackSampler:
+    """Снимает стеки duration секунд (блокирует вызывающий поток)."""
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("CPU profiling is already running")
+    try:
+        # Сам вызывающий поток только ждет - в профиль его не включаем
+        sampler = StackSampler(interval, skip_thread=threading.get_ident())
+        sampler.start()
+        time.sleep(duration)
+        sampler.stop()
+        return sampler
+    finally:
+        _cpu_lock.release()
+
+
+class MemoryProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> None:
+        with self._lock:
+            if tracemalloc.is_tracing():
+                raise ProfilerBusy("tracemalloc is already running")
+            tracemalloc.start(frames)
+            self._baseline = self._take()
+
+    def stop(self) -> None:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = None
+
+    def snapshot_diff(self, limit: int, group_by: str = "lineno") -> dict:
+        """Разница с предыдущим снимком; новый снимок становится базой для следующего."""
+        with self._lock:
+            if not tracemalloc.is_tracing() or self._baseline is None:
+                raise RuntimeError("tracemalloc is not running")
+
+            snapshot = self._take()
+            diff = snapshot.compare_to(self._baseline, group_by)
+            self._baseline = snapshot
+            current, peak = tracemalloc.get_traced_memory()
+
+        return {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in diff[:limit]
+            ],
+        }
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        # Аллокации самого tracemalloc и импорт-машинерии не интересны
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+
+memory_profiler = MemoryProfiler()
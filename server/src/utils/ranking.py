@@ -0,0 +1,75 @@
+"""
+Order-statistic индекс для лидерборда.
+
+Игроки упорядочены по числу выполненных квестов (по убыванию), при равенстве -
+по времени последнего выполнения (кто раньше набрал, тот выше).
+Обновление и ранг игрока - O(log n), топ-N - O(log n + N).
+"""
+import threading
+from typing import NamedTuple, Optional
+
+from sortedcontainers import SortedList
+
+
+class RankEntry(NamedTuple):
+    user_id: str
+    completed_count: int
+    last_completed_at: float
+
+
+class RankIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Ключ сортировки: (-count, last_completed_at, user_id)
+        self._order: SortedList = SortedList()
+        self._keys: dict[str, tuple[int, float, str]] = {}
+
+    def set(self, user_id: str, completed_count: int, last_completed_at: float) -> None:
+        key = (-completed_count, last_completed_at, user_id)
+        with self._lock:
+            old = self._keys.get(user_id)
+            if old is not None:
+                self._order.remove(old)
+            self._order.add(key)
+            self._keys[user_id] = key
+
+    def increment(self, user_id: str, completed_at: float) -> None:
+        with self._lock:
+            old = self._keys.get(user_id)
+            count = 1
+            if old is not None:
+                self._order.remove(old)
+                count = -old[0] + 1
+            key = (-count, completed_at, user_id)
+            self._order.add(key)
+            self._keys[user_id] = key
+
+    def load(self, entries: list[RankEntry]) -> None:
+        """Полная замена содержимого (построение с нуля за O(n log n))."""
+        keys = {entry.user_id: (-entry.completed_count, entry.last_completed_at, entry.user_id) for entry in entries}
+        order = SortedList(keys.values())
+        with self._lock:
+            self._keys = keys
+            self._order = order
+
+    def rank(self, user_id: str) -> Optional[int]:
+        with self._lock:
+            key = self._keys.get(user_id)
+            if key is None:
+                return None
+            return self._order.index(key) + 1
+
+    def get(self, user_id: str) -> Optional[RankEntry]:
+        with self._lock:
+            key = self._keys.get(user_id)
+        if key is None:
+            return None
+        return RankEntry(user_id, -key[0], key[1])
+
+    def top(self, limit: int) -> list[RankEntry]:
+        with self._lock:
+            keys = list(self._order.islice(0, limit))
+        return [RankEntry(user_id, -neg_count, ts) for neg_count, ts, user_id in keys]
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -0,0 +1,150 @@
+"""
+Token bucket rate limiting с ограниченной памятью.
+
+По умолчанию состояние хранится в процессе (LRU на max_keys ключей).
+Если задан RATE_LIMIT_REDIS_URL, бакеты хранятся в Redis и общие для всех
+инстансов сервиса (нужен пакет redis).
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitBackend(Protocol):
+    def acquire(self, key: str, capacity: float, refill_rate: float) -> float:
+        """Забирает токен из бакета. Возвращает 0, если запрос разрешен, иначе секунды до нового токена."""
+        ...
+
+
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: float, refill_rate: float) -> float:
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0.0
+            else:
+                retry_after = (1 - tokens) / refill_rate
+
+            self._buckets[key] = (tokens, now)
+
+            # Вытесняем самые давно не использованные ключи
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return retry_after
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry)
+"""
+
+
+class RedisRateLimitBackend:
+    def __init__(self, url: str, prefix: str = "rl:"):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def acquire(self, key: str, capacity: float, refill_rate: float) -> float:
+        result = self._script(keys=[self.prefix + key], args=[capacity, refill_rate, time.time()])
+        return float(result)
+
+
+class RateLimiter:
+    def __init__(self, backend: RateLimitBackend, rules: dict[str, tuple[int, float]]):
+        """
+        rules: scope -> (limit, period_seconds), например {"phone": (5, 60)}.
+        """
+        self.backend = backend
+        self.rules = rules
+        self._allowed: defaultdict[str, int] = defaultdict(int)
+        self._rejected: defaultdict[str, int] = defaultdict(int)
+        self._backend_errors = 0
+
+    def check(self, scope: str, key: str) -> float:
+        """Возвращает 0, если запрос разрешен, иначе значение для Retry-After в секундах."""
+        rule = self.rules.get(scope)
+        if not rule or not key:
+            return 0.0
+
+        limit, period = rule
+        try:
+            retry_after = self.backend.acquire(f"{scope}:{key}", limit, limit / period)
+        except Exception as e:
+            # Недоступный общий backend не должен ронять авторизацию
+            self._backend_errors += 1
+            logger.error("Rate limit backend error: %s", e)
+            return 0.0
+
+        if retry_after > 0:
+            self._rejected[scope] += 1
+        else:
+            self._allowed[scope] += 1
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "allowed": dict(self._allowed),
+            "rejected": dict(self._rejected),
+            "backend_errors": self._backend_errors,
+            "tracked_keys": len(self.backend) if hasattr(self.backend, "__len__") else None,
+        }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        from src.config import settings
+
+        if settings.rate_limit_redis_url:
+            backend: RateLimitBackend = RedisRateLimitBackend(settings.rate_limit_redis_url)
+        else:
+            backend = MemoryRateLimitBackend(max_keys=settings.rate_limit_max_keys)
+
+        rules = {}
+        if settings.rate_limit_enabled:
+            rules = {
+                "ip": (settings.rate_limit_ip_per_minute, 60),
+                "phone": (settings.rate_limit_phone_per_minute, 60),
+                "telegram_id": (settings.rate_limit_telegram_per_minute, 60),
+            }
+
+        _rate_limiter = RateLimiter(backend, rules)
+    return _rate_limiter
@@ -0,0 +1,168 @@
+"""
+Дедлайны запросов и circuit breaker'ы для внешних зависимостей.
+
+Дедлайн запроса хранится в contextvar: его ставит middleware, а каждый
+исходящий вызов (Supabase, Realtime, Telegram) берет таймаут через
+timeout_for() - не больше собственного лимита и не больше остатка дедлайна.
+asyncio.to_thread копирует контекст, поэтому дедлайн виден и в потоках.
+
+Circuit breaker на зависимость: после failure_threshold ошибок подряд
+вызовы сразу отклоняются (CircuitOpenError) на reset_timeout секунд, затем
+пропускается один пробный вызов (half-open): успех закрывает breaker,
+ошибка снова открывает. Вызывающий код обязан записать результат при любом
+выходе; отмененный вызов результата не дает и отказом не считается -
+release_probe() только освобождает пробный вызов. Пробный вызов без
+результата дольше reset_timeout считается потерянным, и пропускается новый.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from src.config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DependencyUnavailable(Exception):
+    """Зависимость недоступна или время запроса вышло - отвечаем 503."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(DependencyUnavailable):
+    pass
+
+
+class DeadlineExceeded(DependencyUnavailable):
+    pass
+
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[None]:
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def timeout_for(limit: float) -> float:
+    """Таймаут исходящего вызова с учетом дедлайна текущего запроса."""
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(limit, left)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+        self._opened_total = 0
+        self._rejected_total = 0
+        _registry[name] = self
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == OPEN:
+                wait = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if wait > 0:
+                    self._rejected_total += 1
+                    raise CircuitOpenError(f"{self.name} is unavailable", retry_after=wait)
+                self._state = HALF_OPEN
+
+            if self._state == HALF_OPEN:
+                # Пока пробный вызов не завершился, остальные отклоняются
+                now = time.monotonic()
+                if self._probe_in_flight and now - self._probe_started < self.reset_timeout:
+                    self._rejected_total += 1
+                    raise CircuitOpenError(f"{self.name} is unavailable", retry_after=1.0)
+                self._probe_in_flight = True
+                self._probe_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._opened_total += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        Вызов прерван без результата (отмена задачи, остановка процесса).
+        Отказом не считается; если это был пробный вызов half-open, он не
+        должен остаться занятым - breaker снова открывается до следующей пробы.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probe_in_flight:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "opened": self._opened_total,
+                "rejected": self._rejected_total,
+            }
+
+
+_registry: dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        breaker = _registry.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, settings.breaker_failure_threshold, settings.breaker_reset_seconds)
+        return breaker
+
+
+def circuit_breaker_stats() -> dict[str, dict]:
+    return {name: breaker.stats() for name, breaker in list(_registry.items())}
@@ -0,0 +1,88 @@
+"""
+Single-flight: одновременные одинаковые запросы выполняются один раз.
+
+Первый вызывающий с ключом выполняет функцию, остальные, пришедшие пока
+запрос в полете, ждут и получают тот же результат (или то же исключение).
+Результат не кэшируется - после завершения следующий вызов снова идет в БД.
+
+Ожидание блокирующее, поэтому вызывать из потоков (asyncio.to_thread / threadpool).
+"""
+import threading
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._executed = 0
+        self._shared = 0
+        _registry[name] = self
+
+    def do(self, key: Hashable, fn: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self, key: Hashable) -> None:
+        """
+        Отвязывает ключ от запроса в полете: следующий вызов пойдет в БД,
+        а не присоединится к чтению, начатому до записи.
+        """
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "executed": self._executed,
+            "shared": self._shared,
+            "in_flight": in_flight,
+        }
+
+
+_registry: dict[str, SingleFlight] = {}
+
+
+def single_flight_stats() -> dict[str, dict[str, int]]:
+    return {name: flight.stats() for name, flight in _registry.items()}
@@ -0,0 +1,230 @@
+"""
+Трассировка входа: HTTP запросы и апдейты бота одной сессии - один trace.
+
+trace_id выводится из session_id (sha256), поэтому /api/auth/init,
+обработчики бота и /api/auth/tokens попадают в один trace без передачи
+заголовков между процессами. Решение о сэмплировании тоже детерминировано
+по trace_id: все участки одного входа либо пишутся, либо нет.
+
+Участок (hop) - HTTP запрос или апдейт бота, корневой span. Вложенные
+span'ы - вызовы PostgREST, Realtime и Telegram API. Сессия может стать
+известна посреди участка (init создает ее), поэтому span'ы копятся в
+участке и уходят в экспорт при его завершении, если к тому моменту
+привязан session_id (src.utils.log.bind_session_id) и trace попал в выборку.
+Вне участка и для участков не из выборки span() ничего не делает.
+
+Экспорт пачками в фоновом потоке: NDJSON в файл или POST на коллектор
+(TRACE_EXPORT=path | http(s)://...). Очередь ограничена - при переполнении
+span'ы отбрасываются. Отчет: python -m scripts.trace_report.
+"""
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SPACE = 10_000
+
+
+def trace_id_for(session_id: str) -> str:
+    return hashlib.sha256(session_id.encode()).hexdigest()[:32]
+
+
+class _Hop:
+    __slots__ = ("spans", "sample_rate", "session_id")
+
+    def __init__(self, sample_rate: float):
+        self.spans: list[dict[str, Any]] = []
+        self.sample_rate = sample_rate
+        self.session_id: Optional[str] = None
+
+    def trace_id(self) -> Optional[str]:
+        return trace_id_for(self.session_id) if self.session_id else None
+
+    def dropped(self) -> bool:
+        # Сессия уже привязана и trace не в выборке - дальше span'ы не собираем
+        trace_id = self.trace_id()
+        return trace_id is not None and not is_sampled(trace_id, self.sample_rate)
+
+
+_hop_var: ContextVar[Optional[_Hop]] = ContextVar("trace_hop", default=None)
+_span_var: ContextVar[Optional[str]] = ContextVar("trace_span", default=None)
+
+
+def is_sampled(trace_id: str, rate: float) -> bool:
+    return int(trace_id[:8], 16) % SAMPLE_SPACE < rate * SAMPLE_SPACE
+
+
+def bind_trace_session(session_id: Optional[str]) -> None:
+    # Участок - общий объект: привязка видна и middleware, хотя роут выполняется в дочерней задаче
+    hop = _hop_var.get()
+    if hop is not None:
+        hop.session_id = session_id
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[dict[str, Any]]]:
+    """Вложенный span; вне участка или вне выборки - no-op (отдает None)."""
+    hop = _hop_var.get()
+    if hop is None or hop.dropped():
+        yield None
+        return
+
+    record: dict[str, Any] = {
+        "span_id": os.urandom(8).hex(),
+        "parent_id": _span_var.get(),
+        "name": name,
+        "start": time.time(),
+        "attrs": attrs,
+    }
+    token = _span_var.set(record["span_id"])
+    started = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        _span_var.reset(token)
+        hop.spans.append(record)
+
+
+@contextmanager
+def trace_hop(name: str, **attrs: Any) -> Iterator[Optional[dict[str, Any]]]:
+    """Корневой span участка: HTTP запрос или апдейт бота."""
+    exporter = _exporter
+    if exporter is None:
+        yield None
+        return
+
+    hop = _Hop(exporter.sample_rate)
+    hop_token = _hop_var.set(hop)
+    span_token = _span_var.set(None)
+    try:
+        with span(name, **attrs) as root:
+            yield root
+    finally:
+        trace_id = hop.trace_id()
+        _span_var.reset(span_token)
+        _hop_var.reset(hop_token)
+
+        if trace_id is not None and is_sampled(trace_id, hop.sample_rate):
+            for record in hop.spans:
+                record["trace_id"] = trace_id
+                record["session_id"] = hop.session_id
+                exporter.export(record)
+
+
+class BatchExporter:
+    def __init__(self, target: str, sample_rate: float, batch_size: int, flush_interval: float, queue_size: int):
+        self.target = target
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._http_client = None
+
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        if self._http_client is not None:
+            self._http_client.close()
+
+    def export(self, record: dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.wait(self.flush_interval)
+            while not self._queue.empty():
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._write(batch)
+            if stopping:
+                return
+
+    def _write(self, batch: list[dict[str, Any]]) -> None:
+        import orjson
+
+        body = b"".join(orjson.dumps(record) + b"\n" for record in batch)
+        try:
+            if self.target.startswith(("http://", "https://")):
+                if self._http_client is None:
+                    import httpx
+
+                    self._http_client = httpx.Client(timeout=5.0)
+                response = self._http_client.post(
+                    self.target, content=body, headers={"Content-Type": "application/x-ndjson"}
+                )
+                response.raise_for_status()
+            else:
+                with open(self.target, "ab") as f:
+                    f.write(body)
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error("Failed to export %d spans: %s", len(batch), e)
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+_exporter: Optional[BatchExporter] = None
+
+
+def start_tracing(
+    target: str,
+    sample_rate: float,
+    batch_size: int = 512,
+    flush_interval: float = 1.0,
+    queue_size: int = 10_000,
+) -> None:
+    global _exporter
+    directory = os.path.dirname(target)
+    if directory and not target.startswith(("http://", "https://")):
+        os.makedirs(directory, exist_ok=True)
+
+    _exporter = BatchExporter(target, sample_rate, batch_size, flush_interval, queue_size)
+    _exporter.start()
+    logger.info("Tracing enabled: %s (sample rate %s)", target, sample_rate)
+
+
+def stop_tracing() -> None:
+    """Отправляет накопленные span'ы и останавливает экспорт."""
+    global _exporter
+    if _exporter is not None:
+        exporter, _exporter = _exporter, None
+        exporter.stop()
+
+
+def tracing_stats() -> Optional[dict]:
+    return _exporter.stats() if _exporter is not None else None
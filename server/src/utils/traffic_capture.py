@@ -0,0 +1,335 @@
+"""
+Запись анонимизированного трафика для воспроизведения (scripts/traffic_replay.py).
+
+Middleware пишет по записи на HTTP запрос: время прихода, длительность,
+статус, шаблон маршрута (/api/auth/tokens/{session_id}) и хеши
+идентификаторов - пользователя (номер в /init, sub токена) и сессии входа.
+Хеш - blake2b с ключом TRAFFIC_CAPTURE_SALT: одинаковые значения дают
+одинаковые хеши в пределах ключа, но номера и id из записи не восстановить.
+Из содержимого запросов сохраняются только объявленные маршрутом параметры
+query string и quest_id из каталога квестов (прочие - как UNKNOWN_ARG):
+клиент может дописать в запрос что угодно, а в запись попадают только
+заранее известные значения. У запросов без маршрута не пишется ничего.
+Тела ответов, заголовки и IP не пишутся.
+
+Сэмплирование детерминировано по хешу сессии или пользователя: поток
+одного входа попадает в запись целиком или не попадает.
+
+Формат - бинарный лог, запись около 40 байт:
+  MAGIC, затем записи с байтом типа в начале:
+  SEGMENT - старт процесса: unix время, от которого считаются смещения;
+  ROUTE   - id и шаблон маршрута, пишется перед первым запросом к нему;
+  REQUEST - смещение от старта (мкс), длительность (мкс), статус, id
+            маршрута, хеши пользователя и сессии (0 - нет), флаги, arg.
+После рестарта в тот же файл дописывается новый SEGMENT.
+
+Запись в фоновом потоке через ограниченную очередь, как экспорт trace'ов:
+запрос только упаковывает struct и кладет байты в очередь, при
+переполнении очереди или файла (TRAFFIC_CAPTURE_MAX_MB) записи
+отбрасываются и считаются в dropped.
+"""
+import hashlib
+import logging
+import os
+import queue
+import random
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlencode
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DOMCAP1\n"
+SEGMENT, ROUTE, REQUEST = 0, 1, 2
+SEGMENT_RECORD = struct.Struct("<Bd")  # тип, unix время старта
+ROUTE_RECORD = struct.Struct("<BHB")  # тип, id маршрута, длина шаблона
+REQUEST_RECORD = struct.Struct("<BQIHHQQBB")  # тип, смещение, длительность, статус, маршрут, пользователь, сессия, флаги, длина arg
+
+# Флаги запроса
+FLAG_IDEMPOTENCY_KEY = 1
+
+SAMPLE_SPACE = 10_000
+UNMATCHED = "(unmatched)"
+UNKNOWN_ARG = "(unknown)"
+MAX_FIELD_BYTES = 255
+
+
+class CapturedRequest(NamedTuple):
+    at: float  # unix время прихода
+    route: str  # "GET /api/auth/tokens/{session_id}"
+    status: int
+    duration_ms: float
+    subject: int  # хеш пользователя или 0
+    session: int  # хеш сессии входа или 0
+    flags: int
+    arg: str  # quest_id или query string
+
+
+class _Capture:
+    __slots__ = ("started", "subject", "session", "arg", "route", "status", "flags")
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.subject = 0
+        self.session = 0
+        self.arg: Optional[str] = None
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.flags = 0
+
+    def finish(self, request: "Request", route: Any, status: int) -> None:
+        # Путь без шаблона может содержать идентификаторы - не пишем ни его, ни query string
+        self.route = f"{request.method} {route.path if route is not None else UNMATCHED}"
+        self.status = status
+        if self.arg is None and route is not None:
+            self.arg = _declared_query(request, route)
+        if "idempotency-key" in request.headers:
+            self.flags |= FLAG_IDEMPOTENCY_KEY
+
+
+def _declared_query(request: "Request", route: Any) -> Optional[str]:
+    dependant = getattr(route, "dependant", None)
+    if dependant is None or not request.url.query:
+        return None
+    declared = {param.alias for param in dependant.query_params}
+    return urlencode([(name, value) for name, value in request.query_params.multi_items() if name in declared]) or None
+
+
+_capture_var: ContextVar[Optional[_Capture]] = ContextVar("traffic_capture", default=None)
+
+
+class CaptureWriter:
+    def __init__(self, path: str, sample_rate: float, salt: bytes, max_bytes: int, queue_size: int):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.salt = salt
+        self.max_bytes = max_bytes
+        self.started = time.monotonic()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._routes: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._file = None
+
+        self.written = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def hash(self, value: Any) -> int:
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8, key=self.salt).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def start(self) -> None:
+        self._file = open(self.path, "ab")
+        self.bytes = self._file.tell()
+        header = SEGMENT_RECORD.pack(SEGMENT, time.time() - (time.monotonic() - self.started))
+        self._file.write(header if self.bytes else MAGIC + header)
+        self._file.flush()
+        self.bytes = self._file.tell()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._file.close()
+
+    def record(self, capture: _Capture) -> None:
+        key = capture.session or capture.subject
+        sampled = key % SAMPLE_SPACE < self.sample_rate * SAMPLE_SPACE if key else random.random() < self.sample_rate
+        if not sampled:
+            return
+
+        route = capture.route or UNMATCHED
+        data = b""
+        route_id = self._routes.get(route)
+        if route_id is None:
+            route_id = len(self._routes)
+            encoded = route.encode()[:MAX_FIELD_BYTES]
+            data = ROUTE_RECORD.pack(ROUTE, route_id, len(encoded)) + encoded
+
+        arg = (capture.arg or "").encode()[:MAX_FIELD_BYTES]
+        data += REQUEST_RECORD.pack(
+            REQUEST,
+            int((capture.started - self.started) * 1_000_000),
+            min(int((time.monotonic() - capture.started) * 1_000_000), 0xFFFFFFFF),
+            capture.status if capture.status is not None else 500,
+            route_id,
+            capture.subject,
+            capture.session,
+            capture.flags,
+            len(arg),
+        ) + arg
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+            return
+        # Маршрут считается записанным, только если его ROUTE попал в очередь
+        self._routes.setdefault(route, route_id)
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.wait(1.0)
+            chunks = []
+            while True:
+                try:
+                    chunks.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if chunks:
+                self._write(chunks)
+            if stopping:
+                return
+
+    def _write(self, chunks: list[bytes]) -> None:
+        if self.bytes >= self.max_bytes:
+            self.dropped += len(chunks)
+            return
+        data = b"".join(chunks)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            self.bytes += len(data)
+            self.written += len(chunks)
+        except OSError as e:
+            self.dropped += len(chunks)
+            logger.error("Failed to write %d captured requests: %s", len(chunks), e)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "bytes": self.bytes,
+        }
+
+
+_writer: Optional[CaptureWriter] = None
+
+
+@contextmanager
+def capture_request() -> Iterator[Optional[_Capture]]:
+    """Запись HTTP запроса; маршрут и статус задает middleware через finish()."""
+    writer = _writer
+    if writer is None:
+        yield None
+        return
+
+    capture = _Capture()
+    token = _capture_var.set(capture)
+    try:
+        yield capture
+    finally:
+        _capture_var.reset(token)
+        writer.record(capture)
+
+
+def capture_subject(value: Any) -> None:
+    """Пользователь запроса: номер телефона или id из токена."""
+    # Запись - общий объект: значение из роута видно middleware, хотя роут в дочерней задаче
+    capture, writer = _capture_var.get(), _writer
+    if capture is not None and writer is not None and value:
+        capture.subject = writer.hash(value)
+
+
+def capture_session(session_id: Optional[str]) -> None:
+    capture, writer = _capture_var.get(), _writer
+    if capture is not None and writer is not None and session_id:
+        capture.session = writer.hash(session_id)
+
+
+def capture_arg(value: str) -> None:
+    capture = _capture_var.get()
+    if capture is not None:
+        capture.arg = value
+
+
+def start_capture(path: str, sample_rate: float, salt: str, max_bytes: int, queue_size: int = 10_000) -> None:
+    global _writer
+    path = path.replace("{pid}", str(os.getpid()))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not salt:
+        logger.warning("TRAFFIC_CAPTURE_SALT is not set: ids are hashed with a per-process key")
+
+    writer = CaptureWriter(path, sample_rate, salt.encode() or os.urandom(16), max_bytes, queue_size)
+    writer.start()
+    _writer = writer
+    logger.info("Traffic capture enabled: %s (sample rate %s)", path, sample_rate)
+
+
+def stop_capture() -> None:
+    """Дописывает очередь и закрывает файл."""
+    global _writer
+    if _writer is not None:
+        writer, _writer = _writer, None
+        writer.stop()
+
+
+def capture_stats() -> Optional[dict]:
+    return _writer.stats() if _writer is not None else None
+
+
+def read_capture(paths: Iterable[str]) -> list[CapturedRequest]:
+    """Запросы из файлов записи по времени прихода; оборванный хвост файла отбрасывается."""
+    requests = []
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a traffic capture")
+
+        offset = len(MAGIC)
+        segment_start = 0.0
+        routes: dict[int, str] = {}
+        while offset < len(data):
+            kind = data[offset]
+            if kind == SEGMENT:
+                if offset + SEGMENT_RECORD.size > len(data):
+                    break
+                _, segment_start = SEGMENT_RECORD.unpack_from(data, offset)
+                routes = {}
+                offset += SEGMENT_RECORD.size
+            elif kind == ROUTE:
+                if offset + ROUTE_RECORD.size > len(data):
+                    break
+                _, route_id, length = ROUTE_RECORD.unpack_from(data, offset)
+                offset += ROUTE_RECORD.size
+                routes[route_id] = data[offset:offset + length].decode(errors="replace")
+                offset += length
+            elif kind == REQUEST:
+                if offset + REQUEST_RECORD.size > len(data):
+                    break
+                _, started, duration, status, route_id, subject, session, flags, length = (
+                    REQUEST_RECORD.unpack_from(data, offset)
+                )
+                offset += REQUEST_RECORD.size
+                arg = data[offset:offset + length]
+                if len(arg) < length:
+                    break
+                offset += length
+                requests.append(CapturedRequest(
+                    at=segment_start + started / 1_000_000,
+                    route=routes.get(route_id, UNMATCHED),
+                    status=status,
+                    duration_ms=duration / 1000,
+                    subject=subject,
+                    session=session,
+                    flags=flags,
+                    arg=arg.decode(errors="replace"),
+                ))
+            else:
+                logger.warning("Corrupted record in %s at byte %d, skipping the rest", path, offset)
+                break
+    requests.sort(key=lambda request: request.at)
+    return requests
@@ -0,0 +1,11 @@
+import os
+
+# Settings читаются из окружения при первом обращении: обязательным полям хватает заглушек
+for name, value in {
+    "TELEGRAM_BOT_TOKEN": "1:test",
+    "SUPABASE_URL": "http://127.0.0.1:9",
+    "SUPABASE_KEY": "test",
+    "SUPABASE_SERVICE_KEY": "test",
+    "JWT_SECRET_KEY": "test",
+}.items():
+    os.environ.setdefault(name, value)
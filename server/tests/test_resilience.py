@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services import event_service
+from src.services.event_service import EventService
+from src.utils import resilience
+from src.utils.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+RESET_TIMEOUT = 0.05
+
+
+class HangingClient:
+    async def post(self, *args, **kwargs):
+        await asyncio.sleep(3600)
+
+
+@pytest.fixture
+def hanging_realtime(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "_registry", {})
+    monkeypatch.setattr(event_service, "_http_client", HangingClient())
+
+
+@pytest.fixture
+def breaker(hanging_realtime) -> CircuitBreaker:
+    breaker = CircuitBreaker("realtime", failure_threshold=1, reset_timeout=RESET_TIMEOUT)
+    breaker.record_failure()
+    time.sleep(RESET_TIMEOUT)
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def test_cancelled_half_open_call_releases_probe(breaker):
+    async def cancel_probe():
+        task = asyncio.create_task(EventService().send_auth_event("session", "auth_approved"))
+        await asyncio.sleep(0.01)
+        # Пробный вызов в полете - остальные отклоняются
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+
+    # Проба освобождена: breaker снова открыт, а не завис в half-open
+    assert breaker.state == OPEN
+    time.sleep(RESET_TIMEOUT)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.stats()["state"] == "closed"
+
+
+def test_abandoned_probe_expires_after_reset_timeout(breaker):
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    # Результат пробного вызова так и не записан
+    time.sleep(RESET_TIMEOUT)
+    breaker.before_call()
+
+
+def test_cancelled_calls_do_not_open_closed_breaker(hanging_realtime):
+    breaker = CircuitBreaker("realtime", failure_threshold=5, reset_timeout=RESET_TIMEOUT)
+
+    async def cancel_calls():
+        # Как отмена рассылки: прерываются все отправки в полете
+        tasks = [asyncio.create_task(EventService().send_auth_event("session", "auth_approved")) for _ in range(16)]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(cancel_calls())
+
+    stats = breaker.stats()
+    assert stats["state"] == CLOSED
+    assert stats["consecutive_failures"] == 0
@@ -8,12 +8,14 @@ interface AuthStatusProps {
   status: AuthStatusEnum;
   statusText: string;
   showBotLink?: boolean;
+  botLink?: string;
   onReset?: () => void;
 }
 
 export const AuthStatus = observer(
-  ({ status, statusText, showBotLink = false, onReset }: AuthStatusProps) => {
-    const BOT_URL = 'https://t.me/dance_of_mind_bot';
+  ({ status, statusText, showBotLink = false, botLink, onReset }: AuthStatusProps) => {
+    // Ссылка с подписанным payload сразу открывает сессию в боте
+    const BOT_URL = botLink || 'https://t.me/dance_of_mind_bot';
 
     const isRejected = status === AuthStatusEnum.REJECTED;
     const isApproved = status === AuthStatusEnum.APPROVED;
@@ -62,6 +62,7 @@ const AuthPage = observer(() => {
             status={store.authStatus}
             statusText={store.statusText}
             showBotLink={true}
+            botLink={store.botLink}
             onReset={handleReset}
           />
         )}
@@ -22,6 +22,7 @@ export enum AuthStatus {
 const createAuthStore = () => ({
   phoneNumber: '',
   sessionId: '',
+  botLink: '',
   step: AuthStep.PHONE_INPUT,
   authStatus: AuthStatus.PENDING,
   error: '',
@@ -62,6 +63,7 @@ const createAuthStore = () => ({
 
       const response = await apiClient.initAuth(this.phoneNumber);
       this.sessionId = response.session_id;
+      this.botLink = response.telegram_link ?? '';
       this.step = AuthStep.WAITING_BOT;
 
       this.subscribeToAuthEvents();
@@ -138,6 +140,7 @@ const createAuthStore = () => ({
     this.cleanup();
     this.phoneNumber = '';
     this.sessionId = '';
+    this.botLink = '';
     this.step = AuthStep.PHONE_INPUT;
     this.authStatus = AuthStatus.PENDING;
     this.error = '';
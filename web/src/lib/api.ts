@@ -8,6 +8,7 @@ const API_BASE_URL = env('NEXT_PUBLIC_API_URL') || 'http://localhost:8000';
 export interface AuthSessionResponse {
   session_id: string;
   expires_in: number;
+  telegram_link?: string | null;
 }
 
 export interface TokenPair {